@@ -0,0 +1,71 @@
+"""
+Measures how MNKBoard operations and iterative-deepening search scale with board size, from tic-tac-toe up to 15x15
+gomoku.
+
+Run from the repository root with `python -m benchmarks.mnk_scaling [output.json]`. Results are printed as JSON and
+also written to the given file.
+"""
+import json
+import random
+import sys
+import time
+
+from benchmarks.timing import per_second
+from minimax import SearchStatistics, iterative_deepening_minimax
+from mnk_game import MNKBoard
+
+# (m, n, k) board sizes to measure
+BOARD_SIZES = ((3, 3, 3), (4, 4, 4), (5, 5, 4), (7, 7, 5), (9, 9, 5), (11, 11, 5), (15, 15, 5))
+
+
+def _random_position(m, n, k, n_stones, rng):
+    """A position reached by n_stones random moves, or fewer if the game ends first."""
+    board = MNKBoard(m, n, k)
+    while board.depth() < n_stones and not board.is_game_over:
+        board.play_move(rng.choice(board.get_possible_moves()))
+    return board
+
+
+def measure_board_size(m, n, k, search_seconds=1.0, seed=0):
+    rng = random.Random(seed)
+    # A position a third of the way into the game, where moves have neighbors and the search has work to do
+    board = _random_position(m, n, k, m * n // 3, rng)
+    while board.is_game_over:
+        board = _random_position(m, n, k, m * n // 3, rng)
+    moves = board.get_possible_moves()
+
+    def play_and_undo():
+        board.play_move(moves[0])
+        board.undo_move()
+
+    def random_game():
+        game_board = MNKBoard(m, n, k)
+        while not game_board.is_game_over:
+            game_board.play_move(rng.choice(game_board.get_possible_moves()))
+
+    statistics = SearchStatistics()
+    start_time = time.perf_counter()
+    value, move, depth = iterative_deepening_minimax(MNKBoard(m, n, k), True, time_limit=search_seconds,
+                                                     statistics=statistics)
+    search_seconds = time.perf_counter() - start_time
+
+    return {"board": f"{m},{n},{k}",
+            "play_and_undo_per_second": per_second(play_and_undo),
+            "get_possible_moves_per_second": per_second(board.get_possible_moves),
+            "order_moves_per_second": per_second(lambda: board.order_moves(moves)),
+            "static_evaluation_per_second": per_second(board.static_evaluation),
+            "random_games_per_second": per_second(random_game, min_seconds=0.5),
+            "search_depth_reached": depth,
+            "search_nodes_per_second": statistics.nodes / search_seconds}
+
+
+def run_mnk_scaling_benchmark(board_sizes=BOARD_SIZES, search_seconds=1.0):
+    return [measure_board_size(m, n, k, search_seconds) for m, n, k in board_sizes]
+
+
+if __name__ == "__main__":
+    results = run_mnk_scaling_benchmark()
+    print(json.dumps(results, indent=2))
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "w") as file:
+            json.dump(results, file, indent=2)
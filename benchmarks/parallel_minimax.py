@@ -0,0 +1,68 @@
+"""
+Speedup of the root-parallel search over the serial one, at 1, 2, 4 and 8 workers, on MNK positions with enough work to
+split. Every parallel search is checked to return the serial search's value and move. Speedups are bounded by the
+number of CPUs, reported along with the results.
+
+Run from the repository root with `python -m benchmarks.parallel_minimax [output.json]`. Results are printed as JSON and
+also written to the given file.
+"""
+import json
+import os
+import random
+import sys
+import time
+
+from minimax import SearchStatistics, minimax
+from mnk_game import MNKBoard
+from parallel_minimax import ParallelMinimax
+
+WORKER_COUNTS = (1, 2, 4, 8)
+# (m, n, k, number of random stones, search depth)
+POSITIONS = ((4, 4, 4, 2, float("inf")), (5, 5, 4, 2, 7), (6, 6, 4, 3, 6))
+
+
+def _random_position(m, n, k, n_stones, seed=0):
+    rng = random.Random(seed)
+    board = MNKBoard(m, n, k)
+    while board.depth() < n_stones:
+        board.play_move(rng.choice(board.get_possible_moves()))
+        if board.is_game_over:
+            board.reset()
+    return board
+
+
+def measure_position(m, n, k, n_stones, depth, worker_counts=WORKER_COUNTS):
+    board = _random_position(m, n, k, n_stones)
+    is_maximizing_player = board.depth() % 2 == 0
+    statistics = SearchStatistics()
+    start_time = time.perf_counter()
+    serial_result = minimax(board, is_maximizing_player, max_depth=depth, statistics=statistics)
+    serial_seconds = time.perf_counter() - start_time
+
+    result = {"board": f"{m},{n},{k}", "stones": n_stones, "depth": None if depth == float("inf") else depth,
+              "serial_seconds": serial_seconds, "serial_nodes": statistics.nodes, "workers": {}}
+    for n_workers in worker_counts:
+        with ParallelMinimax(n_workers) as parallel_search:
+            # Start the pool outside the timing
+            parallel_search.search(board, is_maximizing_player, max_depth=1)
+            start_time = time.perf_counter()
+            parallel_result = parallel_search.search(board, is_maximizing_player, max_depth=depth)
+            parallel_seconds = time.perf_counter() - start_time
+        assert parallel_result == serial_result, f"{parallel_result} != {serial_result} on\n{board}"
+        result["workers"][n_workers] = {"seconds": parallel_seconds, "speedup": serial_seconds / parallel_seconds,
+                                        "nodes": parallel_search.nodes, "restarts": parallel_search.restarts,
+                                        "researches": parallel_search.researches}
+    return result
+
+
+def run_parallel_minimax_benchmark(positions=POSITIONS, worker_counts=WORKER_COUNTS):
+    return {"cpus": os.cpu_count(),
+            "positions": [measure_position(*position, worker_counts=worker_counts) for position in positions]}
+
+
+if __name__ == "__main__":
+    results = run_parallel_minimax_benchmark()
+    print(json.dumps(results, indent=2))
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "w") as file:
+            json.dump(results, file, indent=2)
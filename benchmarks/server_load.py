@@ -0,0 +1,93 @@
+"""
+Load test for game_server: n concurrent sessions, each on its own connection, play games as a random human against an
+agent of the server, and the latency of every move request is recorded. Reports the p50/p99 latency and throughput.
+
+Run from the repository root with `python -m benchmarks.server_load [--sessions 100] [--opponent minimax]`. Without
+--port, a server is started in this process on a free port; with it, an already running server is tested.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from game_server import HUMAN, GameServer
+
+
+async def play_session(host, port, opponent, n_games, latencies, rng):
+    """Play n_games as a random mover against opponent, appending the seconds each move request took to latencies."""
+    reader, writer = await asyncio.open_connection(host, port)
+
+    async def request(message):
+        writer.write(json.dumps(message).encode() + b"\n")
+        await writer.drain()
+        response = json.loads(await reader.readline())
+        assert response["ok"], response["error"]
+        return response
+
+    try:
+        for game in range(n_games):
+            # Alternate who moves first
+            players = [HUMAN, opponent] if game % 2 == 0 else [opponent, HUMAN]
+            response = await request({"op": "new_game", "players": players})
+            while not response["state"]["is_game_over"]:
+                row, column = rng.choice(response["state"]["legal_moves"])
+                start_time = time.perf_counter()
+                response = await request({"op": "move", "session": response["session"], "row": row, "column": column})
+                latencies.append(time.perf_counter() - start_time)
+    finally:
+        writer.close()
+
+
+async def run_load_test(host, port, n_sessions, opponent, n_games=2, seed=0):
+    latencies = []
+    start_time = time.perf_counter()
+    await asyncio.gather(*(play_session(host, port, opponent, n_games, latencies, random.Random(seed + i))
+                           for i in range(n_sessions)))
+    elapsed = time.perf_counter() - start_time
+    # Inclusive quantiles stay within the measured latencies, however few there are
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {"sessions": n_sessions, "opponent": opponent, "games": n_sessions * n_games, "moves": len(latencies),
+            "p50_ms": 1000 * percentiles[49], "p99_ms": 1000 * percentiles[98], "max_ms": 1000 * max(latencies),
+            "moves_per_second": len(latencies) / elapsed}
+
+
+async def run_against_local_server(n_sessions, opponent, n_games, n_workers, ppo_checkpoint=None):
+    batched_agents = None
+    if ppo_checkpoint:
+        from tic_tac_toe import TicTacToePPOAgent
+
+        batched_agents = {"ppo": TicTacToePPOAgent("ppo", checkpoint_path=ppo_checkpoint)}
+    server = GameServer(n_workers=n_workers, batched_agents=batched_agents)
+    try:
+        listener = await server.start(port=0)
+        async with listener:
+            port = listener.sockets[0].getsockname()[1]
+            results = await run_load_test("127.0.0.1", port, n_sessions, opponent, n_games)
+        if opponent in server.batchers:
+            batch_sizes = server.batchers[opponent].batch_sizes
+            results["mean_batch_size"] = sum(batch_sizes) / len(batch_sizes)
+        return results
+    finally:
+        await server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=100, help="Number of concurrent sessions")
+    parser.add_argument("--games", type=int, default=2, help="Games played by each session")
+    parser.add_argument("--opponent", default="minimax", help="Server agent to play against")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="Port of a running server; by default one is started in-process")
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes of the in-process server")
+    parser.add_argument("--ppo-checkpoint", help="Serve a PPO agent, named ppo, from the in-process server")
+    arguments = parser.parse_args()
+
+    if arguments.port is None:
+        results = asyncio.run(run_against_local_server(arguments.sessions, arguments.opponent, arguments.games,
+                                                       arguments.workers, arguments.ppo_checkpoint))
+    else:
+        results = asyncio.run(run_load_test(arguments.host, arguments.port, arguments.sessions, arguments.opponent,
+                                            arguments.games))
+    print(json.dumps(results, indent=2))
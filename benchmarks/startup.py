@@ -0,0 +1,59 @@
+"""
+Measures the import cost of the package's entry points, each in a fresh interpreter, and checks that the board and
+minimax import path stays free of torch and pygame.
+
+Run from the repository root with `python -m benchmarks.startup`. Exits with status 1 if the check fails.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("torch", "pygame")
+
+# Import statements to time, and whether they must avoid the heavy modules
+IMPORT_PATHS = {
+    "board_and_minimax": ("from tic_tac_toe import TicTacToeBoard, TicTacToeBitBoard, TicTacToeMiniMaxAgent\n"
+                          "import minimax", True),
+    "full_package": ("from tic_tac_toe import *", False),
+}
+
+_PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+{imports}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds,
+                  "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  "heavy_modules": [module for module in {heavy_modules!r} if module in sys.modules]}}))
+"""
+
+
+def measure_import(imports, repeats=5):
+    """Run imports in repeats fresh interpreters and return the median time, peak memory and heavy modules loaded."""
+    environment = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT="1")
+    probe = _PROBE.format(imports=imports, heavy_modules=HEAVY_MODULES)
+    runs = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", probe], cwd=REPOSITORY_ROOT, env=environment,
+                                capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {"median_seconds": statistics.median(run["seconds"] for run in runs),
+            "max_rss_kb": max(run["max_rss_kb"] for run in runs),
+            "heavy_modules": runs[0]["heavy_modules"]}
+
+
+def run_startup_benchmark(repeats=5):
+    return {name: measure_import(imports, repeats) for name, (imports, _) in IMPORT_PATHS.items()}
+
+
+if __name__ == "__main__":
+    results = run_startup_benchmark()
+    print(json.dumps(results, indent=2))
+    failures = [name for name, (_, must_be_light) in IMPORT_PATHS.items()
+                if must_be_light and results[name]["heavy_modules"]]
+    if failures:
+        print(f"Heavy modules imported by: {', '.join(failures)}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,197 @@
+"""
+Benchmark suite for the boards, the search, self-play and PPO training. Every metric is a single number, named
+"<group>.<subject>.<measure>", where measures ending in "_per_second" are better when higher and measures ending in
+"_seconds" are better when lower. Seeds are fixed so that runs do the same work.
+
+Run from the repository root with
+    python -m benchmarks.suite [--output results.json] [--baseline old_results.json] [--groups board search ...]
+With --baseline, metrics that got worse by more than --tolerance are listed and the exit status is 1.
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+
+from benchmarks.timing import median_seconds, per_second
+from minimax import SearchStatistics, minimax
+from mnk_game import MNKBoard, MNKMove
+from tic_tac_toe import TicTacToeBoard, TicTacToeBitBoard, TicTacToeMiniMaxAgent, TicTacToeMove
+from transposition_table import TranspositionTable
+from two_player_game import RandomAgent, TwoPlayerGame
+
+BOARD_FACTORIES = {
+    "TicTacToeBoard": TicTacToeBoard,
+    "TicTacToeBitBoard": TicTacToeBitBoard,
+    "MNKBoard_3_3_3": lambda: MNKBoard(3, 3, 3),
+}
+# A full game (a draw), as (row, column) moves
+GAME = ((1, 1), (0, 0), (0, 2), (2, 0), (1, 0), (1, 2), (0, 1), (2, 1), (2, 2))
+
+
+def _move(board, row, column):
+    """The move type each board expects."""
+    return MNKMove(row, column) if isinstance(board, MNKBoard) else TicTacToeMove(row, column)
+
+
+def benchmark_board_operations(min_seconds):
+    """play_move/undo_move pairs, game-over checks and get_possible_moves calls per second."""
+    results = {}
+    for name, board_factory in BOARD_FACTORIES.items():
+        board = board_factory()
+        moves = [_move(board, row, column) for row, column in GAME]
+
+        def play_and_undo_game():
+            for move in moves:
+                board.play_move(move)
+            for _ in moves:
+                board.undo_move()
+
+        results[f"{name}.play_undo_per_second"] = len(moves) * per_second(play_and_undo_game, min_seconds, repeats=3)
+        if hasattr(board, "_check_game_over"):
+            results[f"{name}.check_game_over_per_second"] = per_second(board._check_game_over, min_seconds, repeats=3)
+        results[f"{name}.empty_get_possible_moves_per_second"] = per_second(board.get_possible_moves, min_seconds,
+                                                                             repeats=3)
+        for move in moves[:4]:
+            board.play_move(move)
+        results[f"{name}.midgame_get_possible_moves_per_second"] = per_second(board.get_possible_moves, min_seconds,
+                                                                               repeats=3)
+    return results
+
+
+def benchmark_search(repeats):
+    """Time to solve the empty board with minimax and a fresh transposition table, and nodes searched per second."""
+    results = {}
+    for name, board_factory in BOARD_FACTORIES.items():
+        statistics = SearchStatistics()
+        seconds = median_seconds(lambda: minimax(board_factory(), True, table=TranspositionTable(),
+                                                 statistics=statistics), repeats)
+        results[f"{name}.solve_seconds"] = seconds
+        results[f"{name}.solve_nodes"] = statistics.nodes // repeats
+        results[f"{name}.nodes_per_second"] = statistics.nodes / repeats / seconds
+    return results
+
+
+def benchmark_self_play(min_seconds):
+    """Complete games per second through TwoPlayerGame.play_headless."""
+    results = {}
+    for name, board_factory in BOARD_FACTORIES.items():
+        matchups = {"random_vs_random": (RandomAgent("random 1", seed=1), RandomAgent("random 2", seed=2)),
+                    # The agent keeps its transposition table, so after the first games this measures table lookups
+                    "minimax_vs_random": (TicTacToeMiniMaxAgent("minimax"), RandomAgent("random", seed=3))}
+        for matchup, (agent_1, agent_2) in matchups.items():
+            game = TwoPlayerGame(board_factory(), agent_1, agent_2)
+            results[f"{name}.{matchup}_games_per_second"] = per_second(game.play_headless, min_seconds, repeats=3)
+    return results
+
+
+def benchmark_ppo(min_seconds, repeats):
+    """PPO experience collection steps per second, sequential and vectorized, and the time of one PPO update."""
+    from itertools import chain
+
+    import numpy as np
+    import torch
+
+    from tic_tac_toe import X
+    from tic_tac_toe.PPO_tic_tac_toe import TicTacToePPOTrainer
+    from tic_tac_toe.vectorized_tic_tac_toe import random_policy
+
+    torch.manual_seed(0)
+    torch.set_num_threads(1)
+    results = {}
+    trainer = TicTacToePPOTrainer(board_class=TicTacToeBitBoard)
+    opponent = RandomAgent("random", seed=0).get_move
+
+    n_steps = 0
+    start_time = time.perf_counter()
+    while time.perf_counter() - start_time < min_seconds:
+        n_steps += len(trainer._play_training_game(X, opponent))
+    results["sequential.rollout_steps_per_second"] = n_steps / (time.perf_counter() - start_time)
+
+    rng = np.random.default_rng(0)
+    trainer.buffer.clear()
+    start_time = time.perf_counter()
+    trainer._collect_experience_vectorized(X, 2000, 256, random_policy(rng), gamma=0.9)
+    results["vectorized.rollout_steps_per_second"] = len(trainer.buffer) / (time.perf_counter() - start_time)
+
+    # One update over the vectorized buffer, as in an epoch of training with the default settings
+    optimizer = torch.optim.Adam(chain(trainer.policy_network.parameters(), trainer.value_network.parameters()))
+    trainer._learn_ppo(optimizer, batch_size=500, epsilon=0.2, policy_epochs=1)  # Warm up
+    results["update.transitions"] = len(trainer.buffer)
+    results["update.update_seconds"] = median_seconds(
+        lambda: trainer._learn_ppo(optimizer, batch_size=500, epsilon=0.2, policy_epochs=10), repeats)
+    return results
+
+
+def run_benchmark_suite(groups=None, min_seconds=0.2, repeats=5):
+    """
+    Run the selected groups (all if None) and return a dictionary with run metadata and the flat metrics.
+    """
+    benchmarks = {"board": lambda: benchmark_board_operations(min_seconds),
+                  "search": lambda: benchmark_search(repeats),
+                  "self_play": lambda: benchmark_self_play(min_seconds),
+                  "ppo": lambda: benchmark_ppo(min_seconds, repeats)}
+    random.seed(0)
+    metrics = {}
+    for group in groups or benchmarks:
+        for name, value in benchmarks[group]().items():
+            metrics[f"{group}.{name}"] = value
+    return {"metadata": _metadata(), "metrics": metrics}
+
+
+def compare_to_baseline(metrics, baseline_metrics, tolerance=0.1):
+    """
+    Return (name, baseline value, value) for every timing metric that got worse than its baseline by more than
+    tolerance, as a fraction.
+    """
+    regressions = []
+    for name, value in metrics.items():
+        baseline = baseline_metrics.get(name)
+        if not baseline:
+            continue
+        if name.endswith("_per_second") and value < baseline * (1 - tolerance):
+            regressions.append((name, baseline, value))
+        elif name.endswith("_seconds") and value > baseline * (1 + tolerance):
+            regressions.append((name, baseline, value))
+    return regressions
+
+
+def _metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z")}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="File to write the results to as JSON")
+    parser.add_argument("--baseline", help="Results file of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed slowdown against the baseline")
+    parser.add_argument("--groups", nargs="+", choices=["board", "search", "self_play", "ppo"])
+    parser.add_argument("--min-seconds", type=float, default=0.2, help="Minimum time to measure each rate for")
+    parser.add_argument("--repeats", type=int, default=5, help="Runs of each timed operation")
+    arguments = parser.parse_args()
+
+    results = run_benchmark_suite(arguments.groups, arguments.min_seconds, arguments.repeats)
+    print(json.dumps(results, indent=2))
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if arguments.baseline:
+        with open(arguments.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare_to_baseline(results["metrics"], baseline["metrics"], arguments.tolerance)
+        for name, baseline_value, value in regressions:
+            print(f"Regression in {name}: {baseline_value:.6g} -> {value:.6g}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,29 @@
+import statistics
+import time
+
+
+def per_second(function, min_seconds=0.2, repeats=1):
+    """
+    Call function repeatedly for at least min_seconds and return the calls per second. With several repeats, the
+    median rate is returned, which is less sensitive to other load on the machine.
+    """
+    rates = []
+    for _ in range(repeats):
+        n_calls = 0
+        start_time = time.perf_counter()
+        while (elapsed := time.perf_counter() - start_time) < min_seconds:
+            for _ in range(100):
+                function()
+            n_calls += 100
+        rates.append(n_calls / elapsed)
+    return statistics.median(rates)
+
+
+def median_seconds(function, repeats=5):
+    """Run function repeats times and return the median wall-clock time of one run."""
+    times = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start_time)
+    return statistics.median(times)
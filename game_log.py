@@ -0,0 +1,248 @@
+"""
+Append-only binary log of finished games. The file starts with an 8-byte header (magic, format version, board rows,
+board columns, a padding byte), followed by one record per game: a header byte, RECORD_START | result, then one byte
+per move holding its square, row * columns + column. Squares are below 128, so records start exactly at the bytes with
+the high bit set and the reader finds them with vectorized scans instead of walking the file. A tic-tac-toe game takes
+about 8 bytes.
+"""
+import mmap
+import os
+
+import numpy as np
+
+from tic_tac_toe import TicTacToeMove
+
+# CONSTANTS
+MAGIC = b"TPGL"
+FORMAT_VERSION = 1
+HEADER_SIZE = 8
+RECORD_START = 0x80
+MAX_SQUARES = 128
+CHUNK_SIZE = 2 ** 24  # Bytes scanned at a time by the reader
+
+# Results
+DRAW = 0
+FIRST_PLAYER_WON = 1
+SECOND_PLAYER_WON = 2
+UNFINISHED = 3
+
+
+# END CONSTANTS
+
+
+def encode_game(squares, result):
+    """The record of a game with the given move squares and result."""
+    return bytes((RECORD_START | result,)) + bytes(squares)
+
+
+def finished_game_result(board, n_moves):
+    """Result of a game that ended on board after n_moves; the player who made the last move is taken as the winner."""
+    if not board.is_game_over:
+        return UNFINISHED
+    if board.winning_player == "":
+        return DRAW
+    return FIRST_PLAYER_WON if n_moves % 2 == 1 else SECOND_PLAYER_WON
+
+
+class GameLogWriter:
+    """Appends games to a log file, creating it if needed. Writes are buffered; use as a context manager or close."""
+
+    def __init__(self, path, rows=3, columns=3, buffer_size=2 ** 20):
+        assert rows * columns <= MAX_SQUARES, f"Boards are limited to {MAX_SQUARES} squares"
+        self.path = path
+        self.rows = rows
+        self.columns = columns
+        if os.path.exists(path) and os.path.getsize(path):
+            assert _read_header(path) == (rows, columns), f"{path} logs games on a different board size"
+            self.file = open(path, "ab", buffering=buffer_size)
+        else:
+            self.file = open(path, "wb", buffering=buffer_size)
+            self.file.write(MAGIC + bytes((FORMAT_VERSION, rows, columns, 0)))
+        self.n_games_written = 0
+
+    def write_game(self, moves, result):
+        """Append a game given as its moves (anything with row and column) and result."""
+        self.write_squares([move.row * self.columns + move.column for move in moves], result)
+
+    def write_finished_game(self, moves, board):
+        """Append a game that has just been played on board, taking the result from the board."""
+        self.write_game(moves, finished_game_result(board, len(moves)))
+
+    def write_squares(self, squares, result):
+        self.file.write(encode_game(squares, result))
+        self.n_games_written += 1
+
+    def write_records(self, records, n_games):
+        """Append n_games already encoded with encode_game, for example by a worker process."""
+        self.file.write(records)
+        self.n_games_written += n_games
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class GameLog:
+    """
+    Memory-mapped reader of a game log. Counting, filtering and chunks scan the file CHUNK_SIZE bytes at a time with
+    NumPy; only indexing keeps an array of every record's offset, built on first use.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows, self.columns = _read_header(path)
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.data = np.frombuffer(self._mmap, dtype=np.uint8)
+        self._offsets = None
+
+    def chunks(self, chunk_size=CHUNK_SIZE):
+        """
+        Yield (first_index, offsets, lengths, results) for consecutive blocks of games: the index of the block's first
+        game in the log, then the offset of each game's record, its number of moves and its result, as arrays.
+        """
+        data, size = self.data, len(self.data)
+        first_index = 0
+        chunk_start = HEADER_SIZE
+        while chunk_start < size:
+            chunk_end = min(chunk_start + chunk_size, size)
+            # Extend the chunk to the end of its last record, which is shorter than MAX_SQUARES moves
+            tail = np.flatnonzero(data[chunk_end:chunk_end + MAX_SQUARES + 1] >= RECORD_START)
+            record_end = chunk_end + int(tail[0]) if len(tail) else size
+            offsets = chunk_start + np.flatnonzero(data[chunk_start:record_end] >= RECORD_START)
+            lengths = np.diff(offsets, append=record_end) - 1
+            results = data[offsets] - RECORD_START
+            yield first_index, offsets, lengths, results
+            first_index += len(offsets)
+            chunk_start = record_end
+
+    def __iter__(self):
+        """Yield the (squares, result) of every game, where squares is a bytes object."""
+        data = self._mmap
+        for _, offsets, lengths, results in self.chunks():
+            for offset, length, result in zip(offsets.tolist(), lengths.tolist(), results.tolist()):
+                yield data[offset + 1:offset + 1 + length], result
+
+    def filter(self, result=None, min_moves=0, max_moves=MAX_SQUARES, first_square=None):
+        """Indices of the games matching every given condition, found without leaving NumPy."""
+        indices = []
+        for first_index, offsets, lengths, results in self.chunks():
+            matches = (lengths >= min_moves) & (lengths <= max_moves)
+            if result is not None:
+                matches &= results == result
+            if first_square is not None:
+                matches &= (lengths > 0) & (self.data[np.minimum(offsets + 1, len(self.data) - 1)] == first_square)
+            indices.append(first_index + np.flatnonzero(matches))
+        return np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        if self._offsets is not None:
+            return len(self._offsets)
+        return sum(len(offsets) for _, offsets, _, _ in self.chunks())
+
+    def __getitem__(self, index):
+        """The (squares, result) of game index."""
+        offsets = self.offsets
+        # Negative indices count from the end; anything out of range raises IndexError
+        index = range(len(offsets))[index]
+        offset = int(offsets[index])
+        end = int(offsets[index + 1]) if index + 1 < len(offsets) else len(self.data)
+        return self._mmap[offset + 1:end], self._mmap[offset] - RECORD_START
+
+    @property
+    def offsets(self):
+        """Offset of every record in the file, as an int64 array."""
+        if self._offsets is None:
+            chunks = [offsets for _, offsets, _, _ in self.chunks()]
+            self._offsets = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int64)
+        return self._offsets
+
+    def moves(self, squares, move_factory=TicTacToeMove):
+        return [move_factory(*divmod(square, self.columns)) for square in squares]
+
+    def replay(self, index, board, move_factory=TicTacToeMove):
+        """Reset board and play game index on it, returning the board."""
+        board.reset()
+        squares, _ = self[index]
+        for move in self.moves(squares, move_factory):
+            board.play_move(move)
+        return board
+
+    def close(self):
+        self.data = None
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _read_header(path):
+    with open(path, "rb") as file:
+        header = file.read(HEADER_SIZE)
+    assert header[:4] == MAGIC, f"{path} is not a game log"
+    assert header[4] == FORMAT_VERSION, f"{path} has format version {header[4]}, expected {FORMAT_VERSION}"
+    return header[5], header[6]
+
+
+if __name__ == "__main__":
+    import sys
+    import tempfile
+    import time
+
+    from tic_tac_toe import TicTacToeBitBoard, TicTacToeMiniMaxAgent
+    from two_player_game import RandomAgent, TwoPlayerGame
+
+    # Log games between minimax and a random player, then check they replay to the logged results
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(tempfile.mkdtemp(), "games.log")
+    with GameLogWriter(path) as writer:
+        game = TwoPlayerGame(TicTacToeBitBoard(), TicTacToeMiniMaxAgent("minimax"), RandomAgent("random", seed=0),
+                             game_log=writer)
+        outcomes = [game.play_headless() for _ in range(1000)]
+    log = GameLog(path)
+    assert len(log) == 1000
+    results = [result for _, result in log]
+    assert results == [{0: DRAW, 1: FIRST_PLAYER_WON, -1: SECOND_PLAYER_WON}[outcome] for outcome in outcomes]
+    board = TicTacToeBitBoard()
+    for index in range(len(log)):
+        log.replay(index, board)
+        assert finished_game_result(board, board.depth()) == results[index]
+    assert log[-1] == log[len(log) - 1] and log[-len(log)] == log[0]
+    try:
+        log[len(log)]
+    except IndexError:
+        pass
+    else:
+        assert False
+    assert list(log.filter(result=DRAW)) == [i for i, result in enumerate(results) if result == DRAW]
+    # Small chunks split games across chunk boundaries
+    assert [len(offsets) for _, offsets, _, _ in log.chunks(chunk_size=100)][:3] != [0, 0, 0]
+    assert np.array_equal(np.concatenate([offsets for _, offsets, _, _ in log.chunks(chunk_size=100)]), log.offsets)
+    print(f"{os.path.getsize(path)} bytes for {len(log)} games, {len(log.filter(first_square=4))} opened in the center")
+    log.close()
+
+    # Scanning speed on a larger log of copies of those games
+    with open(path, "rb") as file:
+        records = file.read()[HEADER_SIZE:]
+    big_path = path + ".big"
+    with GameLogWriter(big_path) as writer:
+        for _ in range(10_000):
+            writer.write_records(records, 1000)
+    start_time = time.perf_counter()
+    with GameLog(big_path) as log:
+        n_wins = len(log.filter(result=FIRST_PLAYER_WON))
+    elapsed = time.perf_counter() - start_time
+    size_mib = os.path.getsize(big_path) / 2 ** 20
+    print(f"Filtered {n_wins} first player wins from {size_mib:.0f} MiB in {elapsed:.2f} s, {size_mib / elapsed:.0f} "
+          f"MiB/s")
+    os.remove(big_path)
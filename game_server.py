@@ -0,0 +1,322 @@
+"""
+Asyncio server hosting many concurrent games between clients and the built-in agents, over a JSON protocol on TCP.
+Run from the repository root with `python -m game_server [--port 8765] [--workers 2] [--ppo-checkpoint path]`.
+
+Each request and response is one JSON object on its own line:
+    {"op": "new_game", "players": ["human", "minimax"]}   -> {"ok": true, "session": 1, "state": {...}}
+    {"op": "move", "session": 1, "row": 0, "column": 2}   -> {"ok": true, "session": 1, "state": {...}}
+    {"op": "state", "session": 1}                         -> {"ok": true, "session": 1, "state": {...}}
+    {"op": "close", "session": 1}                         -> {"ok": true, "session": 1}
+Players are "human", moved by the client, or the name of one of the server's agents, which move as soon as it is
+their turn; a game between two agents is played out before new_game returns. States list every move so far, so the
+client sees the agents' replies. Failed requests get {"ok": false, "error": "..."}. Finished games are forgotten once
+their final state has been sent.
+"""
+import asyncio
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from tic_tac_toe import TicTacToeBitBoard, TicTacToeMiniMaxAgent, TicTacToeMove
+from two_player_game import RandomAgent, TwoPlayerGame, TwoPlayerGameAgent
+
+HUMAN = "human"
+DEFAULT_AGENT_FACTORIES = {"random": partial(RandomAgent, "random"),
+                           "minimax": partial(TicTacToeMiniMaxAgent, "minimax")}
+
+
+class RemotePlayer(TwoPlayerGameAgent):
+    """Stands in a TwoPlayerGame for a player whose moves arrive from a client."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def get_move(self, board):
+        raise RuntimeError("Moves of remote players come from the client")
+
+
+class GameSession:
+    def __init__(self, session_id, board, players):
+        """
+        :param players: The agents moving first and second; RemotePlayer for the client.
+        """
+        self.session_id = session_id
+        self.game = TwoPlayerGame(board, *players)
+        self.game.board.reset()
+        self.moves = []
+        # Moves of one session are handled one at a time
+        self.lock = asyncio.Lock()
+
+    @property
+    def board(self):
+        return self.game.board
+
+    @property
+    def player_to_move(self):
+        return self.game.player_1 if len(self.moves) % 2 == 0 else self.game.player_2
+
+    def state(self):
+        board = self.board
+        return {"board": board.state.tolist(),
+                "players": [self.game.player_1.name, self.game.player_2.name],
+                "player_to_move": None if board.is_game_over else self.player_to_move.name,
+                "moves": [[move.row, move.column] for move in self.moves],
+                "legal_moves": [[move.row, move.column] for move in board.get_possible_moves()],
+                "is_game_over": board.is_game_over,
+                "winner": board.winning_player}
+
+
+class MoveBatcher:
+    """
+    Answers move requests for an agent with a get_moves(boards) method, such as TicTacToePPOAgent, in batches. A batch
+    is run once max_batch_size requests are waiting or max_delay seconds after its first request, whichever comes
+    first, on a thread so that the event loop keeps serving other sessions meanwhile.
+    """
+
+    def __init__(self, agent, max_batch_size=64, max_delay=0.002):
+        self.agent = agent
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.executor = ThreadPoolExecutor(1)
+        self.pending = []
+        self.flush_handle = None
+        # The loop only keeps weak references to tasks, so running batches are kept here until they finish
+        self.tasks = set()
+        self.batch_sizes = []
+
+    async def get_move(self, board):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((board, future))
+        if len(self.pending) >= self.max_batch_size:
+            self._flush()
+        elif self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(self.max_delay, self._flush)
+        return await future
+
+    async def close(self):
+        """Cancel pending and running batches, failing their requests, then stop the batch thread."""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch, self.pending = self.pending, []
+        for _, future in batch:
+            future.cancel()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.executor.shutdown()
+
+    def _flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch, self.pending = self.pending, []
+        if batch:
+            self.batch_sizes.append(len(batch))
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _run_batch(self, batch):
+        boards = [board for board, _ in batch]
+        try:
+            moves = await asyncio.get_running_loop().run_in_executor(self.executor, self.agent.get_moves, boards)
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as error:
+            for _, future in batch:
+                future.set_exception(error)
+            return
+        for (_, future), move in zip(batch, moves):
+            future.set_result(move)
+
+
+class GameServer:
+    def __init__(self, board_factory=TicTacToeBitBoard, move_factory=TicTacToeMove, agent_factories=None,
+                 inline_agents=("random",), batched_agents=None, n_workers=2, max_batch_size=64,
+                 max_batch_delay=0.002):
+        """
+        :param board_factory: Callable returning a fresh board for each session. Its boards must support snapshot,
+                              which is how positions are sent to the worker processes.
+        :param move_factory: Callable building a move from the row and column a client sends.
+        :param agent_factories: Dictionary from agent name to a picklable callable creating the agent. Each worker
+                                process creates its own agents. Defaults to DEFAULT_AGENT_FACTORIES.
+        :param inline_agents: Names of agents cheap enough to move on the event loop instead of in a worker.
+        :param batched_agents: Dictionary from agent name to an agent with get_moves(boards), whose moves are
+                               micro-batched across sessions with a MoveBatcher.
+        :param n_workers: Number of processes computing the moves of the other agents.
+        """
+        self.board_factory = board_factory
+        self.move_factory = move_factory
+        self.agent_factories = DEFAULT_AGENT_FACTORIES if agent_factories is None else agent_factories
+        self.inline_agents = {name: self.agent_factories[name]() for name in inline_agents}
+        self.batchers = {name: MoveBatcher(agent, max_batch_size, max_batch_delay)
+                         for name, agent in (batched_agents or {}).items()}
+        self.n_workers = n_workers
+        self.executor = ProcessPoolExecutor(n_workers, mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=_init_agent_worker, initargs=(self.agent_factories,))
+        self.sessions = {}
+        self.next_session_id = 1
+
+    @property
+    def agent_names(self):
+        return set(self.agent_factories) | set(self.batchers)
+
+    async def start(self, host="127.0.0.1", port=8765):
+        """Start the worker processes, then listen. Returns the asyncio.Server; port 0 picks a free port."""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.executor, _worker_ready)
+                               for _ in range(self.n_workers)))
+        return await asyncio.start_server(self._handle_connection, host, port)
+
+    async def close(self):
+        self.executor.shutdown(cancel_futures=True)
+        for batcher in self.batchers.values():
+            await batcher.close()
+
+    async def handle_request(self, request):
+        """Answer one decoded request. Usable without a socket, for example in tests."""
+        try:
+            operation = request.get("op")
+            if operation == "new_game":
+                return await self._new_game(request.get("players", [HUMAN, "minimax"]))
+            session = self.sessions.get(request.get("session"))
+            if session is None:
+                return _error(f"Unknown session {request.get('session')}")
+            if operation == "move":
+                return await self._move(session, request)
+            if operation == "state":
+                return self._respond(session)
+            if operation == "close":
+                del self.sessions[session.session_id]
+                return {"ok": True, "session": session.session_id}
+            return _error(f"Unknown op {operation!r}")
+        except (KeyError, TypeError, ValueError) as error:
+            return _error(f"Malformed request: {error}")
+
+    async def _new_game(self, player_names):
+        if len(player_names) != 2 or any(name != HUMAN and name not in self.agent_names for name in player_names):
+            return _error(f"players must be two of {sorted(self.agent_names | {HUMAN})}")
+        players = [RemotePlayer(f"{HUMAN} {i + 1}") if name == HUMAN else _AgentName(name)
+                   for i, name in enumerate(player_names)]
+        session = GameSession(self.next_session_id, self.board_factory(), players)
+        self.next_session_id += 1
+        self.sessions[session.session_id] = session
+        async with session.lock:
+            await self._play_agent_moves(session)
+            return self._respond(session)
+
+    async def _move(self, session, request):
+        async with session.lock:
+            if session.board.is_game_over or not isinstance(session.player_to_move, RemotePlayer):
+                return _error("It is not the client's turn")
+            move = self.move_factory(int(request["row"]), int(request["column"]))
+            if not session.board.is_legal_move(move):
+                return _error(f"Illegal move {move}")
+            session.board.play_move(move)
+            session.moves.append(move)
+            await self._play_agent_moves(session)
+            return self._respond(session)
+
+    async def _play_agent_moves(self, session):
+        """Play the agents' moves until it is a client's turn or the game is over."""
+        while not session.board.is_game_over and not isinstance(session.player_to_move, RemotePlayer):
+            move = await self._agent_move(session.player_to_move.name, session.board)
+            session.board.play_move(move)
+            session.moves.append(move)
+
+    async def _agent_move(self, name, board):
+        if name in self.batchers:
+            return await self.batchers[name].get_move(board)
+        if name in self.inline_agents:
+            return self.inline_agents[name].get_move(board)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, _worker_agent_move, name,
+                                                                board.snapshot())
+
+    def _respond(self, session):
+        if session.board.is_game_over:
+            self.sessions.pop(session.session_id, None)
+        return {"ok": True, "session": session.session_id, "state": session.state()}
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError as error:
+                    response = _error(f"Invalid JSON: {error}")
+                else:
+                    response = await self.handle_request(request) if isinstance(request, dict) else _error(
+                        "Requests must be JSON objects")
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+class _AgentName(TwoPlayerGameAgent):
+    """Stands in a session's TwoPlayerGame for a server agent, which lives in a worker process or a batcher."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def get_move(self, board):
+        raise RuntimeError("Agent moves are computed by the GameServer")
+
+
+def _error(message):
+    return {"ok": False, "error": message}
+
+
+# Agents of each worker process, created by _init_agent_worker
+_worker_agents = None
+
+
+def _init_agent_worker(agent_factories):
+    global _worker_agents
+    _worker_agents = {name: factory() for name, factory in agent_factories.items()}
+
+
+def _worker_ready():
+    return _worker_agents is not None
+
+
+def _worker_agent_move(name, snapshot):
+    return _worker_agents[name].get_move(snapshot.to_board())
+
+
+async def serve(host, port, **server_options):
+    server = GameServer(**server_options)
+    try:
+        listener = await server.start(host, port)
+        print(f"Serving on {', '.join(str(socket.getsockname()) for socket in listener.sockets)}")
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=2, help="Processes computing minimax moves")
+    parser.add_argument("--ppo-checkpoint", help="Serve a PPO agent, named ppo, loaded from this checkpoint")
+    arguments = parser.parse_args()
+
+    batched_agents = None
+    if arguments.ppo_checkpoint:
+        from tic_tac_toe import TicTacToePPOAgent
+
+        batched_agents = {"ppo": TicTacToePPOAgent("ppo", checkpoint_path=arguments.ppo_checkpoint)}
+    try:
+        asyncio.run(serve(arguments.host, arguments.port, n_workers=arguments.workers, batched_agents=batched_agents))
+    except KeyboardInterrupt:
+        pass
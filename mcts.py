@@ -0,0 +1,315 @@
+"""
+Monte Carlo tree search for any TwoPlayerGameBoard, using only play_move, undo_move and get_possible_moves (and hash
+to find the previous search's subtree again).
+"""
+import math
+import random
+import time
+
+import numpy as np
+
+from two_player_game import TwoPlayerGameAgent, TwoPlayerGameBoard
+
+# CONSTANTS
+# Node status
+UNEXPANDED = 0
+EXPANDED = 1
+TERMINAL = 2
+PENDING = 3  # Waiting in a batch for its evaluation
+
+NO_CHILDREN = -1
+
+
+# END CONSTANTS
+
+
+class MCTSTree:
+    """
+    Nodes of a search tree stored column-wise in NumPy arrays, so that a node costs 37 bytes and no Python object.
+    The children of a node are consecutive, from first_child to first_child + n_children - 1, in the order of the
+    parent's get_possible_moves, so a child's move is found from its offset. value_sums are from the point of view of
+    the player who made the move leading to the node. keys hold the hash of the node's position once it was visited.
+    The arrays grow by doubling.
+    """
+
+    def __init__(self, capacity=2 ** 12):
+        self.size = 0
+        self.capacity = 0
+        self.reserve(capacity)
+
+    def __len__(self):
+        return self.size
+
+    def clear(self):
+        self.size = 0
+
+    def reserve(self, capacity):
+        """Make room for at least capacity nodes, keeping those already stored."""
+        if capacity <= self.capacity:
+            return
+        columns = (("visits", np.int32), ("value_sums", np.float64), ("priors", np.float32),
+                   ("first_child", np.int32), ("n_children", np.int32), ("status", np.int8),
+                   ("terminal_values", np.float32), ("keys", np.int64))
+        for name, dtype in columns:
+            column = np.zeros(capacity, dtype=dtype)
+            if self.capacity:
+                column[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, column)
+        self.capacity = capacity
+
+    def add_nodes(self, n, priors=None):
+        """Append n fresh unexpanded nodes, with the given priors or uniform ones. Return the index of the first."""
+        first = self.size
+        if first + n > self.capacity:
+            self.reserve(max(first + n, 2 * self.capacity))
+        nodes = slice(first, first + n)
+        self.visits[nodes] = 0
+        self.value_sums[nodes] = 0
+        self.priors[nodes] = 1 / n if priors is None else priors
+        self.first_child[nodes] = NO_CHILDREN
+        self.n_children[nodes] = 0
+        self.status[nodes] = UNEXPANDED
+        self.size += n
+        return first
+
+    def expand(self, node, n_children, priors=None):
+        if n_children:
+            self.first_child[node] = self.add_nodes(n_children, priors)
+        self.n_children[node] = n_children
+        self.status[node] = EXPANDED
+
+    def children(self, node):
+        first = int(self.first_child[node])
+        return slice(first, first + int(self.n_children[node])) if first != NO_CHILDREN else slice(0, 0)
+
+
+class MCTSAgent(TwoPlayerGameAgent):
+    """
+    Plays the most visited move after a Monte Carlo tree search. Without an evaluator, leaves are scored by uniformly
+    random playouts and children are selected by UCT. With one, leaves are scored in batches by the evaluator, which
+    also gives the priors of PUCT selection (as in AlphaZero); virtual losses keep the leaves of a batch apart. Values
+    are 1 for a win, 0 for a draw and -1 for a loss.
+
+    The tree is kept between moves: if the new position is the root of the last search or one or two moves below it,
+    that subtree's statistics are reused; otherwise the tree is cleared.
+    """
+
+    def __init__(self, name, n_simulations=1000, time_limit=None, exploration=None, evaluator=None, batch_size=8,
+                 max_nodes=2 ** 22, seed=None):
+        """
+        :param n_simulations: Number of simulations per move, unless time_limit is set.
+        :param time_limit: If set, simulate for this many seconds per move instead.
+        :param exploration: Exploration constant; defaults to sqrt(2) for UCT and 1.5 for PUCT.
+        :param evaluator: Optional leaf evaluator with encode(board), called on each leaf and returning anything
+                          picklable, and evaluate(encodings), returning for each leaf the priors of its moves (in
+                          get_possible_moves order) and its value for the player to move. See TicTacToePPOEvaluator.
+        :param batch_size: Leaves per evaluate call.
+        :param max_nodes: The tree is cleared before a search if it has grown past this, and a search stops early when
+                          it is full.
+        """
+        self.name = name
+        self.n_simulations = n_simulations
+        self.time_limit = time_limit
+        self.exploration = exploration if exploration is not None else (1.5 if evaluator else math.sqrt(2))
+        self.evaluator = evaluator
+        self.batch_size = batch_size if evaluator else 1
+        self.max_nodes = max_nodes
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.tree = MCTSTree()
+        self.root = None
+        self.root_depth = None
+        self.simulations = 0  # Simulations of the last search, including reused ones
+
+    def get_move(self, board: TwoPlayerGameBoard):
+        self.search(board)
+        tree = self.tree
+        children = tree.children(self.root)
+        best = int(np.argmax(tree.visits[children]))
+        return board.get_possible_moves()[best]
+
+    def search(self, board: TwoPlayerGameBoard):
+        """Run one search from board, leaving its statistics in the tree under self.root."""
+        self._set_root(board)
+        tree = self.tree
+        deadline = None if self.time_limit is None else time.perf_counter() + self.time_limit
+        n_done = 0
+        while True:
+            # The root is expanded whatever the budget, so that get_move always has a move to choose
+            if board.is_game_over or tree.status[self.root] == EXPANDED:
+                if n_done >= self.n_simulations if deadline is None else time.perf_counter() >= deadline:
+                    break
+                # Each simulation of a batch can expand a node with at most as many children as the root
+                if tree.size + self.batch_size * len(board.get_possible_moves()) > self.max_nodes:
+                    break
+            n_done += self._simulate_batch(board, self.batch_size if deadline is not None
+                                           else max(min(self.batch_size, self.n_simulations - n_done), 1))
+        self.simulations = int(tree.visits[self.root])
+
+    def root_value(self):
+        """Average value of the last search's root for the player to move there."""
+        tree = self.tree
+        visits = tree.visits[self.root]
+        return -tree.value_sums[self.root] / visits if visits else 0.0
+
+    # HELPER METHODS
+    def _set_root(self, board):
+        tree = self.tree
+        key = hash(board)
+        depth = board.depth()
+        if self.root is not None and tree.size <= self.max_nodes // 2 and 0 <= depth - self.root_depth <= 2:
+            level = np.array([self.root])
+            for _ in range(depth - self.root_depth):
+                level = np.concatenate([np.arange(tree.children(node).start, tree.children(node).stop)
+                                        for node in level.tolist()] or [np.zeros(0, dtype=np.int64)])
+            matches = level[(tree.visits[level] > 0) & (tree.keys[level] == key)]
+            if len(matches):
+                self.root, self.root_depth = int(matches[0]), depth
+                return
+        tree.clear()
+        self.root = tree.add_nodes(1)
+        self.root_depth = depth
+        tree.keys[self.root] = key
+
+    def _simulate_batch(self, board, batch_size):
+        """Run up to batch_size simulations, evaluating their leaves together. Return the number run."""
+        tree = self.tree
+        pending = []  # (leaf, path, encoding)
+        n_done = 0
+        for _ in range(batch_size):
+            path = self._select(board)
+            leaf = path[-1]
+            status = tree.status[leaf]
+            if status == PENDING:
+                # Already waiting in this batch: take back the virtual losses and evaluate what we have
+                self._undo_path(board, path)
+                tree.visits[path] -= 1
+                tree.value_sums[path] += 1
+                break
+            if status == UNEXPANDED and board.is_game_over:
+                tree.status[leaf] = TERMINAL
+                # The player who made the last move won, or it is a draw
+                tree.terminal_values[leaf] = 1.0 if board.winning_player != "" else 0.0
+                status = TERMINAL
+            if status == TERMINAL:
+                self._backup(path, float(tree.terminal_values[leaf]))
+            elif self.evaluator is None:
+                tree.expand(leaf, len(board.get_possible_moves()))
+                self._backup(path, -self._random_playout(board))
+            else:
+                tree.status[leaf] = PENDING
+                pending.append((leaf, path, self.evaluator.encode(board)))
+            self._undo_path(board, path)
+            n_done += 1
+
+        if pending:
+            priors, values = self.evaluator.evaluate([encoding for _, _, encoding in pending])
+            for (leaf, path, _), leaf_priors, value in zip(pending, priors, values):
+                tree.expand(leaf, len(leaf_priors), leaf_priors)
+                self._backup(path, -float(value))
+        return n_done
+
+    def _select(self, board):
+        """Walk from the root to a leaf, playing the moves on board and adding a virtual loss along the way."""
+        tree = self.tree
+        node = self.root
+        path = [node]
+        while tree.status[node] == EXPANDED and tree.n_children[node]:
+            children = tree.children(node)
+            visits = tree.visits[children]
+            # Unvisited children have no value sum, so their average counts as 0
+            q = tree.value_sums[children] / np.maximum(visits, 1)
+            parent_visits = max(int(tree.visits[node]), 1)
+            if self.evaluator is None:
+                exploration = self.exploration * np.sqrt(math.log(parent_visits) / np.maximum(visits, 1))
+                scores = np.where(visits > 0, q + exploration, np.inf)
+            else:
+                scores = q + self.exploration * tree.priors[children] * math.sqrt(parent_visits) / (1 + visits)
+            offset = int(np.argmax(scores))
+            board.play_move(board.get_possible_moves()[offset])
+            node = children.start + offset
+            if not tree.visits[node]:
+                tree.keys[node] = hash(board)
+            path.append(node)
+        path = np.array(path)
+        tree.visits[path] += 1
+        tree.value_sums[path] -= 1
+        return path
+
+    def _backup(self, path, value):
+        """Add value, for the player who moved into the leaf, along path with alternating signs, less virtual losses."""
+        signs = np.where(np.arange(len(path))[::-1] % 2 == 0, 1.0, -1.0)
+        self.tree.value_sums[path] += signs * value + 1
+
+    @staticmethod
+    def _undo_path(board, path):
+        for _ in range(len(path) - 1):
+            board.undo_move()
+
+    def _random_playout(self, board):
+        """Play random moves to the end of the game and back. Return the result for the player to move at the start."""
+        n_moves = 0
+        while not board.is_game_over:
+            board.play_move(self.rng.choice(board.get_possible_moves()))
+            n_moves += 1
+        result = 0 if board.winning_player == "" else (1 if n_moves % 2 == 1 else -1)
+        for _ in range(n_moves):
+            board.undo_move()
+        return result
+
+
+if __name__ == "__main__":
+    from mnk_game import MNKBoard
+    from tic_tac_toe import O, TicTacToeBitBoard, TicTacToeMiniMaxAgent
+    from tournament import play_match
+    from two_player_game import RandomAgent
+
+    # Finds the only move that does not lose
+    board = TicTacToeBitBoard()
+    board.load_state(np.array([[0, 1, 0], [0, 0, 1], [2, 2, 1]]), O)
+    agent = MCTSAgent("mcts", n_simulations=2000, seed=0)
+    move = agent.get_move(board)
+    print(board, move)
+    assert move == TicTacToeMiniMaxAgent("minimax").get_move(board)
+
+    # Reuses the subtree after its move and the opponent's
+    board = TicTacToeBitBoard()
+    board.play_move(agent.get_move(board))
+    board.play_move(board.get_possible_moves()[0])
+    agent.n_simulations = 0
+    agent.search(board)
+    assert agent.simulations > 0
+    print(f"Reused {agent.simulations} simulations")
+
+    # Always has a move, even without a budget
+    for agent in (MCTSAgent("mcts", n_simulations=0), MCTSAgent("mcts", time_limit=0.0), MCTSAgent("mcts", max_nodes=1)):
+        assert TicTacToeBitBoard().is_legal_move(agent.get_move(TicTacToeBitBoard()))
+
+    # Strong against random play, and never loses to it on tic-tac-toe with enough simulations
+    result = play_match(TicTacToeBitBoard, MCTSAgent("mcts", n_simulations=400, seed=1), RandomAgent("random", seed=1),
+                        n_games=100)
+    print(result)
+    assert result.losses == 0
+
+    # Batched leaf evaluation with PPO networks (untrained here, so only the plumbing is checked)
+    from tic_tac_toe import TicTacToePPOEvaluator
+    from tic_tac_toe.PPO_tic_tac_toe import TicTacToePPOTrainer
+
+    agent = MCTSAgent("mcts ppo", n_simulations=800, evaluator=TicTacToePPOEvaluator(TicTacToePPOTrainer()), seed=3)
+    board = TicTacToeBitBoard()
+    start_time = time.perf_counter()
+    move = agent.get_move(board)
+    print(f"PPO evaluator: {move} after {agent.simulations} simulations in {time.perf_counter() - start_time:.2f} s")
+    assert agent.simulations == 800
+    no_budget_agent = MCTSAgent("mcts ppo", n_simulations=0, evaluator=agent.evaluator)
+    assert board.is_legal_move(no_budget_agent.get_move(board))
+    result = play_match(TicTacToeBitBoard, agent, RandomAgent("random", seed=3), n_games=20)
+    print(result)
+
+    # Works on other boards, with a time budget
+    board = MNKBoard(7, 7, 4)
+    agent = MCTSAgent("mcts", time_limit=0.5, seed=2)
+    start_time = time.perf_counter()
+    move = agent.get_move(board)
+    print(f"7,7,4: {move} after {agent.simulations} simulations in {time.perf_counter() - start_time:.2f} s, "
+          f"{len(agent.tree)} nodes")
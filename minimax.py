@@ -1,53 +1,399 @@
-from functools import cache
+import time
+from enum import Flag
 
+from transposition_table import Bound, TranspositionTable
 from two_player_game import *
 
 
-@cache
-def minimax(board, is_maximizing_player, max_depth=float("inf")):
-    return _minimax_helper(board, 0, is_maximizing_player, float("-inf"), float("inf"), max_depth)
+class MoveOrdering(Flag):
+    """Heuristics deciding which moves a search tries first. Earlier cutoffs mean fewer nodes, for the same result."""
+    NONE = 0
+    HASH_MOVE = 1  # The best move stored in the transposition table, which holds the last search's principal variation
+    KILLERS = 2  # Moves that caused a cutoff in a sibling position at the same ply
+    HISTORY = 4  # Moves that caused many cutoffs anywhere in the search, weighted by remaining depth
+    BOARD = 8  # The board's own order_moves, which takes precedence over history
+    ALL = HASH_MOVE | KILLERS | HISTORY | BOARD
 
 
-@cache
-def _minimax_helper(board: TwoPlayerGameBoard, current_search_depth, is_maximizing_player, alpha, beta,
-                    max_depth=float("inf")):
-    if board.is_game_over or current_search_depth >= max_depth:
-        return board.static_evaluation(), None
+class SearchAborted(Exception):
+    """Raised inside a search when its SearchLimits are exceeded. The board is left mid-search."""
 
-    if is_maximizing_player:
-        best_outcome = float("-inf")
-        best_move = None
-        for candidate_move in board.get_possible_moves():
-            board.play_move(candidate_move)
-            candidate_move_value, _ = _minimax_helper(board, current_search_depth + 1, not is_maximizing_player, alpha,
-                                                      beta,
-                                                      max_depth)
-            board.undo_move()
 
-            if candidate_move_value > best_outcome:
-                best_move = candidate_move
-            best_outcome = max(best_outcome, candidate_move_value)
-            alpha = max(alpha, best_outcome)
-            if beta <= alpha:
-                break
+class SearchLimits:
+    """
+    Budget for a search: a wall-clock time limit in seconds, a node limit, and a cancel event (anything with an is_set
+    method, such as a threading.Event). The search raises SearchAborted once any of them is exceeded. The clock and the
+    cancel event are only read every CHECK_INTERVAL nodes.
+    """
+    CHECK_INTERVAL = 256
 
-        return best_outcome, best_move
+    def __init__(self, time_limit=None, node_limit=None, cancel_event=None):
+        self.deadline = None if time_limit is None else time.perf_counter() + time_limit
+        self.node_limit = float("inf") if node_limit is None else node_limit
+        self.cancel_event = cancel_event
 
-    else:
-        best_outcome = float("inf")
-        best_move = None
-        for candidate_move in board.get_possible_moves():
-            board.play_move(candidate_move)
-            candidate_move_value, _ = _minimax_helper(board, current_search_depth + 1, not is_maximizing_player, alpha,
-                                                      beta,
-                                                      max_depth)
-            board.undo_move()
-
-            if candidate_move_value < best_outcome:
-                best_move = candidate_move
-            best_outcome = min(best_outcome, candidate_move_value)
-            beta = min(beta, best_outcome)
+    def next_check(self, nodes):
+        """The node count at which the budget should next be checked."""
+        if self.deadline is None and self.cancel_event is None:
+            return self.node_limit
+        return min(nodes + self.CHECK_INTERVAL, self.node_limit)
+
+    def exceeded(self, nodes):
+        return (nodes >= self.node_limit
+                or (self.deadline is not None and time.perf_counter() >= self.deadline)
+                or (self.cancel_event is not None and self.cancel_event.is_set()))
+
+
+class SearchStatistics:
+    """
+    Counters, timing and the principal variation of one or more searches. Pass the same object to several searches, or
+    merge objects from different searches (for example from every agent in a tournament), to add up their counts.
+    Searches only time themselves and extract their principal variation when given a SearchStatistics.
+    """
+
+    def __init__(self):
+        self.searches = 0
+        self.nodes = 0
+        self.interior_nodes = 0  # Positions whose moves were searched, rather than evaluated or found in the table
+        self.moves_searched = 0  # Moves played from interior nodes, which is every node but the roots
+        self.cutoffs = 0  # Positions where a move failed high, so the remaining moves were skipped
+        self.first_move_cutoffs = 0  # Cutoffs caused by the first move tried, a measure of move ordering quality
+        self.table_cutoffs = 0  # Positions answered by a transposition table entry without searching their moves
+        self.table_hits = 0
+        self.table_misses = 0
+        # Sum over searches of the depth searched to: max_depth or, if unlimited, the plies to the end of the game along
+        # the principal variation, which counts the subtrees answered by the table
+        self.total_depth = 0
+        self.max_ply = 0  # Deepest ply visited by any search
+        self.elapsed_seconds = 0.0
+        self.principal_variation = []  # Of the most recent search
+
+    def merge(self, other):
+        """Add the counts of other to this object. The principal variation of other is kept if it has one."""
+        for name in ("searches", "nodes", "interior_nodes", "moves_searched", "cutoffs", "first_move_cutoffs",
+                     "table_cutoffs", "table_hits", "table_misses", "total_depth", "elapsed_seconds"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.max_ply = max(self.max_ply, other.max_ply)
+        if other.principal_variation:
+            self.principal_variation = list(other.principal_variation)
+
+    @property
+    def average_depth(self):
+        return self.total_depth / self.searches if self.searches else 0.0
+
+    @property
+    def branching_factor(self):
+        """Average number of moves searched per interior node, which better move ordering brings down."""
+        return self.moves_searched / self.interior_nodes if self.interior_nodes else 0.0
+
+    @property
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    @property
+    def table_hit_rate(self):
+        lookups = self.table_hits + self.table_misses
+        return self.table_hits / lookups if lookups else 0.0
+
+    @property
+    def nodes_per_second(self):
+        return self.nodes / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def _record(self, search, table_hits, table_misses, depth, elapsed_seconds, principal_variation):
+        self.searches += 1
+        self.nodes += search.nodes
+        self.interior_nodes += search.interior_nodes
+        self.moves_searched += search.nodes - search.roots
+        self.cutoffs += search.cutoffs
+        self.first_move_cutoffs += search.first_move_cutoffs
+        self.table_cutoffs += search.table_cutoffs
+        self.table_hits += table_hits
+        self.table_misses += table_misses
+        self.total_depth += depth
+        self.max_ply = max(self.max_ply, search.max_ply)
+        self.elapsed_seconds += elapsed_seconds
+        self.principal_variation = principal_variation
+
+    def __str__(self):
+        return (f"SearchStatistics({self.searches} searches, {self.nodes} nodes in {self.elapsed_seconds:.3f} s "
+                f"({self.nodes_per_second:.0f}/s), branching factor {self.branching_factor:.2f}, "
+                f"{self.cutoffs} cutoffs ({self.first_move_cutoff_rate:.1%} on the first move), "
+                f"table hit rate {self.table_hit_rate:.1%}, average depth {self.average_depth:.1f}, "
+                f"max ply {self.max_ply}, principal variation {' '.join(map(str, self.principal_variation))})")
+
+
+def minimax(board, is_maximizing_player, max_depth=float("inf"), table: TranspositionTable = None,
+            move_ordering=MoveOrdering.ALL, statistics: SearchStatistics = None, on_node=None):
+    """
+    Search the game tree below board with alpha-beta pruning.
+    :param board: The TwoPlayerGameBoard to search. It is mutated during the search and restored afterwards.
+    :param is_maximizing_player: Whether the player to move is trying to maximize the static evaluation.
+    :param max_depth: How many plies to search before falling back to the static evaluation.
+    :param table: TranspositionTable to read and fill. Pass the same table to later calls to reuse its results; if None,
+                  a fresh table is used for this call only.
+    :param move_ordering: MoveOrdering heuristics to use.
+    :param statistics: SearchStatistics to add this search's counters, time and principal variation to, or None.
+    :param on_node: Function called as on_node(board, ply) on entering every position, for tracing, or None.
+    :return: The value of the position and the best move (None if the game is over).
+    """
+    search = _Search(TranspositionTable() if table is None else table, move_ordering, on_node=on_node)
+    search.max_depth = max_depth
+    trace = _SearchTrace(search, statistics)
+    color = 1 if is_maximizing_player else -1
+    value, best_move = _negamax(search, board, 0, float("-inf"), float("inf"), color)
+    trace.record(board, is_maximizing_player, max_depth)
+    return color * value, best_move
+
+
+def iterative_deepening_minimax(board, is_maximizing_player, time_limit=None, node_limit=None, cancel_event=None,
+                                max_depth=float("inf"), table: TranspositionTable = None,
+                                move_ordering=MoveOrdering.ALL, statistics: SearchStatistics = None, on_node=None,
+                                on_depth=None):
+    """
+    Search to depth 1, 2, 3, ... until the budget runs out or the game is solved, and return the result of the deepest
+    search that completed. Each search leaves its principal variation in the transposition table, and the next one
+    tries those moves first. The depth 1 search always completes, so a move is returned however small the budget.
+    :param board: The TwoPlayerGameBoard to search. It is restored afterwards, even when a search is aborted.
+    :param time_limit: Seconds to search for, or None.
+    :param node_limit: Number of positions to visit over all depths, or None.
+    :param cancel_event: Object whose is_set method returns True once the caller wants the search to stop, or None.
+    :param max_depth: Deepest search to run.
+    :param table: As in minimax. Keeping a table across moves lets each search start from the last one's results.
+    :param move_ordering: As in minimax. Killer moves and history are kept from one depth to the next.
+    :param statistics: As in minimax, counting every depth including an aborted one as a single search.
+    :param on_node: As in minimax.
+    :param on_depth: Function called as on_depth(depth, value, best_move, nodes, elapsed_seconds) after each completed
+                     depth, with the nodes and time used so far, or None.
+    :return: The value and best move from the deepest completed search, and its depth.
+    """
+    start_time = time.perf_counter()
+    search = _Search(TranspositionTable() if table is None else table, move_ordering,
+                     SearchLimits(time_limit, node_limit, cancel_event), on_node)
+    trace = _SearchTrace(search, statistics)
+    color = 1 if is_maximizing_player else -1
+    start_depth = board.depth()
+    result = board.static_evaluation(), None, 0
+    depth = 1
+    while depth <= max_depth:
+        if depth == 1:
+            search.next_check = float("inf")
+        elif search.limits.exceeded(search.nodes):
+            break
+        else:
+            search.next_check = search.limits.next_check(search.nodes)
+        search.max_depth = depth
+        search.horizon_nodes = 0
+        try:
+            value, best_move = _negamax(search, board, 0, float("-inf"), float("inf"), color)
+        except SearchAborted:
+            while board.depth() > start_depth:
+                board.undo_move()
+            break
+        result = color * value, best_move, depth
+        if on_depth is not None:
+            on_depth(depth, color * value, best_move, search.nodes, time.perf_counter() - start_time)
+        if search.horizon_nodes == 0:
+            break
+        depth += 1
+    trace.record(board, is_maximizing_player, result[2])
+    return result
+
+
+def principal_variation(board, is_maximizing_player, table: TranspositionTable, max_length=None):
+    """
+    Follow the best moves stored in table from board, the line of play a search through table expects. The line stops
+    where the table has no move, or after max_length moves. The board is restored afterwards, and the table's hit and
+    miss counters are not touched.
+    :return: The list of moves.
+    """
+    moves = []
+    while not board.is_game_over and (max_length is None or len(moves) < max_length):
+        canonical_key, transform = board.canonical_key()
+        entry = table.peek(2 * canonical_key + is_maximizing_player)
+        if entry is None or entry.best_move is None:
+            break
+        move = board.untransform_move(entry.best_move, transform)
+        if not board.is_legal_move(move):
+            break
+        board.play_move(move)
+        moves.append(move)
+        is_maximizing_player = not is_maximizing_player
+    for _ in moves:
+        board.undo_move()
+    return moves
+
+
+class _SearchTrace:
+    """Times a search and records it in a SearchStatistics. Does nothing if statistics is None."""
+
+    def __init__(self, search, statistics):
+        self.search = search
+        self.statistics = statistics
+        if statistics is not None:
+            self.table_hits, self.table_misses = search.table.hits, search.table.misses
+            self.start_time = time.perf_counter()
+
+    def record(self, board, is_maximizing_player, depth):
+        """Record the search, which went depth plies deep; an unlimited one, to the end of its principal variation."""
+        if self.statistics is None:
+            return
+        elapsed_seconds = time.perf_counter() - self.start_time
+        table = self.search.table
+        moves = principal_variation(board, is_maximizing_player, table)
+        if depth == float("inf"):
+            depth = max(len(moves), self.search.max_ply)
+        self.statistics._record(self.search, table.hits - self.table_hits, table.misses - self.table_misses, depth,
+                                elapsed_seconds, moves)
+
+
+class _Search:
+    """State shared by the nodes of a search: the table, the budget, the move ordering heuristics and the counters."""
+    # Cap on the remaining depth used to weight history, since searches to the end of the game have infinite depth
+    MAX_HISTORY_DEPTH = 16
+
+    def __init__(self, table, move_ordering, limits=None, on_node=None):
+        self.table = table
+        self.limits = limits
+        self.on_node = on_node
+        self.max_depth = float("inf")
+        self.next_check = float("inf") if limits is None else limits.next_check(0)
+        self.use_hash_move = MoveOrdering.HASH_MOVE in move_ordering
+        self.use_killers = MoveOrdering.KILLERS in move_ordering
+        self.use_history = MoveOrdering.HISTORY in move_ordering
+        self.use_board_order = MoveOrdering.BOARD in move_ordering
+        self.killers = []  # Up to two moves per ply, most recent first
+        self.history = {}
+        self.nodes = 0
+        self.roots = 0
+        self.interior_nodes = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.table_cutoffs = 0
+        self.max_ply = 0
+        # Number of positions whose value came from the static evaluation of an unfinished game, directly or through
+        # the table. If a search has none, it solved the game and searching deeper cannot change the result.
+        self.horizon_nodes = 0
+
+    def check_limits(self):
+        if self.limits.exceeded(self.nodes):
+            raise SearchAborted()
+        self.next_check = self.limits.next_check(self.nodes)
+
+    def ordered_moves(self, board, ply, hash_move):
+        moves = board.get_possible_moves()
+        if self.use_history and self.history:
+            moves = sorted(moves, key=lambda move: self.history.get(move, 0), reverse=True)
+        if self.use_board_order:
+            # Game knowledge comes first; a stable order_moves leaves history to break its ties
+            moves = board.order_moves(moves)
+
+        first_moves = []
+        if self.use_hash_move and hash_move is not None and board.is_legal_move(hash_move):
+            first_moves.append(hash_move)
+        if self.use_killers and ply < len(self.killers):
+            for killer in self.killers[ply]:
+                if killer not in first_moves and board.is_legal_move(killer):
+                    first_moves.append(killer)
+        if not first_moves:
+            return moves
+        return first_moves + [move for move in moves if move not in first_moves]
+
+    def record_cutoff(self, move, ply, remaining_depth, move_number):
+        self.cutoffs += 1
+        if move_number == 0:
+            self.first_move_cutoffs += 1
+        if self.use_killers:
+            while len(self.killers) <= ply:
+                self.killers.append([])
+            killers = self.killers[ply]
+            if move not in killers:
+                killers.insert(0, move)
+                del killers[2:]
+        if self.use_history:
+            weight = min(remaining_depth, self.MAX_HISTORY_DEPTH)
+            self.history[move] = self.history.get(move, 0) + weight * weight
+
+
+def _negamax(search, board: TwoPlayerGameBoard, ply, alpha, beta, color):
+    """
+    Return the value of board for the player to move, who is the maximizing player if color is 1 and the minimizing
+    player if it is -1, along with the best move.
+    """
+    search.nodes += 1
+    if search.nodes >= search.next_check:
+        search.check_limits()
+    if search.on_node is not None:
+        search.on_node(board, ply)
+    if ply > search.max_ply:
+        search.max_ply = ply
+    elif ply == 0:
+        search.roots += 1
+    if board.is_game_over:
+        return color * board.static_evaluation(), None
+    if ply >= search.max_depth:
+        search.horizon_nodes += 1
+        return color * board.static_evaluation(), None
+
+    # Probe the transposition table. Symmetric positions share an entry, with best moves stored relative to the
+    # canonical position. Entries from a shallower search cannot be trusted here, but their best move is still tried
+    # first. Bounds are not used at the root: narrowing the window there would let a move whose value is only a bound
+    # be returned as the best move.
+    remaining_depth = search.max_depth - ply
+    canonical_key, transform = board.canonical_key()
+    key = 2 * canonical_key + (color == 1)
+    entry = search.table.lookup(key)
+    hash_move = None
+    if entry is not None:
+        hash_move = _untransform_move(board, entry.best_move, transform)
+        if entry.depth >= remaining_depth:
+            # Only solved subtrees are stored with infinite depth; anything else depends on the static evaluation
+            if entry.depth != float("inf"):
+                search.horizon_nodes += 1
+            if entry.bound is Bound.EXACT:
+                search.table_cutoffs += 1
+                return entry.value, hash_move
+            if ply > 0:
+                if entry.bound is Bound.LOWER:
+                    alpha = max(alpha, entry.value)
+                else:
+                    beta = min(beta, entry.value)
+                if beta <= alpha:
+                    search.table_cutoffs += 1
+                    return entry.value, hash_move
+    window_alpha = alpha
+    horizon_nodes_before = search.horizon_nodes
+    search.interior_nodes += 1
+
+    best_value = float("-inf")
+    best_move = None
+    for move_number, candidate_move in enumerate(search.ordered_moves(board, ply, hash_move)):
+        board.play_move(candidate_move)
+        candidate_move_value = -_negamax(search, board, ply + 1, -beta, -alpha, -color)[0]
+        board.undo_move()
+
+        if candidate_move_value > best_value:
+            best_value = candidate_move_value
+            best_move = candidate_move
+            alpha = max(alpha, best_value)
             if beta <= alpha:
+                search.record_cutoff(candidate_move, ply, remaining_depth, move_number)
                 break
 
-        return best_outcome, best_move
+    # A value outside the search window is only a bound on the true value
+    if best_value <= window_alpha:
+        bound = Bound.UPPER
+    elif best_value >= beta:
+        bound = Bound.LOWER
+    else:
+        bound = Bound.EXACT
+    # A subtree searched to the end of the game holds at any depth
+    if search.horizon_nodes == horizon_nodes_before:
+        remaining_depth = float("inf")
+    canonical_best_move = None if best_move is None else board.transform_move(best_move, transform)
+    search.table.store(key, best_value, canonical_best_move, remaining_depth, bound)
+
+    return best_value, best_move
+
+
+def _untransform_move(board, move, transform):
+    return None if move is None else board.untransform_move(move, transform)
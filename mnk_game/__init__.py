@@ -0,0 +1,22 @@
+from importlib import import_module
+
+# Names exported by the package, and the submodule that defines each of them, imported on first use as in tic_tac_toe
+_EXPORTS = {
+    "MNKBoard": ".mnk_game",
+    "MNKMove": ".mnk_game",
+    "MNKSnapshot": ".mnk_game",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value  # Later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
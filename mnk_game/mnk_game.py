@@ -0,0 +1,466 @@
+from functools import cache
+from weakref import WeakValueDictionary
+
+import numpy as np
+
+from tic_tac_toe.tic_tac_toe_game import X, O, EMPTY, TIC_TAC_TOE_DISPLAY
+from two_player_game import *
+
+# CONSTANTS
+# Heuristic value of a window of k squares holding c stones of a single player is WINDOW_WEIGHT_BASE ** (c - 1)
+WINDOW_WEIGHT_BASE = 4
+# Line directions as (row step, column step): across, down, and both diagonals
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+ZOBRIST_SEED = 20240101
+# Square values, read once: looking up an Enum member's value is slow in the per-move code
+EMPTY_VALUE, X_VALUE, O_VALUE = EMPTY.value, X.value, O.value
+
+
+# END CONSTANTS
+
+
+class MNKMove(TwoPlayerGameMove):
+    """
+    Immutable move on square (row, column). Moves are interned, like TicTacToeMove, while referenced: every board size
+    in use keeps the moves of its squares, and other moves are dropped once unused.
+    """
+    __slots__ = ("row", "column", "__weakref__")
+
+    def __new__(cls, row, column):
+        row, column = int(row), int(column)
+        move = _INTERNED_MOVES.get((row, column))
+        if move is None:
+            move = super().__new__(cls)
+            object.__setattr__(move, "row", row)
+            object.__setattr__(move, "column", column)
+            _INTERNED_MOVES[row, column] = move
+        return move
+
+    def __init__(self, row, column):
+        pass
+
+    def __setattr__(self, name, value):
+        raise AttributeError("MNKMove is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("MNKMove is immutable")
+
+    def __reduce__(self):
+        return MNKMove, (self.row, self.column)
+
+    def __str__(self):
+        return str((self.row + 1, self.column + 1))
+
+    def __repr__(self):
+        return f"MNKMove({self.row}, {self.column})"
+
+    def __eq__(self, other):
+        if not isinstance(other, MNKMove):
+            return False
+        return self.row == other.row and self.column == other.column
+
+    def __hash__(self):
+        return hash((self.row, self.column))
+
+
+_INTERNED_MOVES = WeakValueDictionary()
+
+
+class MNKSnapshot(TwoPlayerGameSnapshot):
+    """
+    Immutable m,n,k-game position: the board size, the square values as bytes and whether X moves next. Taking one
+    copies the squares into a bytes object of m * n bytes, which is also about what it pickles to; restoring one
+    rebuilds the board's incremental state from the stones, as load_state does.
+    """
+    __slots__ = ("m", "n", "k", "cells", "x_to_move")
+
+    def __new__(cls, m, n, k, cells, x_to_move):
+        assert len(cells) == m * n, "One value per square"
+        snapshot = super().__new__(cls)
+        for name, value in (("m", int(m)), ("n", int(n)), ("k", int(k)), ("cells", bytes(cells)),
+                            ("x_to_move", bool(x_to_move))):
+            object.__setattr__(snapshot, name, value)
+        return snapshot
+
+    def __init__(self, m, n, k, cells, x_to_move):
+        pass
+
+    def __setattr__(self, name, value):
+        raise AttributeError("MNKSnapshot is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("MNKSnapshot is immutable")
+
+    def __reduce__(self):
+        return MNKSnapshot, (self.m, self.n, self.k, self.cells, self.x_to_move)
+
+    @property
+    def next_player(self):
+        return X if self.x_to_move else O
+
+    def to_board(self):
+        board = MNKBoard(self.m, self.n, self.k)
+        board.restore(self)
+        return board
+
+    def __eq__(self, other):
+        if not isinstance(other, MNKSnapshot):
+            return False
+        return ((self.m, self.n, self.k, self.cells, self.x_to_move)
+                == (other.m, other.n, other.k, other.cells, other.x_to_move))
+
+    def __hash__(self):
+        # Bytes cache their own hash, so this does not rehash the squares
+        return hash((self.m, self.n, self.k, self.cells, self.x_to_move))
+
+    def __repr__(self):
+        return f"MNKSnapshot({self.m}, {self.n}, {self.k}, {self.cells!r}, {self.x_to_move})"
+
+
+class _Geometry:
+    """
+    Lookup tables shared by every board of one size, indexed by square row * n + column. A window is a run of k squares
+    in a row, column or diagonal; a player wins by filling one.
+    """
+
+    def __init__(self, m, n, k):
+        n_squares = m * n
+        self.moves = tuple(MNKMove(square // n, square % n) for square in range(n_squares))
+
+        windows = []
+        for row in range(m):
+            for column in range(n):
+                for row_step, column_step in DIRECTIONS:
+                    end_row, end_column = row + (k - 1) * row_step, column + (k - 1) * column_step
+                    if 0 <= end_row < m and 0 <= end_column < n:
+                        windows.append([(row + i * row_step) * n + column + i * column_step for i in range(k)])
+        self.n_windows = len(windows)
+        self.windows = tuple(tuple(window) for window in windows)
+        windows_through_square = [[] for _ in range(n_squares)]
+        for window_index, window in enumerate(windows):
+            for square in window:
+                windows_through_square[square].append(window_index)
+        self.windows_through_square = tuple(tuple(indices) for indices in windows_through_square)
+
+        # window_weights[c] scores a window holding c stones of one player and none of the other. Wins score more
+        # than any sum of window weights, less the depth so that faster wins are preferred.
+        self.window_weights = (0,) + tuple(WINDOW_WEIGHT_BASE ** (count - 1) for count in range(1, k + 1))
+        self.winning_score = self.n_windows * self.window_weights[k] + n_squares + 1
+
+        # Square permutations of the symmetries of the board: the 8 rotations and reflections of a square board, or
+        # the 4 reflections and half turn of a rectangular one. Square i of the transformed board holds square
+        # symmetries[t][i] of the original.
+        squares = np.arange(n_squares).reshape((m, n))
+        if m == n:
+            grids = [np.rot90(grid, turns) for grid in (squares, squares.T) for turns in range(4)]
+        else:
+            grids = [squares, squares[::-1], squares[:, ::-1], squares[::-1, ::-1]]
+        self.symmetries = np.array([grid.flatten() for grid in grids])
+        self.inverse_symmetries = np.argsort(self.symmetries, axis=1)
+
+        # Zobrist keys: symmetric_zobrist[square][value][t] is the key of a stone of value on square, as seen on the
+        # board transformed by symmetry t. The seed is fixed so hashes agree across processes.
+        rng = np.random.default_rng(ZOBRIST_SEED)
+        zobrist = rng.integers(0, 2 ** 62, size=(n_squares, 3)).tolist()
+        self.symmetric_zobrist = tuple(
+            tuple(tuple(zobrist[int(self.inverse_symmetries[t, square])][value] for t in range(len(grids)))
+                  for value in range(3))
+            for square in range(n_squares))
+
+        # Neighbors of each square, and squares ranked by distance from the center for move ordering
+        self.neighbors = tuple(tuple(other_row * n + other_column
+                                     for other_row in range(max(row - 1, 0), min(row + 2, m))
+                                     for other_column in range(max(column - 1, 0), min(column + 2, n))
+                                     if (other_row, other_column) != (row, column))
+                               for row, column in (divmod(square, n) for square in range(n_squares)))
+        distances = [abs(row - (m - 1) / 2) + abs(column - (n - 1) / 2)
+                     for row, column in (divmod(square, n) for square in range(n_squares))]
+        self.center_rank = tuple(int(rank) for rank in np.argsort(np.argsort(distances, kind="stable")))
+
+
+@cache
+def _geometry(m, n, k):
+    return _Geometry(m, n, k)
+
+
+class MNKBoard(TwoPlayerGameBoard):
+    """
+    Board of m rows and n columns where the first player to get k in a row (across, down or diagonally) wins, such as
+    tic-tac-toe (3, 3, 3) or gomoku (15, 15, 5). Squares use the same values as TicTacToeBoard (EMPTY, X, O).
+
+    Every move updates the board incrementally: only the windows of k squares through the played square are checked
+    for a win, and a heuristic evaluation, the Zobrist hash under each symmetry and the neighbor counts used for move
+    ordering are kept up to date, so all of them cost O(k) per move rather than a scan of the board.
+    """
+
+    def __init__(self, m=3, n=3, k=3):
+        assert m > 0 and n > 0 and 0 < k <= max(m, n), "k must fit on the board"
+        self.name = f"{m},{n},{k}-game"
+        self.m, self.n, self.k = m, n, k
+        self.geometry = _geometry(m, n, k)
+        self.cells = None
+        self.window_counts = None
+        self.neighbor_counts = None
+        self.evaluation = 0
+        self.symmetric_hashes = None
+        self.n_stones = 0
+        self.next_player = None
+        self.next_next_player = None
+        self.is_game_over = False
+        self.move_history = None
+        self.winning_player = ""
+        self.reset()
+
+    def reset(self):
+        geometry = self.geometry
+        self.cells = [EMPTY.value] * (self.m * self.n)
+        # window_counts[value][window] is the number of stones of value in the window
+        self.window_counts = ([], [0] * geometry.n_windows, [0] * geometry.n_windows)
+        self.neighbor_counts = [0] * (self.m * self.n)
+        self.evaluation = 0
+        self.symmetric_hashes = [0] * len(geometry.symmetries)
+        self.n_stones = 0
+        self.next_player = X
+        self.next_next_player = O
+        self.is_game_over = False
+        self.move_history = []
+        self.winning_player = ""
+
+    def play_move(self, move: MNKMove):
+        row, column = move.row, move.column
+        assert 0 <= row < self.m and 0 <= column < self.n, "Attempted move outside board"
+        assert not self.is_game_over, "Attempted move after game over without resetting"
+        square = row * self.n + column
+        assert self.cells[square] == EMPTY_VALUE, "Attempted repeat move without resetting"
+        self.move_history.append(square)
+        won = self._place(square, self.next_player.value)
+        if won:
+            self.is_game_over = True
+            self.winning_player = self.next_player.name
+        elif self.n_stones == self.m * self.n:
+            self.is_game_over = True
+        self._switch_active_player()
+
+    def undo_move(self):
+        assert len(self.move_history), "Attempted to undo move without making any"
+        self._remove(self.move_history.pop())
+        self._switch_active_player()
+        # A finished game cannot be continued, so the position before the last move was not finished
+        self.is_game_over = False
+        self.winning_player = ""
+
+    def get_possible_moves(self):
+        if self.is_game_over:
+            return ()
+        moves = self.geometry.moves
+        return [moves[square] for square, value in enumerate(self.cells) if value == EMPTY_VALUE]
+
+    def is_legal_move(self, move: MNKMove):
+        return (not self.is_game_over and 0 <= move.row < self.m and 0 <= move.column < self.n
+                and self.cells[move.row * self.n + move.column] == EMPTY_VALUE)
+
+    def load_state(self, state, active_player=X):
+        """Set up the position in an (m, n) array of square values. The array is copied."""
+        self._load_cells(np.array(state).reshape((self.m, self.n)).flatten().tolist(), active_player)
+
+    def depth(self):
+        return self.n_stones
+
+    def snapshot(self):
+        return MNKSnapshot(self.m, self.n, self.k, bytes(self.cells), self.next_player is X)
+
+    def restore(self, snapshot: MNKSnapshot):
+        assert (snapshot.m, snapshot.n, snapshot.k) == (self.m, self.n, self.k), "Snapshot of a different game"
+        self._load_cells(snapshot.cells, snapshot.next_player)
+
+    def static_evaluation(self):
+        """
+        Exact for finished games (+-(winning_score - depth), or 0 for a draw). Otherwise a heuristic from X's point of
+        view: each window still open to only one player counts WINDOW_WEIGHT_BASE ** (stones - 1) for that player.
+        """
+        if self.is_game_over:
+            if self.winning_player == X.name:
+                return self.geometry.winning_score - self.n_stones
+            if self.winning_player == O.name:
+                return -(self.geometry.winning_score - self.n_stones)
+            return 0
+        return self.evaluation
+
+    def order_moves(self, moves):
+        """Squares next to more stones first, then squares closer to the center."""
+        neighbor_counts, center_rank, n = self.neighbor_counts, self.geometry.center_rank, self.n
+        n_squares = self.m * n
+        return sorted(moves, key=lambda move: center_rank[move.row * n + move.column]
+                      - n_squares * neighbor_counts[move.row * n + move.column])
+
+    def canonical_key(self):
+        """Return the smallest Zobrist hash over the symmetries of the board, and the symmetry that produces it."""
+        key = min(self.symmetric_hashes)
+        return key, self.symmetric_hashes.index(key)
+
+    def transform_move(self, move: MNKMove, symmetry):
+        return self.geometry.moves[self.geometry.inverse_symmetries[symmetry, move.row * self.n + move.column]]
+
+    def untransform_move(self, move: MNKMove, symmetry):
+        return self.geometry.moves[self.geometry.symmetries[symmetry, move.row * self.n + move.column]]
+
+    # NON-OVERRIDES
+    @property
+    def state(self):
+        """The board as an (m, n) array of square values, as in TicTacToeBoard. Computed on each access."""
+        return np.array(self.cells).reshape((self.m, self.n))
+
+    @property
+    def winning_score(self):
+        return self.geometry.winning_score
+
+    # HELPER METHODS
+    def _load_cells(self, cells, active_player):
+        """Set up the position with the given value on each square, from an empty board."""
+        self.reset()
+        won_by = None
+        for square, value in enumerate(cells):
+            if value != EMPTY_VALUE and self._place(square, value):
+                won_by = value
+        if won_by is not None:
+            self.is_game_over = True
+            self.winning_player = X.name if won_by == X_VALUE else O.name
+        elif self.n_stones == self.m * self.n:
+            self.is_game_over = True
+        self.next_player = active_player
+        self.next_next_player = X if active_player == O else O
+
+    def _place(self, square, value):
+        """Put a stone of value on square and update the incremental state. Return whether it completes a window."""
+        geometry = self.geometry
+        own_counts, other_counts = self.window_counts[value], self.window_counts[X_VALUE + O_VALUE - value]
+        weights = geometry.window_weights
+        sign = 1 if value == X_VALUE else -1
+        won = False
+        for window in geometry.windows_through_square[square]:
+            count, other_count = own_counts[window], other_counts[window]
+            if not other_count:
+                self.evaluation += sign * (weights[count + 1] - weights[count])
+            elif not count:
+                # The window was the other player's and is now blocked
+                self.evaluation += sign * weights[other_count]
+            own_counts[window] = count + 1
+            if count + 1 == self.k:
+                won = True
+        for neighbor in geometry.neighbors[square]:
+            self.neighbor_counts[neighbor] += 1
+        self.symmetric_hashes = [symmetric_hash ^ key for symmetric_hash, key
+                                 in zip(self.symmetric_hashes, geometry.symmetric_zobrist[square][value])]
+        self.cells[square] = value
+        self.n_stones += 1
+        return won
+
+    def _remove(self, square):
+        """Undo _place for the stone on square."""
+        geometry = self.geometry
+        value = self.cells[square]
+        own_counts, other_counts = self.window_counts[value], self.window_counts[X_VALUE + O_VALUE - value]
+        weights = geometry.window_weights
+        sign = 1 if value == X_VALUE else -1
+        for window in geometry.windows_through_square[square]:
+            count, other_count = own_counts[window] - 1, other_counts[window]
+            if not other_count:
+                self.evaluation -= sign * (weights[count + 1] - weights[count])
+            elif not count:
+                self.evaluation -= sign * weights[other_count]
+            own_counts[window] = count
+        for neighbor in geometry.neighbors[square]:
+            self.neighbor_counts[neighbor] -= 1
+        self.symmetric_hashes = [symmetric_hash ^ key for symmetric_hash, key
+                                 in zip(self.symmetric_hashes, geometry.symmetric_zobrist[square][value])]
+        self.cells[square] = EMPTY_VALUE
+        self.n_stones -= 1
+
+    def _switch_active_player(self):
+        self.next_player, self.next_next_player = self.next_next_player, self.next_player
+
+    def __str__(self):
+        grid_row = "+" + "---+" * self.n
+        s = "\n" + grid_row + "\n"
+        for row in range(self.m):
+            s += "|" + "|".join(f" {TIC_TAC_TOE_DISPLAY[value]} "
+                                for value in self.cells[row * self.n:(row + 1) * self.n]) + "|\n"
+            s += grid_row + "\n"
+        return s
+
+    def __hash__(self):
+        return self.symmetric_hashes[0]
+
+    def __eq__(self, other):
+        if not isinstance(other, MNKBoard):
+            return False
+        return (self.m, self.n, self.k) == (other.m, other.n, other.k) and self.cells == other.cells
+
+
+if __name__ == "__main__":
+    import pickle
+    import random
+
+    from minimax import minimax
+    from tic_tac_toe.tic_tac_toe_game import TicTacToeBoard, TicTacToeMove
+
+    rng = random.Random(0)
+
+    # Moves stay interned while a board size holds them, and the table does not keep the others
+    assert MNKMove(2, 1) is MNKBoard(3, 3, 3).geometry.moves[7]
+    MNKMove(1000, 1000)
+    assert (1000, 1000) not in _INTERNED_MOVES
+
+    # The 3,3,3-game is tic-tac-toe: random games must end the same way on both boards
+    for game in range(500):
+        board, reference = MNKBoard(3, 3, 3), TicTacToeBoard()
+        while not reference.is_game_over:
+            move = rng.choice(list(reference.get_possible_moves()))
+            reference.play_move(move)
+            board.play_move(MNKMove(move.row, move.column))
+            assert board.is_game_over == reference.is_game_over
+            assert board.winning_player == reference.winning_player
+            assert sorted(map(repr, board.get_possible_moves())) == sorted(
+                repr(MNKMove(move.row, move.column)) for move in reference.get_possible_moves())
+    print(board)
+
+    # Undo restores everything, and the incremental evaluation matches a recount of the open windows
+    for m, n, k in ((4, 4, 3), (5, 7, 4), (15, 15, 5)):
+        board = MNKBoard(m, n, k)
+        empty_hashes = list(board.symmetric_hashes)
+        while not board.is_game_over:
+            board.play_move(rng.choice(board.get_possible_moves()))
+            cells = board.cells
+            expected = 0
+            for window in board.geometry.windows:
+                x_count = sum(cells[square] == X.value for square in window)
+                o_count = sum(cells[square] == O.value for square in window)
+                if not o_count:
+                    expected += board.geometry.window_weights[x_count]
+                elif not x_count:
+                    expected -= board.geometry.window_weights[o_count]
+            assert board.evaluation == expected
+            copy = MNKBoard(m, n, k)
+            copy.load_state(board.state, board.next_player)
+            assert copy == board and hash(copy) == hash(board) and copy.is_game_over == board.is_game_over
+            # So does restoring a snapshot, which survives pickling
+            snapshot = pickle.loads(pickle.dumps(board.snapshot()))
+            assert snapshot == copy.snapshot() and hash(snapshot) == hash(copy.snapshot())
+            restored = MNKBoard(m, n, k)
+            restored.restore(snapshot)
+            assert restored == board and restored.evaluation == board.evaluation
+            assert restored.is_game_over == board.is_game_over and restored.next_player is board.next_player
+            # Symmetric positions share a canonical key
+            symmetry = rng.randrange(len(board.geometry.symmetries))
+            transformed = MNKBoard(m, n, k)
+            transformed.load_state(np.array(cells)[board.geometry.symmetries[symmetry]], board.next_player)
+            assert transformed.canonical_key()[0] == board.canonical_key()[0]
+        print(board, board.winning_player or "Draw")
+        while board.move_history:
+            board.undo_move()
+        assert board.symmetric_hashes == empty_hashes and board.evaluation == 0 and not any(board.neighbor_counts)
+
+    # Tic-tac-toe is a draw, and 4,3,3 is a win for the first player
+    assert minimax(MNKBoard(3, 3, 3), True)[0] == 0
+    assert minimax(MNKBoard(4, 3, 3), True)[0] > 0
+    assert minimax(MNKBoard(3, 4, 3), True)[0] > 0
@@ -0,0 +1,231 @@
+"""
+Root-parallel alpha-beta search: the moves of the root position are searched by a pool of worker processes, which share
+the best value found so far so that each of them still prunes against it.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from minimax import MoveOrdering, SearchAborted, SearchLimits, _negamax, _Search
+from transposition_table import TranspositionTable
+from two_player_game import TwoPlayerGameBoard
+
+
+class ParallelMinimax:
+    """
+    Searches the moves of a root position in a pool of worker processes. The first move is searched alone (the young
+    brothers wait for their eldest), which usually gives a good bound; the other moves are then searched side by side,
+    each with the best value found so far as its alpha. That value lives in shared memory: whenever a worker proves a
+    better move it raises it, and the others restart their searches with the tighter window, reusing the work stored in
+    their transposition tables.
+
+    The result is the same value and move as minimax with a fresh table: the first move, in the root's search order,
+    with the best value. A move whose search only proved it no better than the best could tie with it, so such moves
+    are searched again with a full window when they come first.
+
+    Each worker keeps its transposition table across searches if they go to the end of the game: the table then also
+    holds lower and upper bounds from narrow windows, but those only depend on the position and not on the depth left,
+    so they stay sound in any later search. Depth-limited searches start from an empty table, as the serial search does.
+    One search runs at a time. The pool is started on first use, and not pickled; close it, or use the object as a
+    context manager, once done.
+    """
+
+    def __init__(self, n_workers=None, table_size=2 ** 18, move_ordering=MoveOrdering.ALL):
+        """
+        :param n_workers: Number of worker processes. Defaults to the number of CPUs.
+        :param table_size: Number of slots in each worker's transposition table.
+        :param move_ordering: MoveOrdering heuristics of the workers' searches.
+        """
+        self.n_workers = os.cpu_count() if n_workers is None else n_workers
+        self.table_size = table_size
+        self.move_ordering = move_ordering
+        self.executor = None
+        self.shared_alpha = None
+        self.n_searches = 0
+        # Counters of the last search
+        self.nodes = 0
+        self.restarts = 0  # Move searches restarted because another worker raised alpha
+        self.researches = 0  # Moves searched again with a full window to settle a tie
+
+    def search(self, board: TwoPlayerGameBoard, is_maximizing_player, max_depth=float("inf")):
+        """
+        Search the game tree below board, as minimax does.
+        :param board: The TwoPlayerGameBoard to search, which must support snapshot. The workers get snapshots of the
+                      positions after each move, and the board is left unchanged.
+        :param is_maximizing_player: Whether the player to move is trying to maximize the static evaluation.
+        :param max_depth: How many plies to search before falling back to the static evaluation.
+        :return: The value of the position and the best move (None if the game is over).
+        """
+        self.nodes = self.restarts = self.researches = 0
+        if board.is_game_over or max_depth <= 0:
+            return board.static_evaluation(), None
+        self._start()
+        self.n_searches += 1
+        color = 1 if is_maximizing_player else -1
+        # Without a hash move, killers or history, this is the order of the serial search's root
+        moves = _Search(None, self.move_ordering).ordered_moves(board, 0, None)
+        children = []
+        for move in moves:
+            board.play_move(move)
+            children.append(board.snapshot())
+            board.undo_move()
+
+        with self.shared_alpha.get_lock():
+            self.shared_alpha.value = float("-inf")
+        results = [self._submit(children[0], color, max_depth, True).result()]
+        results += [future.result() for future in [self._submit(child, color, max_depth, True)
+                                                   for child in children[1:]]]
+
+        # Values above their window's alpha are exact; the others are upper bounds. The eldest brother's is always exact
+        best_value = max(value for value, window_alpha, _, _ in results if value > window_alpha)
+        best_index = next(i for i, (value, window_alpha, _, _) in enumerate(results)
+                          if window_alpha < value == best_value)
+        ties = [i for i in range(best_index) if results[i][0] == best_value]
+        if ties:
+            self.researches = len(ties)
+            futures = [self._submit(children[i], color, max_depth, False) for i in ties]
+            for i, future in zip(ties, futures):
+                results[i] = future.result()
+            best_index = next((i for i in ties if results[i][0] == best_value), best_index)
+        self.nodes = sum(nodes for _, _, nodes, _ in results)
+        self.restarts = sum(restarts for _, _, _, restarts in results)
+        return color * best_value, moves[best_index]
+
+    def __getstate__(self):
+        # A copy, for example in another process, starts its own pool
+        state = self.__dict__.copy()
+        state["executor"] = state["shared_alpha"] = None
+        return state
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # HELPER METHODS
+    def _start(self):
+        if self.executor is not None:
+            return
+        context = multiprocessing.get_context("spawn")
+        self.shared_alpha = context.Value("d", float("-inf"))
+        self.executor = ProcessPoolExecutor(self.n_workers, mp_context=context, initializer=_init_search_worker,
+                                            initargs=(self.shared_alpha, self.table_size))
+        # Processes are spawned as tasks arrive; start them all now rather than during the first search
+        for future in [self.executor.submit(_worker_ready) for _ in range(self.n_workers)]:
+            future.result()
+
+    def _submit(self, child, color, max_depth, share_alpha):
+        return self.executor.submit(_search_root_move, self.n_searches, child, color, max_depth, self.move_ordering,
+                                    share_alpha)
+
+
+class _AlphaRaised:
+    """Cancel event of a worker's search, set once another worker has raised the shared alpha past its window."""
+
+    def __init__(self, shared_alpha, window_alpha):
+        self.shared_alpha = shared_alpha
+        self.window_alpha = window_alpha
+
+    def is_set(self):
+        return self.shared_alpha.value > self.window_alpha
+
+
+# State of each worker process, set by _init_search_worker
+_shared_alpha = None
+_table = None
+_last_search = None
+
+
+def _init_search_worker(shared_alpha, table_size):
+    global _shared_alpha, _table
+    _shared_alpha = shared_alpha
+    _table = TranspositionTable(table_size)
+
+
+def _worker_ready():
+    return _table is not None
+
+
+def _search_root_move(search_number, snapshot, color, max_depth, move_ordering, share_alpha):
+    """
+    Search the position after one root move, given as a snapshot, with the shared alpha as the root's alpha if
+    share_alpha. Return the move's value for the root player, the alpha it was searched with (the value is exact if
+    above it, and an upper bound otherwise), the nodes visited and the number of restarts.
+    """
+    global _last_search
+    if search_number != _last_search:
+        _last_search = search_number
+        if max_depth != float("inf"):
+            # Entries from a deeper search would change the values of this one
+            _table.clear()
+    board = snapshot.to_board()
+    search = _Search(_table, move_ordering)
+    search.max_depth = max_depth
+    start_depth = board.depth()
+    restarts = 0
+    while True:
+        window_alpha = _shared_alpha.value if share_alpha else float("-inf")
+        if share_alpha:
+            search.limits = SearchLimits(cancel_event=_AlphaRaised(_shared_alpha, window_alpha))
+            search.next_check = search.limits.next_check(search.nodes)
+        try:
+            value = -_negamax(search, board, 1, float("-inf"), -window_alpha, -color)[0]
+            break
+        except SearchAborted:
+            while board.depth() > start_depth:
+                board.undo_move()
+            restarts += 1
+    if value > window_alpha:
+        with _shared_alpha.get_lock():
+            if value > _shared_alpha.value:
+                _shared_alpha.value = value
+    return value, window_alpha, search.nodes, restarts
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    from minimax import minimax
+    from mnk_game import MNKBoard
+    from tic_tac_toe import TicTacToeBoard
+
+    with ParallelMinimax(n_workers=2) as parallel_search:
+        # Same value and move as the serial search, on every tic-tac-toe position after two moves
+        board = TicTacToeBoard()
+        for first_move in board.get_possible_moves():
+            board.play_move(first_move)
+            for second_move in board.get_possible_moves():
+                board.play_move(second_move)
+                assert parallel_search.search(board, True) == minimax(board, True)
+                board.undo_move()
+            board.undo_move()
+
+        # And on random MNK positions at a limited depth: shallow searches tie often, which needs re-searches, and
+        # deeper ones run long enough for the other worker to raise alpha, which needs restarts
+        rng = random.Random(0)
+        n_positions = n_restarts = n_researches = 0
+        start_time = time.perf_counter()
+        for m, n, k, max_depth, n_boards in ((4, 4, 4, 3, 80), (4, 4, 4, 5, 30), (5, 5, 4, 4, 30)):
+            for _ in range(n_boards):
+                board = MNKBoard(m, n, k)
+                for _ in range(rng.randrange(1, m * n // 2)):
+                    board.play_move(rng.choice(board.get_possible_moves()))
+                    if board.is_game_over:
+                        board.undo_move()
+                        break
+                is_maximizing_player = board.depth() % 2 == 0
+                result = parallel_search.search(board, is_maximizing_player, max_depth=max_depth)
+                assert result == minimax(board, is_maximizing_player, max_depth=max_depth), board
+                n_positions += 1
+                n_restarts += parallel_search.restarts
+                n_researches += parallel_search.researches
+        print(f"{n_positions} positions in {time.perf_counter() - start_time:.2f} s, {n_restarts} restarts, "
+              f"{n_researches} re-searches")
+        assert n_restarts > 0 and n_researches > 0
@@ -0,0 +1,317 @@
+"""
+Layered retrograde solver for any TwoPlayerGameBoard. Positions are enumerated one depth at a time from the empty
+board, recording the canonical keys of each position's children, then solved backwards from the deepest layer:
+finished games are scored by static_evaluation, and every other position takes the best of its children, which are all
+one layer deeper. Enumeration is split across a process pool; the backward pass needs no board and runs in NumPy. Each
+layer is kept on disk, so an interrupted solve resumes from the last finished layer.
+
+Run from the repository root with `python -m retrograde M N K [--workers 4] [--directory path]` to solve an m,n,k-game.
+"""
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# CONSTANTS
+CHUNK_SIZE = 2 ** 14  # Positions per task
+
+
+# END CONSTANTS
+
+
+class RetrogradeSolver:
+    """
+    Solves every position reachable from the empty board. As in minimax, the player moving first maximizes
+    static_evaluation, which must be exact for finished games, and values are from that player's point of view.
+
+    Positions are identified by the first element of canonical_key, so symmetric positions are solved once; keys must
+    be distinct for distinct positions of one depth (MNKBoard's 62-bit Zobrist keys collide with negligible
+    probability). The directory holds, for each depth d:
+    - keys: the sorted keys of layer d (int64);
+    - paths: a path from the empty board to each position (uint8, one row per position), where path[i] is the index of
+      the move played at depth i in get_possible_moves;
+    - children: for the unfinished positions, rows (their index in the layer), starts and child_keys, so that the keys
+      of the children of position rows[j] are child_keys[starts[j]:starts[j + 1]]; for the finished ones,
+      terminal_rows and terminal_values;
+    - values: the value of each position for the player to move (int32), once solved.
+    """
+
+    def __init__(self, board_factory, directory, n_workers=1, chunk_size=CHUNK_SIZE):
+        """
+        :param board_factory: Callable returning a fresh board, such as the board class or functools.partial(MNKBoard,
+                              4, 4, 4). Must be picklable if n_workers > 1.
+        :param directory: Where layers are kept. A solve resumes from whatever a previous solve of the same game wrote.
+        :param n_workers: Number of processes to split the enumeration of each layer over.
+        """
+        self.board_factory = board_factory
+        self.directory = directory
+        self.n_workers = n_workers
+        self.chunk_size = chunk_size
+        self.board = board_factory()
+        os.makedirs(directory, exist_ok=True)
+        self._check_game()
+        self._layers = {}
+
+    def solve(self, silent=True):
+        """Enumerate and solve every layer that is not on disk yet, then return the value of the empty board."""
+        n_layers = self._enumerate_layers(silent)
+        for depth in reversed(range(n_layers)):
+            if not os.path.exists(self._layer_path(depth, "values")):
+                start_time = time.perf_counter()
+                self._save(depth, "values", self._solve_layer(depth))
+                self._print(silent, f"Solved layer {depth} in {time.perf_counter() - start_time:.1f} s")
+        self.board.reset()
+        return self.lookup(self.board)
+
+    def lookup(self, board):
+        """The value of board for the first player, or None if it is not a solved reachable position."""
+        depth = board.depth()
+        if not os.path.exists(self._layer_path(depth, "values")):
+            return None
+        keys = self._layer(depth, "keys")
+        key = board.canonical_key()[0]
+        index = int(np.searchsorted(keys, key))
+        if index == len(keys) or keys[index] != key:
+            return None
+        value = int(self._layer(depth, "values")[index])
+        return value if depth % 2 == 0 else -value
+
+    def best_move(self, board):
+        """The best move on a solved, unfinished board, with the value it leads to for the first player."""
+        sign = 1 if board.depth() % 2 == 0 else -1
+        best_value = best_move = None
+        for move in board.get_possible_moves():
+            board.play_move(move)
+            value = sign * self.lookup(board)
+            board.undo_move()
+            if best_value is None or value > best_value:
+                best_value, best_move = value, move
+        return best_move, sign * best_value
+
+    def n_positions(self):
+        """Number of positions in each enumerated layer."""
+        return [len(self._layer(depth, "keys")) for depth in range(self._n_enumerated_layers())]
+
+    # HELPER METHODS
+    def _enumerate_layers(self, silent):
+        """Expand every layer not expanded yet, writing the next one. Return the number of layers."""
+        if not os.path.exists(self._layer_path(0, "keys")):
+            self.board.reset()
+            self._save(0, "paths", np.zeros((1, 0), dtype=np.uint8))
+            self._save(0, "keys", np.array([self.board.canonical_key()[0]], dtype=np.int64))
+        depth = self._n_enumerated_layers() - 1
+        # The deepest layer's children are written before the next layer. If they are all there is, either the layer
+        # had no children and enumeration is finished, or the solve stopped in between and the layer is expanded again.
+        if (os.path.exists(self._layer_path(depth, "children"))
+                and not len(np.load(self._layer_path(depth, "children"))["child_keys"])):
+            return depth + 1
+
+        pool = ProcessPoolExecutor(self.n_workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_worker,
+                                   initargs=(self.board_factory,)) if self.n_workers > 1 else None
+        if pool is None:
+            _init_worker(self.board_factory)
+        try:
+            while True:
+                start_time = time.perf_counter()
+                paths = self._load(depth, "paths")
+                chunks = [(start, paths[start:start + self.chunk_size])
+                          for start in range(0, len(paths), self.chunk_size)]
+                results = list(pool.map(_expand_chunk, chunks)) if pool else list(map(_expand_chunk, chunks))
+                (rows, counts, child_keys, terminal_rows, terminal_values, unique_keys,
+                 unique_paths) = (np.concatenate(arrays) for arrays in zip(*results))
+                # Keys are written last: they mark a layer as complete
+                self._save(depth, "children", rows=rows, starts=np.cumsum(counts) - counts, child_keys=child_keys,
+                           terminal_rows=terminal_rows, terminal_values=terminal_values)
+                self._print(silent, f"Expanded {len(paths)} positions at depth {depth} in "
+                                    f"{time.perf_counter() - start_time:.1f} s")
+                if not len(child_keys):
+                    return depth + 1
+                keys, first = np.unique(unique_keys, return_index=True)
+                self._save(depth + 1, "paths", unique_paths[first])
+                self._save(depth + 1, "keys", keys)
+                depth += 1
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+    def _solve_layer(self, depth):
+        children = np.load(self._layer_path(depth, "children"))
+        values = np.empty(len(self._layer(depth, "keys")), dtype=np.int32)
+        values[children["terminal_rows"]] = children["terminal_values"]
+        if len(children["rows"]):
+            next_keys, next_values = self._layer(depth + 1, "keys"), self._layer(depth + 1, "values")
+            child_values = -np.asarray(next_values)[np.searchsorted(next_keys, children["child_keys"])]
+            values[children["rows"]] = np.maximum.reduceat(child_values, children["starts"])
+        return values
+
+    def _n_enumerated_layers(self):
+        depth = 0
+        while os.path.exists(self._layer_path(depth, "keys")):
+            depth += 1
+        return depth
+
+    def _check_game(self):
+        """Refuse to resume from a directory holding another game's layers."""
+        path = os.path.join(self.directory, "game.json")
+        game = {"name": self.board.name}
+        if os.path.exists(path):
+            with open(path) as file:
+                assert json.load(file) == game, f"{self.directory} holds layers of another game"
+        else:
+            with open(path, "w") as file:
+                json.dump(game, file)
+
+    def _layer(self, depth, name):
+        if (depth, name) not in self._layers:
+            self._layers[depth, name] = self._load(depth, name)
+        return self._layers[depth, name]
+
+    def _layer_path(self, depth, name):
+        extension = "npz" if name == "children" else "npy"
+        return os.path.join(self.directory, f"layer_{depth:03d}_{name}.{extension}")
+
+    def _load(self, depth, name):
+        return np.load(self._layer_path(depth, name), mmap_mode="r")
+
+    def _save(self, depth, name, array=None, **arrays):
+        # Write then rename, so that an interrupted solve never leaves a partial file behind
+        path = self._layer_path(depth, name)
+        with open(path + ".tmp", "wb") as file:
+            if arrays:
+                np.savez(file, **arrays)
+            else:
+                np.save(file, array)
+        os.replace(path + ".tmp", path)
+
+    @staticmethod
+    def _print(silent, message):
+        if not silent:
+            print(message, flush=True)
+
+
+class _PathWalker:
+    """Moves a board between positions given by paths, undoing only back to the moves they share."""
+
+    def __init__(self, board):
+        self.board = board
+        self.board.reset()
+        self.path = []
+
+    def go_to(self, path):
+        shared = 0
+        while shared < min(len(path), len(self.path)) and path[shared] == self.path[shared]:
+            shared += 1
+        for _ in range(len(self.path) - shared):
+            self.board.undo_move()
+        for index in path[shared:]:
+            self.board.play_move(self.board.get_possible_moves()[index])
+        self.path = list(path)
+
+
+# Board of each worker process, set up by _init_worker
+_worker_board = None
+
+
+def _init_worker(board_factory):
+    global _worker_board
+    _worker_board = board_factory()
+
+
+def _expand_chunk(chunk):
+    """
+    Expand the positions of a layer with the given paths, the first of them at index start in the layer. Return the
+    layer indices of the unfinished positions, their numbers of children and the children's keys, the indices and
+    values (for the player to move) of the finished positions, and the distinct children's keys and paths.
+    """
+    start, paths = chunk
+    board = _worker_board
+    walker = _PathWalker(board)
+    sign = 1 if paths.shape[1] % 2 == 0 else -1
+    rows, counts, child_keys, terminal_rows, terminal_values = [], [], [], [], []
+    # Layers are sorted by key, so neighbors rarely share moves; walking them in path order saves most replays
+    order = np.lexsort(paths.T[::-1]) if paths.shape[1] else np.arange(len(paths))
+    path_list = paths.tolist()
+    for index in order.tolist():
+        walker.go_to(path_list[index])
+        if board.is_game_over:
+            terminal_rows.append(start + index)
+            terminal_values.append(sign * board.static_evaluation())
+            continue
+        moves = board.get_possible_moves()
+        rows.append(start + index)
+        counts.append(len(moves))
+        for move in moves:
+            board.play_move(move)
+            child_keys.append(board.canonical_key()[0])
+            board.undo_move()
+
+    child_keys = np.array(child_keys, dtype=np.int64)
+    rows = np.array(rows, dtype=np.int64)
+    counts = np.array(counts, dtype=np.int64)
+    # Keep the first child of each key within the chunk, and build its path from its parent's
+    unique_keys, first = np.unique(child_keys, return_index=True)
+    parents = np.repeat(rows, counts)[first]
+    move_indices = (np.arange(len(child_keys)) - np.repeat(np.cumsum(counts) - counts, counts))[first]
+    unique_paths = np.concatenate([paths[parents - start], move_indices.astype(np.uint8)[:, None]], axis=1)
+    return (rows, counts, child_keys, np.array(terminal_rows, dtype=np.int64),
+            np.array(terminal_values, dtype=np.int32), unique_keys, unique_paths)
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+    import tempfile
+    from functools import partial
+
+    from minimax import minimax
+    from mnk_game import MNKBoard
+    from transposition_table import TranspositionTable
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("m", type=int, nargs="?", default=3)
+    parser.add_argument("n", type=int, nargs="?", default=3)
+    parser.add_argument("k", type=int, nargs="?", default=3)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--directory", help="Where to keep the layers; by default a temporary directory")
+    parser.add_argument("--checks", type=int, default=200, help="Random positions to check against minimax")
+    arguments = parser.parse_args()
+
+    start_time = time.perf_counter()
+    solver = RetrogradeSolver(partial(MNKBoard, arguments.m, arguments.n, arguments.k),
+                              arguments.directory or tempfile.mkdtemp(), n_workers=arguments.workers)
+    value = solver.solve(silent=False)
+    print(f"{solver.board.name}: value {value} with {sum(solver.n_positions())} positions up to symmetry, solved in "
+          f"{time.perf_counter() - start_time:.1f} s")
+
+    # Random positions agree with minimax, searched from positions late enough to be quick
+    rng = random.Random(0)
+    board = MNKBoard(arguments.m, arguments.n, arguments.k)
+    table = TranspositionTable(2 ** 18)
+    n_squares = arguments.m * arguments.n
+    for _ in range(arguments.checks):
+        board.reset()
+        for _ in range(rng.randrange(max(n_squares - 10, 0), n_squares)):
+            if board.is_game_over:
+                break
+            board.play_move(rng.choice(board.get_possible_moves()))
+        assert solver.lookup(board) == minimax(board, board.depth() % 2 == 0, table=table)[0]
+        if not board.is_game_over:
+            move, move_value = solver.best_move(board)
+            assert move_value == solver.lookup(board)
+    board.reset()
+    print("Best first move:", solver.best_move(board)[0])
+
+    # Resumes after an interruption between writing a layer's children and the next layer: drop every value and all
+    # layers below the middle one, keeping the middle one's children
+    n_positions = solver.n_positions()
+    resume_depth = len(n_positions) // 2
+    for name in os.listdir(solver.directory):
+        if name.startswith("layer_") and (name.endswith("_values.npy") or int(name[6:9]) > resume_depth):
+            os.remove(os.path.join(solver.directory, name))
+    resumed_solver = RetrogradeSolver(solver.board_factory, solver.directory, n_workers=arguments.workers)
+    assert resumed_solver.solve() == value and resumed_solver.n_positions() == n_positions
+    print(f"Resumed from layer {resume_depth}")
@@ -1,13 +1,29 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
 from itertools import chain
 
+import numpy as np
 import torch
 from torch import nn
-from torch.utils.data import DataLoader, Dataset
 from tqdm import trange
 
+from game_log import DRAW, FIRST_PLAYER_WON, SECOND_PLAYER_WON, encode_game, finished_game_result
 from two_player_game import TwoPlayerGameAgent
 from .minimax_tic_tac_toe import TicTacToeMiniMaxAgent
-from .tic_tac_toe_game import TicTacToeBoard, TicTacToeMove, X, O
+from .tic_tac_toe_game import TicTacToeBoard, X, O, EMPTY, WINNING_SCORE, SYMMETRIES, TIC_TAC_TOE_MOVES
+from .vectorized_tic_tac_toe import VectorizedTicTacToe, ILLEGAL_MOVE_PENALTY, default_perfect_play_policy
+
+# CONSTANTS
+N_STATES = 3 ** 9
+N_ACTIONS = 9
+# Bump when the checkpoint layout changes; load_checkpoint refuses other versions
+CHECKPOINT_FORMAT_VERSION = 1
+# A player makes at most 5 legal moves per game; only illegal moves can add more transitions
+MAX_LEGAL_MOVES_PER_GAME = 5
+
+
+# END CONSTANTS
 
 
 class DiscreteStatePolicyMLP(nn.Module):
@@ -47,63 +63,201 @@ class DiscreteStateValueMLP(nn.Module):
         return self.net(x)
 
 
-class ListDataset(Dataset):
-    def __init__(self, data):
-        super().__init__()
-        self.data = list(data)
+class RolloutBuffer:
+    """
+    Transitions collected for a PPO update, stored as preallocated tensors on the training device and filled in place.
+    The buffer keeps its storage when cleared and only grows (by doubling) when more transitions are added than fit, so
+    its memory is bounded by the largest epoch rather than reallocated every epoch.
+    """
 
-    def __getitem__(self, index):
-        return self.data[index]
+    def __init__(self, capacity=2 ** 12, device=torch.device("cpu")):
+        self.device = device
+        self.size = 0
+        self.capacity = 0
+        self.reserve(capacity)
 
     def __len__(self):
-        return len(self.data)
+        return self.size
+
+    def clear(self):
+        self.size = 0
+
+    def reserve(self, capacity):
+        """Make room for at least capacity transitions, keeping those already stored."""
+        if capacity <= self.capacity:
+            return
+        old_tensors = (self.states, self.actions, self.log_probs, self.returns) if self.capacity else None
+        self.states = torch.zeros(capacity, dtype=torch.long, device=self.device)
+        self.actions = torch.zeros(capacity, dtype=torch.long, device=self.device)
+        self.log_probs = torch.zeros(capacity, device=self.device)
+        self.returns = torch.zeros(capacity, device=self.device)
+        self.advantages = torch.zeros(capacity, device=self.device)
+        if old_tensors is not None:
+            for new, old in zip((self.states, self.actions, self.log_probs, self.returns), old_tensors):
+                new[:self.size] = old[:self.size]
+        self.capacity = capacity
+
+    def add(self, states, actions, log_probs, returns):
+        """Append a batch of transitions given as equal-length sequences, arrays or tensors."""
+        end = self.size + len(states)
+        if end > self.capacity:
+            self.reserve(max(end, 2 * self.capacity))
+        self.states[self.size:end] = torch.as_tensor(states, dtype=torch.long)
+        self.actions[self.size:end] = torch.as_tensor(actions, dtype=torch.long)
+        self.log_probs[self.size:end] = torch.as_tensor(log_probs, dtype=torch.float)
+        self.returns[self.size:end] = torch.as_tensor(returns, dtype=torch.float)
+        self.size = end
+
+    def compute_advantages(self, value_network):
+        """Set each advantage to the transition's return minus value_network's current estimate of its state."""
+        with torch.no_grad():
+            values = value_network(self.states[:self.size]).squeeze(1)
+        self.advantages[:self.size] = self.returns[:self.size] - values
+
+    def minibatches(self, batch_size):
+        """
+        Yield (states, actions, log_probs, returns, advantages) minibatches in a random order. The transitions are
+        shuffled with one gather per call, and the minibatches are slices of the shuffled tensors.
+        """
+        order = torch.randperm(self.size, device=self.device)
+        shuffled = [tensor[order] for tensor in (self.states, self.actions, self.log_probs, self.returns,
+                                                 self.advantages)]
+        for start in range(0, self.size, batch_size):
+            yield tuple(tensor[start:start + batch_size] for tensor in shuffled)
+
+    def to_numpy(self):
+        """The stored transitions as arrays, in the argument order of add."""
+        return tuple(tensor[:self.size].cpu().numpy()
+                     for tensor in (self.states, self.actions, self.log_probs, self.returns))
+
+
+def _state_index(board: TicTacToeBoard, canonical_states):
+    """
+    Return the index of board in the networks' state embedding, and the symmetry that maps board onto the indexed
+    position (None if canonical_states is False).
+    """
+    if canonical_states:
+        return board.canonical_key()
+    return hash(board), None
+
+
+def _legal_move_mask(board: TicTacToeBoard, symmetry):
+    """Boolean mask over the 9 actions of the empty squares of board, in the frame of the indexed position."""
+    mask = board.state.flatten() == EMPTY.value
+    return mask if symmetry is None else mask[SYMMETRIES[symmetry]]
+
+
+def sample_actions(policy_network, states, legal_move_masks=None, device=torch.device("cpu")):
+    """
+    Run one forward pass of policy_network over a batch of state indices and sample an action for each of them.
+    :param policy_network: DiscreteStatePolicyMLP to sample from.
+    :param states: Sequence or array of state indices (board hashes or canonical keys).
+    :param legal_move_masks: Optional (batch, 9) boolean masks. Masked-out actions are never sampled.
+    :param device: Torch device of policy_network.
+    :return: The sampled actions as a CPU LongTensor, and the (masked, unnormalized) action distributions.
+    """
+    with torch.inference_mode():
+        states = torch.as_tensor(states, dtype=torch.long, device=device)
+        action_dists = policy_network(states)
+        if legal_move_masks is not None:
+            legal_move_masks = torch.as_tensor(legal_move_masks, dtype=torch.bool, device=device)
+            action_dists = action_dists.masked_fill(~legal_move_masks, 0.0)
+        actions = torch.multinomial(action_dists, num_samples=1).squeeze(1)
+    return actions.cpu(), action_dists
 
 
 class TicTacToePPOTrainer:
-    def __init__(self, device=torch.device("cpu")):
-        self.memory = []
-        self.board = TicTacToeBoard()
-        self.policy_network = DiscreteStatePolicyMLP(3 ** 9, (8, 8, 8), 9).to(device)
-        self.value_network = DiscreteStateValueMLP(3 ** 9, (8, 8, 8)).to(device)
+    def __init__(self, device=torch.device("cpu"), board_class=TicTacToeBoard, canonical_states=False,
+                 hidden_layer_sizes=(8, 8, 8)):
+        """
+        :param device: Torch device for the networks.
+        :param board_class: TicTacToeBoard or a drop-in replacement, used for self-play.
+        :param canonical_states: If True, rotations and reflections of a position share one state index (and actions
+                                 are chosen relative to the canonical position), so experience is shared between them.
+        :param hidden_layer_sizes: Sizes of the hidden layers of both networks.
+        """
+        self.buffer = RolloutBuffer(device=device)
+        self.board = board_class()
+        self.canonical_states = canonical_states
+        self.hidden_layer_sizes = tuple(hidden_layer_sizes)
+        self.policy_network = DiscreteStatePolicyMLP(N_STATES, self.hidden_layer_sizes, N_ACTIONS).to(device)
+        self.value_network = DiscreteStateValueMLP(N_STATES, self.hidden_layer_sizes).to(device)
         self.value_criterion = nn.MSELoss()
         self.device = device
-
-    def _add_rollout_to_memory(self, rollout, gamma):
+        # The optimizer is created by the first call to train_PPO_for_tictactoe. A checkpoint's optimizer state is kept
+        # until then, since creating an optimizer is slow and agents that only play never need one.
+        self.optimizer = None
+        self._checkpoint_optimizer_state = None
+        self.epochs_trained = 0
+
+    @classmethod
+    def from_checkpoint(cls, path, device=torch.device("cpu"), board_class=TicTacToeBoard):
+        """Build a trainer with the settings stored in a checkpoint and restore its state, ready to resume training."""
+        checkpoint = _read_checkpoint(path, device)
+        trainer = cls(device, board_class, checkpoint["canonical_states"], checkpoint["hidden_layer_sizes"])
+        trainer._restore(checkpoint)
+        return trainer
+
+    def save_checkpoint(self, path):
+        """Save both networks, the optimizer state and the training progress to path."""
+        torch.save({"format_version": CHECKPOINT_FORMAT_VERSION,
+                    "canonical_states": self.canonical_states,
+                    "hidden_layer_sizes": self.hidden_layer_sizes,
+                    "epochs_trained": self.epochs_trained,
+                    "policy_network": self.policy_network.state_dict(),
+                    "value_network": self.value_network.state_dict(),
+                    "optimizer": (self._checkpoint_optimizer_state if self.optimizer is None
+                                  else self.optimizer.state_dict())},
+                   path)
+
+    def load_checkpoint(self, path):
+        """Restore a checkpoint saved by a trainer with the same canonical_states and hidden_layer_sizes."""
+        checkpoint = _read_checkpoint(path, self.device)
+        assert checkpoint["canonical_states"] == self.canonical_states, "Checkpoint uses a different state indexing"
+        assert tuple(checkpoint["hidden_layer_sizes"]) == self.hidden_layer_sizes, "Checkpoint has different layers"
+        self._restore(checkpoint)
+
+    def _restore(self, checkpoint):
+        self.policy_network.load_state_dict(checkpoint["policy_network"])
+        self.value_network.load_state_dict(checkpoint["value_network"])
+        self.epochs_trained = checkpoint["epochs_trained"]
+        self.optimizer = None
+        self._checkpoint_optimizer_state = checkpoint["optimizer"]
+
+    def _add_rollout_to_buffer(self, rollout, gamma):
+        if not rollout:
+            return
+        states, actions, log_probs, rewards = zip(*rollout)
+        total_discounted_rewards = []
         total_discounted_reward = 0
-        for transition in reversed(rollout):
-            state, action, action_dist, reward = transition
+        for reward in reversed(rewards):
             total_discounted_reward = reward + gamma * total_discounted_reward
-            self.memory.append((state, action, action_dist, total_discounted_reward))
-
-    def _clear_memory(self):
-        self.memory = []
+            total_discounted_rewards.append(total_discounted_reward)
+        self.buffer.add(states, actions, log_probs, total_discounted_rewards[::-1])
 
     def _get_move(self):
-        with torch.inference_mode():
-            state = torch.tensor([hash(self.board)]).long().to(self.device)
-            action_dist = self.policy_network(state)
-            action = int(torch.multinomial(action_dist, num_samples=1))
-            row, column = action // 3, action % 3
-            return row, column, action_dist
-
-    def _learn_ppo(self, optimizer, dataloader, epsilon, policy_epochs):
+        # Illegal moves are not masked during training: the agent learns to avoid them from the penalty
+        state_index, symmetry = _state_index(self.board, self.canonical_states)
+        actions, action_dists = sample_actions(self.policy_network, [state_index], device=self.device)
+        action = int(actions[0])
+        move = TIC_TAC_TOE_MOVES[action]
+        if symmetry is not None:
+            move = self.board.untransform_move(move, symmetry)
+        return state_index, action, float(action_dists[0, action].log()), move
+
+    def _learn_ppo(self, optimizer, batch_size, epsilon, policy_epochs):
+        self.buffer.compute_advantages(self.value_network)
         for epoch in range(policy_epochs):
-            for states, actions, old_action_dists, total_discounted_rewards in dataloader:
-                states = states.long().to(self.device)
-                actions = actions.unsqueeze(0).to(self.device)
-                old_action_dists = old_action_dists.squeeze(1).float().to(self.device)
-                total_discounted_rewards = total_discounted_rewards.float().to(self.device)
-
+            for states, actions, old_log_probs, total_discounted_rewards, advantage in self.buffer.minibatches(
+                    batch_size):
                 # Calculate value loss
                 values = self.value_network(states).squeeze(1)
                 value_loss = self.value_criterion(total_discounted_rewards, values)
 
                 # Calculate policy loss
-                advantage = total_discounted_rewards - values
-                advantage = advantage.unsqueeze(1).detach()
                 current_action_dists = self.policy_network(states)
-                policy_ratio = current_action_dists.gather(dim=1, index=actions) / old_action_dists.gather(dim=1,
-                                                                                                           index=actions)
+                current_log_probs = current_action_dists.gather(dim=1, index=actions.unsqueeze(1)).squeeze(1).log()
+                policy_ratio = torch.exp(current_log_probs - old_log_probs)
                 policy_gradient = policy_ratio * advantage
                 clipped_policy_gradient = torch.clamp(policy_ratio, 1 - epsilon, 1 + epsilon) * advantage
                 policy_loss = -torch.mean(torch.min(policy_gradient, clipped_policy_gradient))
@@ -114,6 +268,116 @@ class TicTacToePPOTrainer:
                 loss.backward()
                 optimizer.step()
 
+    def _play_training_game(self, player, opponent):
+        """Play one game as player against opponent and return the rollout of (state, action, log_prob, reward)."""
+        self.board.reset()
+        rollout = []
+
+        while not self.board.is_game_over:
+            # Handle opponent's first move as X
+            if self.board.next_player != player:
+                opponent_move = opponent(self.board)
+                self.board.play_move(opponent_move)
+                continue
+
+            # Play a move
+            state, action, log_prob, move = self._get_move()
+            try:
+                self.board.play_move(move)
+            # Major negative penalty if invalid move
+            except AssertionError:
+                reward = ILLEGAL_MOVE_PENALTY
+            else:
+                # If the game is over, check the score
+                if self.board.is_game_over:
+                    reward = 0 if self.board.winning_player == "" else WINNING_SCORE - self.board.depth()
+                # If not, let the opponent move and check the score
+                else:
+                    opponent_move = opponent(self.board)
+                    self.board.play_move(opponent_move)
+                    if not self.board.is_game_over:
+                        reward = 0
+                    else:
+                        reward = 0 if self.board.winning_player == "" else -WINNING_SCORE + self.board.depth()
+
+            # Add move to the rollout
+            rollout.append((state, action, log_prob, reward))
+
+        return rollout
+
+    def _encode_training_game(self):
+        """The game log record of the game just played on self.board."""
+        squares = [3 * row + column for row, column in self.board.move_history]
+        return encode_game(squares, finished_game_result(self.board, len(squares)))
+
+    def _collect_experience_in_workers(self, pool, n_workers, n_games, gamma, game_log=None):
+        """
+        Split n_games per side across the worker pool. Each task gets a snapshot of the current policy weights, and the
+        workers' transitions are added to this trainer's buffer (and their games to game_log) as they finish.
+        """
+        policy_weights = {name: tensor.cpu() for name, tensor in self.policy_network.state_dict().items()}
+        futures = {}
+        for player in (X, O):
+            for worker_number in range(n_workers):
+                n_worker_games = n_games // n_workers + (worker_number < n_games % n_workers)
+                if n_worker_games:
+                    seed = int(torch.randint(2 ** 31, ()))
+                    futures[pool.submit(_collect_experience_in_worker, policy_weights, player, n_worker_games, gamma,
+                                        seed, game_log is not None)] = n_worker_games
+        for future in as_completed(futures):
+            transitions, game_records = future.result()
+            self.buffer.add(*transitions)
+            if game_log is not None:
+                game_log.write_records(game_records, futures[future])
+
+    def _collect_experience_vectorized(self, player, n_games, n_boards, batch_opponent, gamma, game_log=None):
+        """
+        Play at least n_games as player on n_boards VectorizedTicTacToe boards at once, with one forward pass of the
+        policy network per step. Rewards match _play_training_game.
+        """
+        env = VectorizedTicTacToe(min(n_boards, n_games))
+        rollouts = [[] for _ in range(env.n_boards)]
+        # Squares played on each board, kept only for game_log
+        games = [[] for _ in range(env.n_boards)] if game_log is not None else None
+        all_boards = np.arange(env.n_boards)
+        n_finished = 0
+        while n_finished < n_games:
+            agent_turn = env.next_player == player.value
+            agent_boards = np.flatnonzero(agent_turn)
+            actions = batch_opponent(env)
+            if self.canonical_states:
+                states, symmetries = env.canonical_keys()
+            else:
+                states, symmetries = env.hashes(), None
+            agent_actions, action_dists = sample_actions(self.policy_network, states[agent_boards], device=self.device)
+            log_probs = action_dists.gather(1, agent_actions.to(self.device).unsqueeze(1)).log().squeeze(1).tolist()
+            agent_actions = agent_actions.numpy()
+            if symmetries is None:
+                actions[agent_boards] = agent_actions
+            else:
+                actions[agent_boards] = env.untransform_actions(agent_actions, symmetries[agent_boards])
+            if games is not None:
+                for board in np.flatnonzero(env.legal_move_masks()[all_boards, actions]):
+                    games[board].append(actions[board])
+
+            rewards, dones = env.step(actions)
+
+            for i, board in enumerate(agent_boards):
+                rollouts[board].append([states[board], agent_actions[i], log_probs[i], rewards[board]])
+            for board in np.flatnonzero(dones):
+                rollout = rollouts[board]
+                # If the opponent ended the game, the agent's last move lost it
+                if not agent_turn[board] and rollout:
+                    rollout[-1][3] -= rewards[board]
+                self._add_rollout_to_buffer(rollout, gamma)
+                rollouts[board] = []
+                n_finished += 1
+                if games is not None:
+                    # X always moves first
+                    result = {X.value: FIRST_PLAYER_WON, O.value: SECOND_PLAYER_WON}.get(env.winners[board], DRAW)
+                    game_log.write_squares(games[board], result)
+                    games[board] = []
+
     def train_PPO_for_tictactoe(self,
                                 epochs,
                                 policy_epochs=10,
@@ -123,79 +387,196 @@ class TicTacToePPOTrainer:
                                 gamma=0.9,
                                 epsilon=0.2,
                                 batch_size=500,
-                                silent=True):
-        optimizer = torch.optim.Adam(chain(self.policy_network.parameters(), self.value_network.parameters()),
-                                     lr=lr)
-
-        for epoch_number in (loop := trange(epochs, disable=silent)):
-            self._clear_memory()
-
-            # Begin experience loop: X, then O
-            for player in (X, O):
-                for game_number in (inner_loop := trange(n_games_per_epoch, disable=silent, leave=False)):
-                    self.board.reset()
-                    rollout = []
-
-                    while not self.board.is_game_over:
-                        # Handle opponent's first move as X
-                        if self.board.next_player != player:
-                            opponent_move = opponent(self.board)
-                            self.board.play_move(opponent_move)
+                                silent=True,
+                                n_parallel_boards=None,
+                                batch_opponent=None,
+                                n_workers=None,
+                                checkpoint_path=None,
+                                game_log=None):
+        """
+        :param n_parallel_boards: If set, experience is collected on this many VectorizedTicTacToe boards at once, with
+                                  batch_opponent instead of opponent.
+        :param batch_opponent: Batch policy (see vectorized_tic_tac_toe) for vectorized collection. Defaults to perfect
+                               play, like the default minimax opponent.
+        :param n_workers: If more than 1, games against opponent are played in this many worker processes, which get
+                          the latest policy weights at the start of each epoch. opponent must be picklable.
+        :param checkpoint_path: If set, a checkpoint is saved here after every epoch. Training resumes from a checkpoint
+                                restored with from_checkpoint or load_checkpoint, including the optimizer state.
+        :param game_log: If set, a GameLogWriter (see game_log) to which every self-play game is appended.
+        """
+        assert not (n_parallel_boards and n_workers), "Choose either vectorized or multiprocess experience collection"
+        if self.optimizer is None:
+            self.optimizer = torch.optim.Adam(chain(self.policy_network.parameters(),
+                                                    self.value_network.parameters()), lr=lr)
+            if self._checkpoint_optimizer_state is not None:
+                self.optimizer.load_state_dict(self._checkpoint_optimizer_state)
+                self._checkpoint_optimizer_state = None
+        for parameter_group in self.optimizer.param_groups:
+            parameter_group["lr"] = lr
+        if n_parallel_boards and batch_opponent is None:
+            batch_opponent = default_perfect_play_policy()
+
+        use_workers = n_workers is not None and n_workers > 1
+        pool = ProcessPoolExecutor(n_workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_experience_worker,
+                                   initargs=(type(self.board), self.canonical_states, self.hidden_layer_sizes,
+                                             opponent)) if use_workers else None
+        with pool or nullcontext():
+            for epoch_number in (loop := trange(epochs, disable=silent)):
+                self.buffer.clear()
+                self.buffer.reserve(2 * n_games_per_epoch * MAX_LEGAL_MOVES_PER_GAME)
+
+                # Begin experience loop: X, then O
+                if use_workers:
+                    self._collect_experience_in_workers(pool, n_workers, n_games_per_epoch, gamma, game_log)
+                else:
+                    for player in (X, O):
+                        if n_parallel_boards:
+                            self._collect_experience_vectorized(player, n_games_per_epoch, n_parallel_boards,
+                                                                batch_opponent, gamma, game_log)
                             continue
+                        for game_number in (inner_loop := trange(n_games_per_epoch, disable=silent, leave=False)):
+                            rollout = self._play_training_game(player, opponent)
+                            self._add_rollout_to_buffer(rollout, gamma)
+                            if game_log is not None:
+                                game_log.write_records(self._encode_training_game(), 1)
+
+                # Learn from experience
+                self._learn_ppo(self.optimizer, batch_size, epsilon, policy_epochs)
+
+                self.epochs_trained += 1
+                if checkpoint_path is not None:
+                    self.save_checkpoint(checkpoint_path)
+
+
+def _read_checkpoint(path, device):
+    checkpoint = torch.load(path, map_location=device)
+    version = checkpoint.get("format_version")
+    assert version == CHECKPOINT_FORMAT_VERSION, \
+        f"{path} has checkpoint format version {version}, expected {CHECKPOINT_FORMAT_VERSION}"
+    return checkpoint
+
+
+# Trainer used to play games inside each experience worker process, set up by _init_experience_worker
+_worker_trainer = None
+_worker_opponent = None
+
+
+def _init_experience_worker(board_class, canonical_states, hidden_layer_sizes, opponent):
+    global _worker_trainer, _worker_opponent
+    # Workers split the cores between them
+    torch.set_num_threads(1)
+    _worker_trainer = TicTacToePPOTrainer(board_class=board_class, canonical_states=canonical_states,
+                                          hidden_layer_sizes=hidden_layer_sizes)
+    _worker_opponent = opponent
+
 
-                        # Play a move
-                        row, column, action_dist = self._get_move()
-                        state = hash(self.board)
-                        try:
-                            self.board.play_move(TicTacToeMove(row, column))
-                        # Major negative penalty if invalid move
-                        except AssertionError:
-                            reward = -15
-                        else:
-                            # If the game is over, check the score
-                            if self.board.is_game_over:
-                                reward = 0 if self.board.winning_player is None else 10 - self.board.depth()
-                            # If not, let the opponent move and check the score
-                            else:
-                                opponent_move = opponent(self.board)
-                                self.board.play_move(opponent_move)
-                                if not self.board.is_game_over:
-                                    reward = 0
-                                else:
-                                    reward = 0 if self.board.winning_player is None else -10 + self.board.depth()
-
-                        # Add move to memory
-                        rollout.append((state, 3 * row + column, action_dist, reward))
-
-                    self._add_rollout_to_memory(rollout, gamma)
-
-            # Learn from experience
-            dataset = ListDataset(self.memory)
-            dataloader = DataLoader(dataset, batch_size=batch_size)
-            self._learn_ppo(optimizer, dataloader, epsilon, policy_epochs)
+def _collect_experience_in_worker(policy_weights, player, n_games, gamma, seed, log_games):
+    """Return the transitions of n_games and, if log_games, their game log records."""
+    torch.manual_seed(seed)
+    _worker_trainer.policy_network.load_state_dict(policy_weights)
+    _worker_trainer.buffer.clear()
+    game_records = []
+    for game_number in range(n_games):
+        rollout = _worker_trainer._play_training_game(player, _worker_opponent)
+        _worker_trainer._add_rollout_to_buffer(rollout, gamma)
+        if log_games:
+            game_records.append(_worker_trainer._encode_training_game())
+    return _worker_trainer.buffer.to_numpy(), b"".join(game_records)
 
 
 class TicTacToePPOAgent(TwoPlayerGameAgent):
-    def __init__(self, name, device=torch.device("cpu"), silent_training=True):
+    def __init__(self, name, device=torch.device("cpu"), silent_training=True, canonical_states=False,
+                 checkpoint_path=None, train_epochs=0):
+        """
+        :param name: Name of the agent.
+        :param device: Torch device for the policy network.
+        :param silent_training: Whether to hide progress bars while training.
+        :param canonical_states: State indexing of a new policy. Ignored when loading a checkpoint, which records its
+                                 own.
+        :param checkpoint_path: Checkpoint saved by TicTacToePPOTrainer to load the policy from.
+        :param train_epochs: Number of epochs to train for, after loading the checkpoint if there is one. The agent only
+                             trains when this is set; without a checkpoint or training, the policy is untrained.
+        """
         self.name = name
         self.device = device
-        trainer = TicTacToePPOTrainer(device)
-        trainer.train_PPO_for_tictactoe(epochs=10, silent=silent_training)
+        if checkpoint_path is not None:
+            trainer = TicTacToePPOTrainer.from_checkpoint(checkpoint_path, device)
+        else:
+            trainer = TicTacToePPOTrainer(device, canonical_states=canonical_states)
+        if train_epochs:
+            trainer.train_PPO_for_tictactoe(epochs=train_epochs, silent=silent_training)
+        self.canonical_states = trainer.canonical_states
         self.net = trainer.policy_network
         self.net.eval()
 
     def get_move(self, board):
+        return self.get_moves([board])[0]
+
+    def get_moves(self, boards):
+        """Choose a legal move on each of several boards with a single forward pass of the policy network."""
+        state_indices, symmetries = zip(*(_state_index(board, self.canonical_states) for board in boards))
+        legal_move_masks = np.stack([_legal_move_mask(board, symmetry) for board, symmetry in zip(boards, symmetries)])
+        actions, _ = sample_actions(self.net, state_indices, legal_move_masks, self.device)
+        moves = []
+        for board, symmetry, action in zip(boards, symmetries, actions.tolist()):
+            move = TIC_TAC_TOE_MOVES[action]
+            moves.append(move if symmetry is None else board.untransform_move(move, symmetry))
+        return moves
+
+
+class TicTacToePPOEvaluator:
+    """
+    Leaf evaluator for MCTSAgent (see mcts) from a trainer's networks: the priors of the legal moves come from the
+    policy network, renormalized, and the value is the value network's estimate of the return for the player to move,
+    divided by WINNING_SCORE and clipped to [-1, 1].
+    """
+
+    def __init__(self, trainer: TicTacToePPOTrainer):
+        self.canonical_states = trainer.canonical_states
+        self.policy_network = trainer.policy_network.eval()
+        self.value_network = trainer.value_network.eval()
+        self.device = trainer.device
+
+    @classmethod
+    def from_checkpoint(cls, path, device=torch.device("cpu")):
+        return cls(TicTacToePPOTrainer.from_checkpoint(path, device))
+
+    def encode(self, board):
+        """The state index of board and the actions of its legal moves, in get_possible_moves order."""
+        state_index, symmetry = _state_index(board, self.canonical_states)
+        moves = board.get_possible_moves()
+        if symmetry is not None:
+            moves = [board.transform_move(move, symmetry) for move in moves]
+        return state_index, [move.square for move in moves]
+
+    def evaluate(self, encodings):
+        """Priors and values of a batch of encoded boards, with one forward pass of each network."""
+        state_indices, actions = zip(*encodings)
         with torch.inference_mode():
-            state = torch.tensor([hash(board)]).long().to(self.device)
-            distribution = self.net(state).flatten()
-            valid_moves = [3 * move.row + move.column for move in board.get_possible_moves()]
-            for move in range(9):
-                if move not in valid_moves:
-                    distribution[move] = 0.0
-            action = int(torch.multinomial(distribution, num_samples=1))
-            return TicTacToeMove(action // 3, action % 3)
+            states = torch.as_tensor(state_indices, dtype=torch.long, device=self.device)
+            action_dists = self.policy_network(states).cpu().numpy()
+            values = self.value_network(states).squeeze(1).cpu().numpy()
+        priors = []
+        for action_dist, legal_actions in zip(action_dists, actions):
+            legal_priors = action_dist[legal_actions]
+            total = legal_priors.sum()
+            priors.append(legal_priors / total if total > 0 else np.full(len(legal_actions), 1 / len(legal_actions)))
+        return priors, np.clip(values / WINNING_SCORE, -1, 1)
 
 
 if __name__ == "__main__":
-    trainer = TicTacToePPOTrainer(device=torch.device("cpu"))
-    trainer.train_PPO_for_tictactoe(epochs=1)
+    import sys
+
+    # Train for an epoch (resuming from the checkpoint if it exists) and save it
+    checkpoint_path = sys.argv[1] if len(sys.argv) > 1 else "tic_tac_toe_ppo.pt"
+    try:
+        trainer = TicTacToePPOTrainer.from_checkpoint(checkpoint_path)
+    except FileNotFoundError:
+        trainer = TicTacToePPOTrainer(device=torch.device("cpu"))
+    trainer.train_PPO_for_tictactoe(epochs=1, checkpoint_path=checkpoint_path)
+    print(f"Saved {checkpoint_path} after {trainer.epochs_trained} epochs")
+
+    # Loading an agent from the checkpoint does not train
+    agent = TicTacToePPOAgent("PPO", checkpoint_path=checkpoint_path)
+    print(agent.get_move(TicTacToeBoard()))
@@ -1,5 +1,35 @@
-from .human_tic_tac_toe import TicTacToeHumanConsoleAgent, TicTacToeHumanGUIAgent
-from .minimax_tic_tac_toe import TicTacToeMiniMaxAgent
-from .PPO_tic_tac_toe import TicTacToePPOAgent
-from .tic_tac_toe_game import TicTacToeMove, TicTacToeBoard, X, O, EMPTY, WINNING_SCORE
-from .tic_tac_toe_GUI import TicTacToeGUI
+from importlib import import_module
+
+# Names exported by the package, and the submodule that defines each of them. Submodules are only imported when one of
+# their names is first used, so that code using the board or the minimax agent never imports torch (PPO) or pygame
+# (GUI).
+_EXPORTS = {
+    "TicTacToeHumanConsoleAgent": ".human_tic_tac_toe",
+    "TicTacToeHumanGUIAgent": ".human_tic_tac_toe",
+    "TicTacToeMiniMaxAgent": ".minimax_tic_tac_toe",
+    "TicTacToePPOAgent": ".PPO_tic_tac_toe",
+    "TicTacToePPOEvaluator": ".PPO_tic_tac_toe",
+    "TicTacToeBitBoard": ".tic_tac_toe_bitboard",
+    "TicTacToeMove": ".tic_tac_toe_game",
+    "TicTacToeBoard": ".tic_tac_toe_game",
+    "TicTacToeSnapshot": ".tic_tac_toe_game",
+    "X": ".tic_tac_toe_game",
+    "O": ".tic_tac_toe_game",
+    "EMPTY": ".tic_tac_toe_game",
+    "WINNING_SCORE": ".tic_tac_toe_game",
+    "TicTacToeGUI": ".tic_tac_toe_GUI",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value  # Later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
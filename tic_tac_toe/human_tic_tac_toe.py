@@ -1,16 +1,19 @@
+from typing import TYPE_CHECKING
+
 from printing_utils import require_input_and_clear
 from two_player_game import TwoPlayerGameAgent
-from .tic_tac_toe_GUI import TicTacToeGUI
 from .tic_tac_toe_game import TicTacToeMove, TicTacToeBoard
 
+if TYPE_CHECKING:
+    # Only needed for annotations; importing it at runtime would make the console agent depend on pygame
+    from .tic_tac_toe_GUI import TicTacToeGUI
+
 
 class TicTacToeHumanConsoleAgent(TwoPlayerGameAgent):
     def __init__(self, name):
         self.name = name
 
     def get_move(self, board: TicTacToeBoard):
-        valid_moves = board.get_possible_moves()
-
         while True:
             user_row = require_input_and_clear("Enter row to play on: ")
             user_column = require_input_and_clear("Enter column to play on: ")
@@ -24,7 +27,7 @@ class TicTacToeHumanConsoleAgent(TwoPlayerGameAgent):
 
             # Check valid moves
             user_move = TicTacToeMove(user_row - 1, user_column - 1)
-            if user_move not in valid_moves:
+            if not board.is_legal_move(user_move):
                 require_input_and_clear("Invalid move: ensure the chosen square is empty. Press enter to continue.")
                 continue
 
@@ -32,7 +35,7 @@ class TicTacToeHumanConsoleAgent(TwoPlayerGameAgent):
 
 
 class TicTacToeHumanGUIAgent(TwoPlayerGameAgent):
-    def __init__(self, name, gui: TicTacToeGUI):
+    def __init__(self, name, gui: "TicTacToeGUI"):
         self.name = name
         self.gui = gui
 
@@ -1,21 +1,76 @@
 import numpy as np
 
-from minimax import minimax
+from minimax import SearchStatistics, minimax, iterative_deepening_minimax
+from parallel_minimax import ParallelMinimax
+from transposition_table import TranspositionTable, ReplacementPolicy
 from two_player_game import TwoPlayerGameAgent
+from .perfect_play_table import TicTacToePerfectPlayTable
 from .tic_tac_toe_game import TicTacToeBoard, X, O
 
 
 class TicTacToeMiniMaxAgent(TwoPlayerGameAgent):
 
-    def __init__(self, name):
+    def __init__(self, name, transposition_table_size=2 ** 16,
+                 replacement_policy=ReplacementPolicy.DEPTH_PREFERRED, lookup_table=None, move_time_limit=None,
+                 collect_statistics=False, n_workers=None):
+        """
+        :param name: Name of the agent.
+        :param transposition_table_size: Number of slots in the transposition table. The table is kept for the life of
+                                         the agent, so search results are reused across moves and games.
+        :param replacement_policy: How the table resolves two positions mapping to the same slot.
+        :param lookup_table: Optional TicTacToePerfectPlayTable, or the path of one written by
+                             `python -m tic_tac_toe.perfect_play_table`, which is memory-mapped. Positions in the table
+                             are answered with a single read; anything else falls back to search.
+        :param move_time_limit: If set, each move is chosen by an iterative-deepening search stopped after this many
+                                seconds, playing the best move of the deepest search that finished. If None, every move
+                                is searched to the end of the game.
+        :param collect_statistics: If True, search_statistics accumulates a SearchStatistics over every search the
+                                   agent runs, and tournaments report them. Otherwise search_statistics is None.
+        :param n_workers: If set, moves searched to the end of the game are searched by a ParallelMinimax with this many
+                          worker processes, which finds the same moves as the serial search with a fresh table. The
+                          workers keep their own tables, so transposition_table and search_statistics are not used.
+                          Close the agent, or use it as a context manager, to stop the workers.
+        """
         self.name = name
+        self.transposition_table = TranspositionTable(transposition_table_size, replacement_policy)
+        if isinstance(lookup_table, str):
+            lookup_table = TicTacToePerfectPlayTable.load(lookup_table)
+        self.lookup_table = lookup_table
+        self.move_time_limit = move_time_limit
+        self.search_statistics = SearchStatistics() if collect_statistics else None
+        self.parallel_search = None if n_workers is None else ParallelMinimax(n_workers)
 
     def get_move(self, board: TicTacToeBoard):
-        evaluation, move = minimax(board, board.next_player == X)
+        if self.lookup_table is not None and (solution := self.lookup_table.lookup(board)) is not None:
+            evaluation, move, distance = solution
+            return move
+        if self.move_time_limit is not None:
+            evaluation, move, depth = iterative_deepening_minimax(board, board.next_player == X,
+                                                                  time_limit=self.move_time_limit,
+                                                                  table=self.transposition_table,
+                                                                  statistics=self.search_statistics)
+            return move
+        if self.parallel_search is not None:
+            evaluation, move = self.parallel_search.search(board, board.next_player == X)
+            return move
+        evaluation, move = minimax(board, board.next_player == X, table=self.transposition_table,
+                                   statistics=self.search_statistics)
         return move
 
+    def close(self):
+        if self.parallel_search is not None:
+            self.parallel_search.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
 
 if __name__ == "__main__":
+    import time
+
     # Test minimax player
     board = TicTacToeBoard()
     agent = TicTacToeMiniMaxAgent("minimax")
@@ -32,3 +87,19 @@ if __name__ == "__main__":
     board.load_state(state, O)
     print(board)
     print(agent.get_move(board))
+    print(agent.transposition_table)
+
+    # The lookup table must agree with the search
+    table_agent = TicTacToeMiniMaxAgent("minimax", lookup_table=TicTacToePerfectPlayTable.build())
+    assert table_agent.get_move(board) == agent.get_move(board)
+
+    # A per-move deadline still finds the block, and bounds the time spent on the empty board
+    deadline_agent = TicTacToeMiniMaxAgent("minimax", move_time_limit=0.005)
+    assert deadline_agent.get_move(board) == agent.get_move(board)
+    start_time = time.perf_counter()
+    deadline_agent.get_move(TicTacToeBoard())
+    print(f"Move with a 5 ms deadline took {1000 * (time.perf_counter() - start_time):.1f} ms")
+
+    # Splitting the root moves across processes finds the same move
+    with TicTacToeMiniMaxAgent("minimax", n_workers=2) as parallel_agent:
+        assert parallel_agent.get_move(board) == agent.get_move(board)
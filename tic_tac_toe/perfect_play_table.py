@@ -0,0 +1,119 @@
+import os
+import sys
+
+import numpy as np
+
+from minimax import minimax
+from transposition_table import TranspositionTable
+from .tic_tac_toe_bitboard import TicTacToeBitBoard
+from .tic_tac_toe_game import TicTacToeBoard, X, O, WINNING_SCORE, TIC_TAC_TOE_MOVES
+
+# CONSTANTS
+# File layout: an 8-byte header (magic, format version, 3 padding bytes) followed by one 3-byte record for every
+# base-3 board index, so any position is a single indexed read.
+MAGIC = b"TTTP"
+FORMAT_VERSION = 1
+HEADER_SIZE = 8
+N_RECORDS = 3 ** 9
+RECORD_DTYPE = np.dtype([("value", "i1"), ("best_move", "u1"), ("distance", "u1")])
+
+NO_MOVE = 255  # best_move of a finished game
+UNREACHABLE = 255  # distance of a position that cannot occur in a game
+
+DEFAULT_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "perfect_play_table.bin")
+
+
+# END CONSTANTS
+
+
+class TicTacToePerfectPlayTable:
+    """
+    The minimax value, best move (as square 3 * row + column) and number of plies left under perfect play for every
+    reachable tic-tac-toe position, indexed by the board's base-3 hash.
+    """
+
+    def __init__(self, records):
+        assert records.dtype == RECORD_DTYPE and records.shape == (N_RECORDS,), "Malformed perfect play table"
+        self.records = records
+
+    @classmethod
+    def build(cls):
+        """Solve every reachable position with minimax and return the table, without touching the disk."""
+        records = np.zeros(N_RECORDS, dtype=RECORD_DTYPE)
+        records["best_move"] = NO_MOVE
+        records["distance"] = UNREACHABLE
+        cls._solve_reachable_positions(TicTacToeBitBoard(), records, TranspositionTable(2 ** 15))
+        return cls(records)
+
+    @classmethod
+    def load(cls, path=DEFAULT_TABLE_PATH):
+        """Memory-map a table written by save."""
+        with open(path, "rb") as file:
+            header = file.read(HEADER_SIZE)
+        assert header[:4] == MAGIC, f"{path} is not a perfect play table"
+        assert header[4] == FORMAT_VERSION, f"{path} has format version {header[4]}, expected {FORMAT_VERSION}"
+        records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(N_RECORDS,))
+        return cls(records)
+
+    def save(self, path=DEFAULT_TABLE_PATH):
+        with open(path, "wb") as file:
+            file.write(MAGIC + bytes([FORMAT_VERSION, 0, 0, 0]))
+            file.write(np.ascontiguousarray(self.records).tobytes())
+
+    def lookup(self, board: TicTacToeBoard):
+        """
+        Return the value, best move and distance to the end of the game for board, or None if the position cannot be
+        reached from the empty board with the given player to move.
+        """
+        if (board.depth() % 2 == 0) != (board.next_player == X):
+            return None
+        value, best_move, distance = self.records[hash(board)].item()
+        if distance == UNREACHABLE:
+            return None
+        return value, None if best_move == NO_MOVE else TIC_TAC_TOE_MOVES[best_move], distance
+
+    @classmethod
+    def _solve_reachable_positions(cls, board, records, table):
+        index = hash(board)
+        if records[index]["distance"] != UNREACHABLE:
+            return
+
+        value, best_move = minimax(board, board.next_player == X, table=table)
+        if best_move is None:
+            records[index] = (value, NO_MOVE, 0)
+        else:
+            # Draws always fill the board. Wins are scored WINNING_SCORE minus the depth at which the game ends.
+            final_depth = 9 if value == 0 else WINNING_SCORE - abs(value)
+            records[index] = (value, best_move.square, final_depth - board.depth())
+
+        for move in board.get_possible_moves():
+            board.play_move(move)
+            cls._solve_reachable_positions(board, records, table)
+            board.undo_move()
+
+
+def build_perfect_play_table(path=DEFAULT_TABLE_PATH):
+    table = TicTacToePerfectPlayTable.build()
+    table.save(path)
+    return table
+
+
+if __name__ == "__main__":
+    # Build the table, then check it against a fresh search on a few positions
+    table_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_TABLE_PATH
+    build_perfect_play_table(table_path)
+    table = TicTacToePerfectPlayTable.load(table_path)
+    n_reachable = int((table.records["distance"] != UNREACHABLE).sum())
+    print(f"Wrote {n_reachable} positions to {table_path}")
+    assert n_reachable == 5478
+
+    board = TicTacToeBoard()
+    assert table.lookup(board)[::2] == (0, 9)
+    state = np.array([[0, 1, 0], [0, 0, 1], [2, 2, 1]])
+    board.load_state(state, X)
+    assert table.lookup(board) is None  # X cannot be to move here
+    board.load_state(state, O)
+    value, best_move, distance = table.lookup(board)
+    assert value == minimax(board, False)[0]
+    print(board)
+    print(best_move, distance)
@@ -3,7 +3,7 @@ from itertools import product
 import pygame
 
 from two_player_game import TwoPlayerGameGUI
-from .tic_tac_toe_game import TicTacToeBoard, TicTacToeMove, X, O
+from .tic_tac_toe_game import TicTacToeBoard, TicTacToeMove, X, O, EMPTY
 
 # Constants
 BOARD_WIDTH, BOARD_HEIGHT = 600, 600
@@ -13,6 +13,7 @@ LINE_WIDTH = min(BOARD_WIDTH, BOARD_HEIGHT) // 20
 LINE_OFFSET = LINE_WIDTH * 2 / 3
 BOARD_ROWS = 3
 BOARD_COLS = 3
+SQUARE_WIDTH, SQUARE_HEIGHT = BOARD_WIDTH / BOARD_COLS, BOARD_HEIGHT / BOARD_ROWS
 O_LINE_WIDTH = LINE_WIDTH // 3
 O_CIRCLE_RADIUS = min(BOARD_WIDTH, BOARD_HEIGHT) / 6 - 2 * O_LINE_WIDTH
 X_LINE_WIDTH = LINE_WIDTH // 3
@@ -26,84 +27,78 @@ LINE_COLOR = (0, 0, 0)
 
 
 class TicTacToeGUI(TwoPlayerGameGUI):
+    """
+    Pygame window for tic-tac-toe. It waits for input by blocking on pygame.event.wait rather than polling, and only
+    redraws the squares that changed since the last update. The grid, pieces and fonts are drawn or loaded once per
+    pygame session.
+    Set the environment variable SDL_VIDEODRIVER=dummy before creating it to run without a display.
+    """
 
     def __init__(self, board: TicTacToeBoard):
         self.board = board
 
         self.screen = None
+        self.grid_surface = None
+        self.piece_surfaces = None
+        self.message_font = None
+        self.winner_font = None
+        # Square values currently on screen, or None if the board area must be redrawn in full
+        self.drawn_state = None
         self.reset()
 
     def reset(self):
         pygame.init()
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pygame.display.set_caption("Tic Tac Toe")
+        if self.grid_surface is None:
+            self._prepare_drawing()
+        self.drawn_state = None
 
     def update_display(self):
-        # Clear the board area
-        board_rect = pygame.Rect(0, 0, BOARD_WIDTH, BOARD_HEIGHT)
-        self.screen.fill(BG_COLOR, board_rect)
-
-        # Draw board lines
-        pygame.draw.line(self.screen, LINE_COLOR, (LINE_OFFSET, BOARD_HEIGHT / 3),
-                         (BOARD_WIDTH - LINE_OFFSET, BOARD_HEIGHT / 3), LINE_WIDTH)
-        pygame.draw.line(self.screen, LINE_COLOR, (LINE_OFFSET, BOARD_HEIGHT * 2 / 3),
-                         (BOARD_WIDTH - LINE_OFFSET, BOARD_HEIGHT * 2 / 3), LINE_WIDTH)
-        pygame.draw.line(self.screen, LINE_COLOR, (BOARD_WIDTH / 3, LINE_OFFSET),
-                         (BOARD_WIDTH / 3, BOARD_HEIGHT - LINE_OFFSET), LINE_WIDTH)
-        pygame.draw.line(self.screen, LINE_COLOR, (BOARD_WIDTH * 2 / 3, LINE_OFFSET),
-                         (BOARD_WIDTH * 2 / 3, BOARD_HEIGHT - LINE_OFFSET), LINE_WIDTH)
-
-        # Draw X's and O's
-        for row, column in product(range(3), range(3)):
-            if self.board.state[row, column] == X.value:
-                pygame.draw.line(self.screen, X_COLOR,
-                                 (column * BOARD_WIDTH / 3 + X_OFFSET, (row + 1) * BOARD_HEIGHT / 3 - X_OFFSET),
-                                 ((column + 1) * BOARD_WIDTH / 3 - X_OFFSET, row * BOARD_HEIGHT / 3 + X_OFFSET),
-                                 X_LINE_WIDTH)
-                pygame.draw.line(self.screen, X_COLOR,
-                                 (column * BOARD_WIDTH / 3 + X_OFFSET, row * BOARD_HEIGHT / 3 + X_OFFSET),
-                                 ((column + 1) * BOARD_WIDTH / 3 - X_OFFSET, (row + 1) * BOARD_HEIGHT / 3 - X_OFFSET),
-                                 X_LINE_WIDTH)
-            elif self.board.state[row, column] == O.value:
-                pygame.draw.circle(self.screen, O_COLOR,
-                                   ((column + 1 / 2) * BOARD_WIDTH / 3, (row + 1 / 2) * BOARD_HEIGHT / 3),
-                                   O_CIRCLE_RADIUS, O_LINE_WIDTH)
-
-        # Update the display
-        pygame.display.update()
+        """Redraw the squares that changed since the last update. Returns the rectangles updated on screen."""
+        state = self.board.state
+        full_redraw = self.drawn_state is None
+        if full_redraw:
+            self.screen.blit(self.grid_surface, (0, 0))
+            changed_squares = [(row, column) for row, column in product(range(BOARD_ROWS), range(BOARD_COLS))
+                               if state[row, column] != EMPTY.value]
+        else:
+            changed_squares = [(row, column) for row, column in product(range(BOARD_ROWS), range(BOARD_COLS))
+                               if state[row, column] != self.drawn_state[row][column]]
+
+        dirty_rects = []
+        for row, column in changed_squares:
+            square_rect = _square_rect(row, column)
+            # Restoring the grid under the square also erases an undone piece
+            self.screen.blit(self.grid_surface, square_rect, square_rect)
+            value = state[row, column]
+            if value != EMPTY.value:
+                self.screen.blit(self.piece_surfaces[value], square_rect)
+            dirty_rects.append(square_rect)
+        if full_redraw:
+            dirty_rects = [pygame.Rect(0, 0, BOARD_WIDTH, BOARD_HEIGHT)]
+
+        self.drawn_state = [[state[row, column] for column in range(BOARD_COLS)] for row in range(BOARD_ROWS)]
+        if dirty_rects:
+            pygame.display.update(dirty_rects)
+        return dirty_rects
 
     def get_user_move(self) -> TicTacToeMove:
-        input_received = False
-        move = None
-        while not input_received:
-            for event in pygame.event.get():
-                if event.type == pygame.MOUSEBUTTONDOWN:
-                    x, y = pygame.mouse.get_pos()
-                    move = TicTacToeMove(y // (BOARD_HEIGHT / 3), x // (BOARD_WIDTH / 3))
-                    if move in self.board.get_possible_moves():
-                        input_received = True
-                        break
-
-        return move
+        while True:
+            event = pygame.event.wait()
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                x, y = event.pos
+                if y >= BOARD_HEIGHT:
+                    continue
+                move = TicTacToeMove(y // SQUARE_HEIGHT, x // SQUARE_WIDTH)
+                if self.board.is_legal_move(move):
+                    return move
 
     def display_winner(self, winner: str):
-        # Clear the text area
-        board_rect = pygame.Rect(0, BOARD_HEIGHT, BOARD_WIDTH, SCREEN_HEIGHT)
-        self.screen.fill(BG_COLOR, board_rect)
-        # Display the winner on the screen
-        font = pygame.font.Font(None, 72)  # Create a font object
-        text = font.render(f'{winner} Wins!', True, (0, 128, 0)) if winner else font.render('Tie Game!', True,
-                                                                                            (0, 128, 0))
-        text_rect = text.get_rect(center=(BOARD_WIDTH / 2, BOARD_HEIGHT + TEXT_BOX_HEIGHT / 2))
-        self.screen.blit(text, text_rect)  # Render the text on the screen
-        pygame.display.update()
+        text = self.winner_font.render(f'{winner} Wins!' if winner else 'Tie Game!', True, (0, 128, 0))
+        self._show_text([text])
 
     def display_message(self, message: str):
-        # Clear the text area
-        text_area_rect = pygame.Rect(0, BOARD_HEIGHT, BOARD_WIDTH, TEXT_BOX_HEIGHT)
-        self.screen.fill(BG_COLOR, text_area_rect)
-
-        font = pygame.font.Font(None, 48)  # Font for the message
         max_line_width = BOARD_WIDTH - 20  # Maximum width for a line, with some margin
 
         # Split message into lines if it's too long
@@ -112,22 +107,14 @@ class TicTacToeGUI(TwoPlayerGameGUI):
         current_line = ''
         for word in words:
             # Check if adding the next word exceeds the line width
-            if font.size(current_line + word)[0] <= max_line_width:
+            if self.message_font.size(current_line + word)[0] <= max_line_width:
                 current_line += word + ' '
             else:
                 lines.append(current_line)
                 current_line = word + ' '
         lines.append(current_line)  # Add the last line
 
-        # Display each line of the message
-        line_height = font.get_height()
-        start_y = BOARD_HEIGHT + (TEXT_BOX_HEIGHT - line_height * len(lines)) / 2
-        for i, line in enumerate(lines):
-            text = font.render(line, True, (0, 0, 128))  # Blue text
-            text_rect = text.get_rect(center=(BOARD_WIDTH / 2, start_y + i * line_height))
-            self.screen.blit(text, text_rect)
-
-        pygame.display.update()
+        self._show_text([self.message_font.render(line, True, (0, 0, 128)) for line in lines])  # Blue text
 
     def clear(self):
         self.board.reset()
@@ -135,20 +122,98 @@ class TicTacToeGUI(TwoPlayerGameGUI):
         self.update_display()
 
     def await_exit(self):
-        # Process PyGame events
-        user_has_quit = False
-        while not user_has_quit:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    user_has_quit = True
-                    break
+        while pygame.event.wait().type != pygame.QUIT:
+            pass
+        pygame.quit()
+        # Surfaces and fonts do not survive pygame.quit, and using them afterwards crashes the interpreter
+        self.grid_surface = self.piece_surfaces = self.message_font = self.winner_font = None
         self.reset()
 
+    # HELPER METHODS
+    def _prepare_drawing(self):
+        """Draw the empty grid and the two pieces, and load the fonts, once each time pygame is initialized."""
+        self.grid_surface = pygame.Surface((BOARD_WIDTH, BOARD_HEIGHT))
+        self.grid_surface.fill(BG_COLOR)
+        for i in range(1, BOARD_ROWS):
+            pygame.draw.line(self.grid_surface, LINE_COLOR, (LINE_OFFSET, i * SQUARE_HEIGHT),
+                             (BOARD_WIDTH - LINE_OFFSET, i * SQUARE_HEIGHT), LINE_WIDTH)
+        for i in range(1, BOARD_COLS):
+            pygame.draw.line(self.grid_surface, LINE_COLOR, (i * SQUARE_WIDTH, LINE_OFFSET),
+                             (i * SQUARE_WIDTH, BOARD_HEIGHT - LINE_OFFSET), LINE_WIDTH)
+
+        # Pieces are drawn on transparent squares so the grid lines show through
+        x_surface = pygame.Surface((SQUARE_WIDTH, SQUARE_HEIGHT), pygame.SRCALPHA)
+        pygame.draw.line(x_surface, X_COLOR, (X_OFFSET, SQUARE_HEIGHT - X_OFFSET),
+                         (SQUARE_WIDTH - X_OFFSET, X_OFFSET), X_LINE_WIDTH)
+        pygame.draw.line(x_surface, X_COLOR, (X_OFFSET, X_OFFSET),
+                         (SQUARE_WIDTH - X_OFFSET, SQUARE_HEIGHT - X_OFFSET), X_LINE_WIDTH)
+        o_surface = pygame.Surface((SQUARE_WIDTH, SQUARE_HEIGHT), pygame.SRCALPHA)
+        pygame.draw.circle(o_surface, O_COLOR, (SQUARE_WIDTH / 2, SQUARE_HEIGHT / 2), O_CIRCLE_RADIUS, O_LINE_WIDTH)
+        self.piece_surfaces = {X.value: x_surface, O.value: o_surface}
+
+        self.message_font = pygame.font.Font(None, 48)
+        self.winner_font = pygame.font.Font(None, 72)
+
+    def _show_text(self, rendered_lines):
+        """Replace the text area with rendered lines, centered, and update only that area of the screen."""
+        text_area_rect = pygame.Rect(0, BOARD_HEIGHT, BOARD_WIDTH, TEXT_BOX_HEIGHT)
+        self.screen.fill(BG_COLOR, text_area_rect)
+        line_height = rendered_lines[0].get_height()
+        start_y = BOARD_HEIGHT + (TEXT_BOX_HEIGHT - line_height * len(rendered_lines)) / 2 + line_height / 2
+        for i, text in enumerate(rendered_lines):
+            self.screen.blit(text, text.get_rect(center=(BOARD_WIDTH / 2, start_y + i * line_height)))
+        pygame.display.update(text_area_rect)
+
+
+def _square_rect(row, column):
+    return pygame.Rect(round(column * SQUARE_WIDTH), round(row * SQUARE_HEIGHT), round(SQUARE_WIDTH),
+                       round(SQUARE_HEIGHT))
 
-# Example of using the GUI
+
+# Example of using the GUI. With SDL_VIDEODRIVER=dummy, runs a scripted game without a display instead.
 if __name__ == "__main__":
+    import os
+
     board = TicTacToeBoard()
     gui = TicTacToeGUI(board)
-    gui.update_display()
-    print(gui.get_user_move())
+    if os.environ.get("SDL_VIDEODRIVER") != "dummy":
+        gui.update_display()
+        print(gui.get_user_move())
+    else:
+        from two_player_game import TwoPlayerGame
+        from .human_tic_tac_toe import TicTacToeHumanGUIAgent
+        from .minimax_tic_tac_toe import TicTacToeMiniMaxAgent
+
+        def click(row, column):
+            position = (int((column + 1 / 2) * SQUARE_WIDTH), int((row + 1 / 2) * SQUARE_HEIGHT))
+            pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=position, button=1))
+
+        # Only the squares that changed are redrawn
+        assert gui.update_display() == [pygame.Rect(0, 0, BOARD_WIDTH, BOARD_HEIGHT)]
+        assert gui.update_display() == []
+        click(1, 1)
+        move = gui.get_user_move()
+        assert move == TicTacToeMove(1, 1)
+        board.play_move(move)
+        assert gui.update_display() == [_square_rect(1, 1)]
+        assert gui.screen.get_at(_square_rect(1, 1).center)[:3] == X_COLOR
+        board.undo_move()
+        assert gui.update_display() == [_square_rect(1, 1)]
+        assert gui.screen.get_at(_square_rect(1, 1).center)[:3] == BG_COLOR
+
+        # A whole game without pauses. Clicks on taken squares are ignored, so clicking every square in order gives the
+        # human a legal move each turn.
+        for row, column in product(range(BOARD_ROWS), range(BOARD_COLS)):
+            click(row, column)
+        pygame.event.post(pygame.event.Event(pygame.QUIT))
+        game = TwoPlayerGame(board, TicTacToeHumanGUIAgent("human", gui), TicTacToeMiniMaxAgent("minimax"))
+        game.play_in_GUI(gui, move_delay=0)
+        print(board)
+        assert board.is_game_over and board.winning_player != X.name
+
+        # await_exit quit pygame; a second game on the same GUI starts it again with freshly loaded fonts
+        for row, column in product(range(BOARD_ROWS), range(BOARD_COLS)):
+            click(row, column)
+        pygame.event.post(pygame.event.Event(pygame.QUIT))
+        game.play_in_GUI(gui, move_delay=0)
+        assert board.is_game_over and board.winning_player != X.name
@@ -0,0 +1,205 @@
+import numpy as np
+
+from .tic_tac_toe_game import (TicTacToeBoard, TicTacToeMove, TicTacToeSnapshot, X, O, EMPTY, SYMMETRIES,
+                               MOVES_IN_BITMASK)
+
+
+# CONSTANTS
+# Square (row, column) is stored in bit 3 * row + column of each player's bitboard
+ALL_SQUARES = 0b111111111
+
+WIN_MASKS = (
+    # Rows
+    0b000000111, 0b000111000, 0b111000000,
+    # Columns
+    0b001001001, 0b010010010, 0b100100100,
+    # Diagonals
+    0b100010001, 0b001010100,
+)
+
+# Lookup tables indexed by a 9-bit bitboard
+IS_WINNING_BITBOARD = tuple(any(bits & mask == mask for mask in WIN_MASKS) for bits in range(ALL_SQUARES + 1))
+SQUARES_IN_BITBOARD = tuple(tuple(square for square in range(9) if bits >> square & 1)
+                            for bits in range(ALL_SQUARES + 1))
+BASE_3_INDEX = tuple(sum(3 ** (8 - square) for square in SQUARES_IN_BITBOARD[bits])
+                     for bits in range(ALL_SQUARES + 1))
+# SYMMETRIC_BASE_3_INDEX[t][bits] is the base-3 index of bits after applying symmetry t
+SYMMETRIC_BASE_3_INDEX = tuple(
+    tuple(sum(3 ** (8 - square) for square in range(9) if bits >> int(permutation[square]) & 1)
+          for bits in range(ALL_SQUARES + 1))
+    for permutation in SYMMETRIES)
+
+
+# END CONSTANTS
+
+
+class TicTacToeBitBoard(TicTacToeBoard):
+    """
+    Drop-in replacement for TicTacToeBoard which stores each player's squares as a 9-bit integer instead of a NumPy
+    array. Wins are checked with a lookup table built from the 8 line masks, and empty squares come from a bit
+    operation. The NumPy state is only built (and cached) when something asks for it, such as the GUI or __str__.
+    """
+
+    def __init__(self):
+        self.x_bits = 0
+        self.o_bits = 0
+        self._state_view = None
+        super().__init__()
+
+    def reset(self):
+        self.x_bits = 0
+        self.o_bits = 0
+        self.symmetric_hashes = [0] * 8
+        self._state_view = None
+        self.next_player = X
+        self.next_next_player = O
+        self.is_game_over = False
+        self.move_history = []
+        self.winning_player = ""
+
+    @property
+    def state(self):
+        """Read-only 3x3 NumPy view of the board, built on first access after each change."""
+        if self._state_view is None:
+            state = np.full(9, EMPTY.value)
+            state[list(SQUARES_IN_BITBOARD[self.x_bits])] = X.value
+            state[list(SQUARES_IN_BITBOARD[self.o_bits])] = O.value
+            state = state.reshape((3, 3))
+            state.flags.writeable = False
+            self._state_view = state
+        return self._state_view
+
+    @state.setter
+    def state(self, state):
+        # TicTacToeBoard.__init__ assigns None before calling reset
+        if state is None:
+            return
+        flat_state = np.asarray(state).flatten()
+        self.x_bits = sum(1 << square for square in range(9) if flat_state[square] == X.value)
+        self.o_bits = sum(1 << square for square in range(9) if flat_state[square] == O.value)
+        self.symmetric_hashes = [index[self.x_bits] + 2 * index[self.o_bits] for index in SYMMETRIC_BASE_3_INDEX]
+        self._state_view = None
+
+    def play_move(self, move: TicTacToeMove):
+        row, column = move.row, move.column
+        assert 0 <= row < 3 and 0 <= column < 3, "Attempted move outside board"
+        assert not self.is_game_over, "Attempted move after game over without resetting"
+        square = 1 << move.square
+        assert not (self.x_bits | self.o_bits) & square, "Attempted repeat move without resetting"
+        self.move_history.append((row, column))
+        if self.next_player is X:
+            self.x_bits |= square
+        else:
+            self.o_bits |= square
+        self._update_hashes(move.square, self.next_player.value)
+        self._state_view = None
+        self._switch_active_player()
+        self._check_game_over()
+
+    def undo_move(self):
+        assert len(self.move_history), "Attempted to undo move without making any"
+        last_row, last_column = self.move_history.pop()
+        square = 3 * last_row + last_column
+        self._update_hashes(square, -(X.value if self.x_bits >> square & 1 else O.value))
+        self.x_bits &= ~(1 << square)
+        self.o_bits &= ~(1 << square)
+        self._state_view = None
+        self._switch_active_player()
+        self._check_game_over()  # Resets winning_player and is_game_over
+
+    def get_possible_moves(self):
+        if self.is_game_over:
+            return ()
+        return MOVES_IN_BITMASK[self.empty_bits()]
+
+    def is_legal_move(self, move: TicTacToeMove):
+        return (not self.is_game_over and 0 <= move.row < 3 and 0 <= move.column < 3
+                and self.empty_bits() >> move.square & 1 == 1)
+
+    def load_state(self, state, active_player=X):
+        """Set up the position in a 3x3 array of square values, which is read but not kept, and clear the history."""
+        self.state = state
+        self.move_history = []
+        self.next_player = active_player
+        self.next_next_player = X if active_player == O else O
+        self._check_game_over()
+
+    def restore(self, snapshot: TicTacToeSnapshot):
+        self.x_bits, self.o_bits = snapshot.bits()
+        self.symmetric_hashes = [index[self.x_bits] + 2 * index[self.o_bits] for index in SYMMETRIC_BASE_3_INDEX]
+        self._state_view = None
+        self.move_history = []
+        self.next_player = snapshot.next_player
+        self.next_next_player = O if snapshot.x_to_move else X
+        self._check_game_over()
+
+    # NON-OVERRIDES
+    def n_empty(self):
+        return len(SQUARES_IN_BITBOARD[self.empty_bits()])
+
+    def empty_bits(self):
+        return ~(self.x_bits | self.o_bits) & ALL_SQUARES
+
+    # HELPER METHODS
+    def _check_game_over(self):
+        if IS_WINNING_BITBOARD[self.x_bits]:
+            self.is_game_over = True
+            self.winning_player = X.name
+        elif IS_WINNING_BITBOARD[self.o_bits]:
+            self.is_game_over = True
+            self.winning_player = O.name
+        else:
+            # Cat's game if no squares are empty
+            self.is_game_over = self.x_bits | self.o_bits == ALL_SQUARES
+            self.winning_player = ""
+
+    # Defining __eq__ would otherwise clear the inherited __hash__
+    __hash__ = TicTacToeBoard.__hash__
+
+    def __eq__(self, other):
+        if isinstance(other, TicTacToeBitBoard):
+            return self.x_bits == other.x_bits and self.o_bits == other.o_bits
+        return super().__eq__(other)
+
+
+if __name__ == "__main__":
+    # Play random games on both board implementations and check that they always agree
+    import pickle
+    import random
+
+    rng = random.Random(0)
+    bitboard, reference = TicTacToeBitBoard(), TicTacToeBoard()
+    for game_number in range(1000):
+        bitboard.reset()
+        reference.reset()
+        while not reference.is_game_over:
+            assert bitboard.get_possible_moves() == reference.get_possible_moves()
+            move = rng.choice(reference.get_possible_moves())
+            bitboard.play_move(move)
+            reference.play_move(move)
+            assert hash(bitboard) == hash(reference) and bitboard == reference
+            assert bitboard.canonical_key() == reference.canonical_key()
+            assert bitboard.is_game_over == reference.is_game_over
+            assert bitboard.winning_player == reference.winning_player
+            assert bitboard.depth() == reference.depth()
+            # Snapshots agree, survive pickling and restore the same position on either board
+            snapshot = pickle.loads(pickle.dumps(bitboard.snapshot()))
+            assert snapshot == reference.snapshot() and snapshot.bits() == (bitboard.x_bits, bitboard.o_bits)
+            restored = snapshot.to_board()
+            assert restored == bitboard and hash(restored) == hash(bitboard)
+            assert restored.is_game_over == bitboard.is_game_over and restored.next_player is bitboard.next_player
+        # Undo part of the game and check again
+        for _ in range(rng.randrange(len(reference.move_history) + 1)):
+            bitboard.undo_move()
+            reference.undo_move()
+            assert hash(bitboard) == hash(reference)
+            assert hash(bitboard) == BASE_3_INDEX[bitboard.x_bits] + 2 * BASE_3_INDEX[bitboard.o_bits]
+            assert bitboard.canonical_key() == reference.canonical_key()
+            assert bitboard.is_game_over == reference.is_game_over
+            assert bitboard.winning_player == reference.winning_player
+    print(bitboard)
+
+    # Load a given state and print
+    state = np.array([[1, 1, 0], [2, 2, 0], [0, 0, 0]])
+    bitboard.load_state(state, X)
+    print(bitboard)
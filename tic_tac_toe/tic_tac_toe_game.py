@@ -23,27 +23,159 @@ TIC_TAC_TOE_DISPLAY = {TicTacToeSquareValues.EMPTY.value: " ",
 
 WINNING_SCORE = 10
 
+# The 8 rotations and reflections of the board as square permutations, where square (row, column) is 3 * row + column.
+# Square i of the transformed board holds square SYMMETRIES[t][i] of the original; INVERSE_SYMMETRIES maps back.
+_SQUARES = np.arange(9).reshape((3, 3))
+SYMMETRIES = np.array([np.rot90(squares, k).flatten() for squares in (_SQUARES, _SQUARES.T) for k in range(4)])
+INVERSE_SYMMETRIES = np.argsort(SYMMETRIES, axis=1)
+BASE_3_WEIGHTS = 3 ** np.arange(8, -1, -1)
+# SYMMETRIC_SQUARE_WEIGHTS[square][t] is the base-3 place value of square on the board transformed by symmetry t
+SYMMETRIC_SQUARE_WEIGHTS = tuple(tuple(int(BASE_3_WEIGHTS[INVERSE_SYMMETRIES[symmetry, square]])
+                                       for symmetry in range(8))
+                                 for square in range(9))
+
 
 # END CONSTANTS
 
 
 class TicTacToeMove(TwoPlayerGameMove):
+    """
+    Immutable move on square (row, column). Moves on the board are interned: TicTacToeMove(row, column) returns the same
+    instance every time, so creating one allocates nothing and moves can be used in sets and as dictionary keys.
+    """
+    __slots__ = ("row", "column", "square")
+
+    def __new__(cls, row, column):
+        row, column = int(row), int(column)
+        if 0 <= row < 3 and 0 <= column < 3 and _INTERNED_MOVES:
+            return _INTERNED_MOVES[3 * row + column]
+        # Moves off the board are still constructible so that play_move can reject them
+        move = super().__new__(cls)
+        object.__setattr__(move, "row", row)
+        object.__setattr__(move, "column", column)
+        object.__setattr__(move, "square", 3 * row + column)
+        return move
+
     def __init__(self, row, column):
-        self.row = int(row)
-        self.column = int(column)
+        # Everything is set in __new__, so interned moves are never modified
+        pass
+
+    def __setattr__(self, name, value):
+        raise AttributeError("TicTacToeMove is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("TicTacToeMove is immutable")
+
+    def __reduce__(self):
+        # Unpickling goes through __new__, which returns the interned instance
+        return TicTacToeMove, (self.row, self.column)
 
     def __str__(self):
         return str((self.row + 1, self.column + 1))
 
+    def __repr__(self):
+        return f"TicTacToeMove({self.row}, {self.column})"
+
     def __eq__(self, other):
         if not isinstance(other, TicTacToeMove):
             return False
         return self.row == other.row and self.column == other.column
 
+    def __hash__(self):
+        return hash((self.row, self.column))
+
+
+_INTERNED_MOVES = ()
+TIC_TAC_TOE_MOVES = tuple(TicTacToeMove(square // 3, square % 3) for square in range(9))
+_INTERNED_MOVES = TIC_TAC_TOE_MOVES
+
+# MOVES_IN_BITMASK[bits] holds the interned moves of the squares set in a 9-bit mask, where square (row, column) is
+# bit 3 * row + column. This is the move generator of both boards: a lookup of the empty squares' mask replaces
+# iterating over the set bits on every call, and returns a tuple that callers can index and reuse
+MOVES_IN_BITMASK = tuple(tuple(move for move in TIC_TAC_TOE_MOVES if bits >> move.square & 1) for bits in range(512))
+SQUARE_BITS = 1 << np.arange(9)
+# Number of winning lines through each square: the center is on 4, corners on 3 and edges on 2
+LINES_THROUGH_SQUARE = (3, 2, 3, 2, 4, 2, 3, 2, 3)
+
+
+class TicTacToeSnapshot(TwoPlayerGameSnapshot):
+    """
+    Immutable tic-tac-toe position, stored as the board's base-3 index (its position_hash) and whether X moves next.
+    Boards keep the index up to date, so taking a snapshot allocates one small object and copies no array. Snapshots
+    pickle to a few bytes each; in a list, the class name is only written once.
+    """
+    __slots__ = ("position_index", "x_to_move")
+
+    def __new__(cls, position_index, x_to_move):
+        snapshot = super().__new__(cls)
+        object.__setattr__(snapshot, "position_index", int(position_index))
+        object.__setattr__(snapshot, "x_to_move", bool(x_to_move))
+        return snapshot
+
+    def __init__(self, position_index, x_to_move):
+        # Everything is set in __new__, as for TicTacToeMove
+        pass
+
+    def __setattr__(self, name, value):
+        raise AttributeError("TicTacToeSnapshot is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("TicTacToeSnapshot is immutable")
+
+    def __reduce__(self):
+        return TicTacToeSnapshot, (self.position_index, self.x_to_move)
+
+    @property
+    def next_player(self):
+        return X if self.x_to_move else O
+
+    def squares(self):
+        """The value of each square, square (row, column) at index 3 * row + column."""
+        values = [EMPTY.value] * 9
+        index = self.position_index
+        # Square 8 is the least significant base-3 digit
+        for square in range(8, -1, -1):
+            index, values[square] = divmod(index, 3)
+        return values
+
+    def bits(self):
+        """The squares of X and of O as 9-bit masks, as in TicTacToeBitBoard."""
+        x_bits = o_bits = 0
+        for square, value in enumerate(self.squares()):
+            if value == X.value:
+                x_bits |= 1 << square
+            elif value == O.value:
+                o_bits |= 1 << square
+        return x_bits, o_bits
+
+    def state(self):
+        """A new 3x3 array of the square values, as in TicTacToeBoard."""
+        return np.array(self.squares()).reshape((3, 3))
+
+    def to_board(self):
+        """Return a TicTacToeBitBoard, the faster drop-in board, in this position."""
+        from .tic_tac_toe_bitboard import TicTacToeBitBoard
+
+        board = TicTacToeBitBoard()
+        board.restore(self)
+        return board
+
+    def __eq__(self, other):
+        if not isinstance(other, TicTacToeSnapshot):
+            return False
+        return self.position_index == other.position_index and self.x_to_move == other.x_to_move
+
+    def __hash__(self):
+        return 2 * self.position_index + self.x_to_move
+
+    def __repr__(self):
+        return f"TicTacToeSnapshot({self.position_index}, {self.x_to_move})"
+
 
 class TicTacToeBoard(TwoPlayerGameBoard):
     def __init__(self):
         self.name = "Tic-tac-toe"
+        self.symmetric_hashes = None
         self.state = None
         self.next_player = None
         self.next_next_player = None
@@ -54,6 +186,7 @@ class TicTacToeBoard(TwoPlayerGameBoard):
 
     def reset(self):
         self.state = np.full((3, 3), EMPTY.value)
+        self.symmetric_hashes = [0] * 8
         self.next_player = X
         self.next_next_player = O
         self.is_game_over = False
@@ -67,24 +200,32 @@ class TicTacToeBoard(TwoPlayerGameBoard):
         assert self.state[row, column] == EMPTY.value, "Attempted repeat move without resetting"
         self.move_history.append((row, column))
         self.state[row, column] = self.next_player.value
+        self._update_hashes(move.square, self.next_player.value)
         self._switch_active_player()
         self._check_game_over()
 
     def undo_move(self):
         assert len(self.move_history), "Attempted to undo move without making any"
         last_row, last_column = self.move_history.pop()
+        self._update_hashes(3 * last_row + last_column, -int(self.state[last_row, last_column]))
         self.state[last_row, last_column] = EMPTY.value
         self._switch_active_player()
         self._check_game_over()  # Resets winning_player and is_game_over
 
     def get_possible_moves(self):
         if self.is_game_over:
-            return []
-        return [TicTacToeMove(row, column) for row, column in product(range(3), range(3))
-                if self.state[row, column] == EMPTY.value]
+            return ()
+        return MOVES_IN_BITMASK[int((self.state.flatten() == EMPTY.value) @ SQUARE_BITS)]
+
+    def is_legal_move(self, move: TicTacToeMove):
+        return (not self.is_game_over and 0 <= move.row < 3 and 0 <= move.column < 3
+                and self.state[move.row, move.column] == EMPTY.value)
 
     def load_state(self, state, active_player=X):
-        self.state = state
+        """Set up the position in a 3x3 array of square values. The array is copied, and the move history cleared."""
+        self.state = np.array(state).reshape((3, 3))
+        self.move_history = []
+        self.symmetric_hashes = [int(key) for key in self.state.flatten()[SYMMETRIES] @ BASE_3_WEIGHTS]
         self.next_player = active_player
         self.next_next_player = X if active_player == O else O
         self._check_game_over()
@@ -92,6 +233,12 @@ class TicTacToeBoard(TwoPlayerGameBoard):
     def depth(self):
         return 9 - self.n_empty()
 
+    def snapshot(self):
+        return TicTacToeSnapshot(self.symmetric_hashes[0], self.next_player is X)
+
+    def restore(self, snapshot: TicTacToeSnapshot):
+        self.load_state(snapshot.state(), snapshot.next_player)
+
     def static_evaluation(self):
         if self.is_game_over:
             if self.winning_player == X.name:
@@ -100,12 +247,44 @@ class TicTacToeBoard(TwoPlayerGameBoard):
                 return -(WINNING_SCORE - self.depth())
         return 0
 
+    def order_moves(self, moves):
+        """Squares on more winning lines first: the center, then corners, then edges."""
+        return sorted(moves, key=lambda move: LINES_THROUGH_SQUARE[move.square], reverse=True)
+
     # NON-OVERRIDES
+    def canonical_key(self):
+        """
+        Return the smallest base-3 index over the 8 rotations and reflections of the board, along with the symmetry that
+        produces it. Equivalent positions share the same key.
+        """
+        key = min(self.symmetric_hashes)
+        return key, self.symmetric_hashes.index(key)
+
+    @staticmethod
+    def transform_move(move: TicTacToeMove, symmetry):
+        """Map a move on this board to the same square on the board transformed by symmetry."""
+        return TIC_TAC_TOE_MOVES[INVERSE_SYMMETRIES[symmetry, move.square]]
+
+    @staticmethod
+    def untransform_move(move: TicTacToeMove, symmetry):
+        """Map a move on the board transformed by symmetry back to this board."""
+        return TIC_TAC_TOE_MOVES[SYMMETRIES[symmetry, move.square]]
+
     def n_empty(self):
         return len(
             [(row, column) for row, column in product(range(3), range(3)) if self.state[row, column] == EMPTY.value])
 
+    @property
+    def position_hash(self):
+        """Base-3 index of the board (the state read as a 9-digit base-3 number), kept up to date by every move."""
+        return self.symmetric_hashes[0]
+
     # HELPER METHODS
+    def _update_hashes(self, square, value):
+        """Add value at square to the base-3 index of the board under each symmetry."""
+        self.symmetric_hashes = [symmetric_hash + value * weight for symmetric_hash, weight
+                                 in zip(self.symmetric_hashes, SYMMETRIC_SQUARE_WEIGHTS[square])]
+
     def _check_game_over(self):
         # Check for player win
         for player in (X, O):
@@ -154,8 +333,7 @@ class TicTacToeBoard(TwoPlayerGameBoard):
         return s
 
     def __hash__(self):
-        base_3_index = "".join(str(value) for value in self.state.flatten())
-        return int(base_3_index, 3)
+        return self.symmetric_hashes[0]
 
     def __eq__(self, other):
         if not isinstance(other, TicTacToeBoard):
@@ -247,3 +425,54 @@ if __name__ == "__main__":
     state = np.array([[1, 1, 0], [2, 2, 0], [0, 0, 0]])
     board.load_state(state, X)
     print(board)
+
+    # Rotations and reflections of the loaded state share a key, and moves map back to the real board
+    key, symmetry = board.canonical_key()
+    for transformed_state in (np.rot90(state), np.fliplr(state), state.T):
+        board.load_state(transformed_state.copy(), X)
+        assert board.canonical_key()[0] == key
+    board.load_state(state, X)
+    winning_move = TicTacToeMove(0, 2)
+    assert board.untransform_move(board.transform_move(winning_move, symmetry), symmetry) is winning_move
+
+    # Moves are interned and immutable, and legality checks match the possible moves
+    assert TicTacToeMove(1.0, 2.0) is TIC_TAC_TOE_MOVES[5] and TIC_TAC_TOE_MOVES[5] in set(board.get_possible_moves())
+    assert all(board.is_legal_move(move) == (move in board.get_possible_moves()) for move in TIC_TAC_TOE_MOVES)
+    assert not board.is_legal_move(TicTacToeMove(3, 1))
+    assert MOVES_IN_BITMASK[0b100000101] == (TicTacToeMove(0, 0), TicTacToeMove(0, 2), TicTacToeMove(2, 2))
+    try:
+        winning_move.row = 1
+    except AttributeError:
+        pass
+    else:
+        assert False
+
+    # Loading copies the array, so changing it afterwards does not change the board
+    state = np.array([[1, 1, 0], [2, 2, 0], [0, 0, 0]])
+    board.load_state(state, X)
+    state[2, 2] = X.value
+    assert board.state[2, 2] == EMPTY.value and board.move_history == []
+
+    # Snapshots are immutable, hashable, tiny when pickled, and restore the position on any tic-tac-toe board
+    import pickle
+
+    snapshot = board.snapshot()
+    assert snapshot == TicTacToeSnapshot(hash(board), True) and hash(snapshot) == 2 * hash(board) + 1
+    assert pickle.loads(pickle.dumps(snapshot)) == snapshot
+    snapshots = [TicTacToeSnapshot(index, index % 2) for index in range(0, 3 ** 9, 19)]
+    print(f"Snapshot pickled alone: {len(pickle.dumps(snapshot))} bytes, in a list of {len(snapshots)}: "
+          f"{len(pickle.dumps(snapshots)) / len(snapshots):.1f} bytes each")
+    board.play_move(TicTacToeMove(0, 2))
+    assert board.snapshot() != snapshot and board.is_game_over
+    board.restore(snapshot)
+    assert board.snapshot() == snapshot and (board.state == np.array([[1, 1, 0], [2, 2, 0], [0, 0, 0]])).all()
+    assert not board.is_game_over and board.next_player is X and board.move_history == []
+    restored = TicTacToeBoard()
+    restored.restore(snapshot)
+    assert restored == board and restored.canonical_key() == board.canonical_key() and restored.snapshot() == snapshot
+    try:
+        snapshot.x_to_move = False
+    except AttributeError:
+        pass
+    else:
+        assert False
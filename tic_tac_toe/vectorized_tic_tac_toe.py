@@ -0,0 +1,172 @@
+import time
+from functools import cache
+
+import numpy as np
+
+from .perfect_play_table import TicTacToePerfectPlayTable, NO_MOVE
+from .tic_tac_toe_game import X, O, EMPTY, WINNING_SCORE, SYMMETRIES, BASE_3_WEIGHTS
+
+# CONSTANTS
+# Squares of each row, column and diagonal, where square (row, column) is 3 * row + column
+WIN_LINES = np.array([[0, 1, 2], [3, 4, 5], [6, 7, 8],
+                      [0, 3, 6], [1, 4, 7], [2, 5, 8],
+                      [0, 4, 8], [2, 4, 6]])
+
+ILLEGAL_MOVE_PENALTY = -15
+
+
+# END CONSTANTS
+
+
+class VectorizedTicTacToe:
+    """
+    Many tic-tac-toe boards held in one (n_boards, 9) array and advanced together, one move per board per step.
+    Actions are squares 3 * row + column. Squares use the same values as TicTacToeBoard (EMPTY, X, O).
+    """
+
+    def __init__(self, n_boards, auto_reset=True):
+        """
+        :param n_boards: Number of boards to simulate.
+        :param auto_reset: If True, boards that finish during a step are reset at the end of it. The results are still
+                           available in winners and dones until the next step.
+        """
+        self.n_boards = n_boards
+        self.auto_reset = auto_reset
+        self.states = np.full((n_boards, 9), EMPTY.value, dtype=np.int8)
+        self.next_player = np.full(n_boards, X.value, dtype=np.int8)
+        self.depths = np.zeros(n_boards, dtype=np.int8)
+        self.is_game_over = np.zeros(n_boards, dtype=bool)
+        # Results of the last step, kept after automatic resets
+        self.winners = np.full(n_boards, EMPTY.value, dtype=np.int8)
+        self.dones = np.zeros(n_boards, dtype=bool)
+        self._all_boards = np.arange(n_boards)
+
+    def reset(self, boards=None):
+        """Reset the boards selected by a boolean mask or index array, or all boards if None."""
+        if boards is None:
+            boards = slice(None)
+        self.states[boards] = EMPTY.value
+        self.next_player[boards] = X.value
+        self.depths[boards] = 0
+        self.is_game_over[boards] = False
+
+    def step(self, actions):
+        """
+        Play actions[i] for the player to move on board i. Illegal moves leave the board unchanged. Boards whose game is
+        over (only possible without auto_reset) ignore their action.
+        :return: The reward of the player who moved on each board (WINNING_SCORE minus the depth for a win,
+                 ILLEGAL_MOVE_PENALTY for an illegal move, else 0) and a mask of the boards that finished this step.
+        """
+        actions = np.asarray(actions)
+        movers = self.next_player.copy()
+        active = ~self.is_game_over
+        legal = active & (self.states[self._all_boards, actions] == EMPTY.value)
+        self.states[legal, actions[legal]] = movers[legal]
+        self.depths += legal
+
+        # Only the player who just moved can have completed a line
+        lines = self.states[:, WIN_LINES]
+        won = legal & (lines == movers[:, None, None]).all(axis=2).any(axis=1)
+        drawn = legal & ~won & (self.depths == 9)
+        self.dones = won | drawn
+        self.winners = np.where(won, movers, EMPTY.value).astype(np.int8)
+        self.is_game_over |= self.dones
+        self.next_player[legal] = X.value + O.value - movers[legal]
+
+        rewards = np.where(won, WINNING_SCORE - self.depths, 0)
+        rewards[active & ~legal] = ILLEGAL_MOVE_PENALTY
+
+        if self.auto_reset:
+            self.reset(self.dones)
+        return rewards, self.dones
+
+    def legal_move_masks(self):
+        """(n_boards, 9) boolean mask of the empty squares of each unfinished board."""
+        return (self.states == EMPTY.value) & ~self.is_game_over[:, None]
+
+    def hashes(self):
+        """The base-3 index of each board, equal to hash(board) for a TicTacToeBoard in the same position."""
+        return self.states @ BASE_3_WEIGHTS
+
+    def canonical_keys(self):
+        """The canonical key of each board and the symmetry producing it, as in TicTacToeBoard.canonical_key."""
+        keys = self.states[:, SYMMETRIES] @ BASE_3_WEIGHTS
+        symmetries = keys.argmin(axis=1)
+        return keys[self._all_boards, symmetries], symmetries
+
+    @staticmethod
+    def untransform_actions(actions, symmetries):
+        """Map actions chosen on the canonical boards back to the real boards."""
+        return SYMMETRIES[symmetries, actions]
+
+
+# BATCH POLICIES
+# A batch policy takes a VectorizedTicTacToe and returns one action per board. Actions on boards where it is not the
+# policy's turn are ignored.
+def random_policy(rng=None):
+    """Plays a uniformly random legal move on every board."""
+    rng = np.random.default_rng() if rng is None else rng
+
+    def policy(env: VectorizedTicTacToe):
+        return np.argmax(rng.random((env.n_boards, 9)) * env.legal_move_masks(), axis=1)
+
+    return policy
+
+
+def perfect_play_policy(table: TicTacToePerfectPlayTable):
+    """Plays the perfect-play move from table on every board."""
+    best_moves = table.records["best_move"]
+
+    def policy(env: VectorizedTicTacToe):
+        actions = best_moves[env.hashes()]
+        # Finished boards have no best move; their action is ignored
+        return np.where(actions == NO_MOVE, 0, actions)
+
+    return policy
+
+
+@cache
+def default_perfect_play_policy():
+    """perfect_play_policy over a table solved in memory once per process."""
+    return perfect_play_policy(TicTacToePerfectPlayTable.build())
+
+
+def run_batch_matches(x_policy, o_policy, n_games, n_boards=4096):
+    """
+    Play at least n_games between two batch policies on n_boards boards at a time.
+    :return: Dictionary with the number of games, X wins, O wins and draws, and games per second.
+    """
+    env = VectorizedTicTacToe(min(n_boards, n_games))
+    x_wins = o_wins = draws = 0
+    start_time = time.perf_counter()
+    while x_wins + o_wins + draws < n_games:
+        x_to_move = env.next_player == X.value
+        actions = np.where(x_to_move, x_policy(env), o_policy(env))
+        _, dones = env.step(actions)
+        x_wins += int((env.winners == X.value).sum())
+        o_wins += int((env.winners == O.value).sum())
+        draws += int((dones & (env.winners == EMPTY.value)).sum())
+    elapsed = time.perf_counter() - start_time
+    n_played = x_wins + o_wins + draws
+    return {"games": n_played, X.name: x_wins, O.name: o_wins, "draws": draws,
+            "games_per_second": n_played / elapsed}
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+
+    # Random play: X should win more often than O
+    results = run_batch_matches(random_policy(rng), random_policy(rng), n_games=200_000)
+    print("Random vs random:", results)
+    assert results[X.name] > results[O.name] > results["draws"]
+
+    # Perfect play never loses
+    results = run_batch_matches(default_perfect_play_policy(), random_policy(rng), n_games=100_000)
+    print("Perfect vs random:", results)
+    assert results[O.name] == 0
+    results = run_batch_matches(random_policy(rng), default_perfect_play_policy(), n_games=100_000)
+    print("Random vs perfect:", results)
+    assert results[X.name] == 0
+    results = run_batch_matches(default_perfect_play_policy(), default_perfect_play_policy(), n_games=10_000)
+    print("Perfect vs perfect:", results)
+    assert results["draws"] == results["games"]
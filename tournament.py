@@ -0,0 +1,249 @@
+import math
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+from two_player_game import TwoPlayerGame, TwoPlayerGameAgent
+
+
+class MatchResult:
+    """
+    Wins, draws and losses of agent_1 against agent_2 over a match. elapsed_seconds is the wall-clock time of the
+    play_match or play_round_robin call that played the match, so games_per_second is the match's throughput (in a
+    round robin, this pair's games over the time of the whole round robin). worker_seconds is the time spent playing
+    the match's games summed over workers, which gives the rate of a single worker. search_statistics maps the name of
+    each agent that collects search statistics (see TicTacToeMiniMaxAgent) to its statistics over the match.
+    """
+
+    def __init__(self, agent_1_name, agent_2_name, wins=0, draws=0, losses=0, elapsed_seconds=0.0, worker_seconds=0.0):
+        self.agent_1_name = agent_1_name
+        self.agent_2_name = agent_2_name
+        self.wins = wins
+        self.draws = draws
+        self.losses = losses
+        self.elapsed_seconds = elapsed_seconds
+        self.worker_seconds = worker_seconds
+        self.search_statistics = {}
+
+    @property
+    def games(self):
+        return self.wins + self.draws + self.losses
+
+    @property
+    def score(self):
+        """Average points per game for agent_1, counting a win as 1 and a draw as 1/2."""
+        return (self.wins + self.draws / 2) / self.games if self.games else 0.0
+
+    @property
+    def games_per_second(self):
+        return self.games / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    @property
+    def games_per_worker_second(self):
+        return self.games / self.worker_seconds if self.worker_seconds else 0.0
+
+    def score_confidence_interval(self, z=1.96):
+        """Normal-approximation confidence interval for score (z=1.96 gives 95%)."""
+        if not self.games:
+            return 0.0, 1.0
+        score = self.score
+        variance = (self.wins * (1 - score) ** 2 + self.draws * (0.5 - score) ** 2
+                    + self.losses * score ** 2) / self.games
+        margin = z * math.sqrt(variance / self.games)
+        return max(0.0, score - margin), min(1.0, score + margin)
+
+    def proportion_confidence_intervals(self, z=1.96):
+        """Wilson score intervals for the win, draw and loss rates, which behave well near 0 and 1."""
+        return {"wins": wilson_interval(self.wins, self.games, z),
+                "draws": wilson_interval(self.draws, self.games, z),
+                "losses": wilson_interval(self.losses, self.games, z)}
+
+    def add(self, wins, draws, losses, worker_seconds, search_statistics=None):
+        """Add the games of one chunk, played by a single worker in worker_seconds."""
+        self.wins += wins
+        self.draws += draws
+        self.losses += losses
+        self.worker_seconds += worker_seconds
+        for name, statistics in (search_statistics or {}).items():
+            _merge_statistics(self.search_statistics, name, statistics)
+
+    def __str__(self):
+        low, high = self.score_confidence_interval()
+        return (f"{self.agent_1_name} vs {self.agent_2_name}: +{self.wins} ={self.draws} -{self.losses} "
+                f"(score {self.score:.3f}, 95% CI [{low:.3f}, {high:.3f}], "
+                f"{self.games_per_second:.0f} games/s, {self.games_per_worker_second:.0f} per worker)")
+
+
+def wilson_interval(count, n, z=1.96):
+    if not n:
+        return 0.0, 1.0
+    proportion = count / n
+    denominator = 1 + z ** 2 / n
+    center = (proportion + z ** 2 / (2 * n)) / denominator
+    margin = z * math.sqrt(proportion * (1 - proportion) / n + z ** 2 / (4 * n ** 2)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def play_match(board_factory, agent_1: TwoPlayerGameAgent, agent_2: TwoPlayerGameAgent, n_games, n_workers=1):
+    """
+    Play n_games between two agents without printing, alternating which of them moves first.
+    :param board_factory: Callable returning a fresh TwoPlayerGameBoard, such as the board class. Must be picklable if
+                          n_workers > 1, as must the agents.
+    :param n_workers: Number of processes to spread the games over. Each worker gets its own copy of the agents, with
+                      its own random stream (see _play_chunk).
+    :return: MatchResult from agent_1's point of view.
+    """
+    return play_round_robin(board_factory, [agent_1, agent_2], n_games, n_workers)[agent_1.name, agent_2.name]
+
+
+def play_round_robin(board_factory, agents, n_games_per_pair, n_workers=1):
+    """
+    Play n_games_per_pair between every pair of agents, alternating colors, over a pool of n_workers processes.
+    Agent names must be unique.
+    :return: Dictionary mapping (agent_1.name, agent_2.name) to a MatchResult from agent_1's point of view, for each
+             pair in the order the agents were given.
+    """
+    assert len({agent.name for agent in agents}) == len(agents), "Agent names must be unique"
+    start_time = time.perf_counter()
+    pairings = list(combinations(agents, 2))
+    results = {(agent_1.name, agent_2.name): MatchResult(agent_1.name, agent_2.name) for agent_1, agent_2 in pairings}
+
+    # Split each match into one chunk of consecutive games per worker. Chunks keep the global game number so that
+    # colors alternate across the whole match.
+    chunks = []
+    for agent_1, agent_2 in pairings:
+        chunk_size = math.ceil(n_games_per_pair / n_workers)
+        for first_game in range(0, n_games_per_pair, chunk_size):
+            chunks.append((board_factory, agent_1, agent_2, first_game,
+                           min(chunk_size, n_games_per_pair - first_game), n_workers > 1))
+
+    if n_workers > 1:
+        with ProcessPoolExecutor(n_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            chunk_results = list(pool.map(_play_chunk, *zip(*chunks)))
+    else:
+        chunk_results = [_play_chunk(*chunk) for chunk in chunks]
+
+    for (_, agent_1, agent_2, _, _, _), chunk_result in zip(chunks, chunk_results):
+        results[agent_1.name, agent_2.name].add(*chunk_result)
+    elapsed_seconds = time.perf_counter() - start_time
+    for result in results.values():
+        result.elapsed_seconds = elapsed_seconds
+    return results
+
+
+def standings(results):
+    """Total points (1 per win, 1/2 per draw) of each agent over a round robin, best first."""
+    points = {}
+    for result in results.values():
+        points[result.agent_1_name] = points.get(result.agent_1_name, 0) + result.wins + result.draws / 2
+        points[result.agent_2_name] = points.get(result.agent_2_name, 0) + result.losses + result.draws / 2
+    return sorted(points.items(), key=lambda item: item[1], reverse=True)
+
+
+def search_statistics(results):
+    """Merge the search statistics of each agent over every match of a round robin, keyed by agent name."""
+    totals = {}
+    for result in results.values():
+        for name, statistics in result.search_statistics.items():
+            _merge_statistics(totals, name, statistics)
+    return totals
+
+
+def _merge_statistics(totals, name, statistics):
+    if name not in totals:
+        totals[name] = type(statistics)()
+    totals[name].merge(statistics)
+
+
+def _reseed_for_chunk(agent, first_game):
+    if isinstance(getattr(agent, "rng", None), random.Random):
+        seed = getattr(agent, "seed", None)
+        # Unseeded agents draw a fresh seed from the system
+        agent.rng = random.Random(None if seed is None else f"{seed}/{first_game}")
+
+
+def _play_chunk(board_factory, agent_1, agent_2, first_game, n_games, close_agents=False):
+    """
+    Play games first_game, ..., first_game + n_games - 1, with agent_1 moving first in even-numbered games. Agents with
+    search statistics collect them in a fresh object for the chunk, which is returned and also merged into their own.
+    Agents with a random.Random in rng are reseeded for every chunk but the first, from their seed and first_game, so
+    that copies in different workers do not replay the same games. If close_agents, agents with a close method, such
+    as a TicTacToeMiniMaxAgent with worker processes of its own, are closed afterwards; the copies in a worker process
+    are not used again.
+    """
+    start_time = time.perf_counter()
+    if first_game:
+        for agent in (agent_1, agent_2):
+            _reseed_for_chunk(agent, first_game)
+    wins = draws = losses = 0
+    agents_statistics = {}
+    for agent in (agent_1, agent_2):
+        if getattr(agent, "search_statistics", None) is not None:
+            agents_statistics[agent.name] = agent.search_statistics
+            agent.search_statistics = type(agent.search_statistics)()
+    board = board_factory()
+    agent_1_first = TwoPlayerGame(board, agent_1, agent_2)
+    agent_2_first = TwoPlayerGame(board, agent_2, agent_1)
+    for game_number in range(first_game, first_game + n_games):
+        if game_number % 2 == 0:
+            outcome = agent_1_first.play_headless()
+        else:
+            outcome = -agent_2_first.play_headless()
+        if outcome > 0:
+            wins += 1
+        elif outcome < 0:
+            losses += 1
+        else:
+            draws += 1
+    elapsed_seconds = time.perf_counter() - start_time
+
+    chunk_statistics = {}
+    for agent in (agent_1, agent_2):
+        if agent.name in agents_statistics:
+            chunk_statistics[agent.name] = agent.search_statistics
+            agents_statistics[agent.name].merge(agent.search_statistics)
+            agent.search_statistics = agents_statistics[agent.name]
+    if close_agents:
+        for agent in (agent_1, agent_2):
+            if hasattr(agent, "close"):
+                agent.close()
+    return wins, draws, losses, elapsed_seconds, chunk_statistics
+
+
+if __name__ == "__main__":
+    from two_player_game import RandomAgent
+    from tic_tac_toe import TicTacToeBitBoard, TicTacToeMiniMaxAgent
+
+    # Minimax never loses, and wins most games against a random player
+    minimax_agent = TicTacToeMiniMaxAgent("minimax", collect_statistics=True)
+    result = play_match(TicTacToeBitBoard, minimax_agent, RandomAgent("random"), n_games=1000, n_workers=2)
+    print(result)
+    print(result.search_statistics["minimax"])
+    assert result.losses == 0 and result.wins > result.draws
+
+    results = play_round_robin(TicTacToeBitBoard,
+                               [minimax_agent, RandomAgent("random 1", seed=1), RandomAgent("random 2", seed=2)],
+                               n_games_per_pair=500)
+    for result in results.values():
+        print(result)
+    print(standings(results))
+    for name, statistics in search_statistics(results).items():
+        print(name, statistics)
+
+    # Chunks played by different workers are different games, even between seeded agents
+    chunk_results = [_play_chunk(TicTacToeBitBoard, RandomAgent("random 1", seed=1), RandomAgent("random 2", seed=2),
+                                 first_game, 50)[:3] for first_game in (0, 50, 100)]
+    print(chunk_results)
+    assert len(set(chunk_results)) == len(chunk_results)
+    result = play_match(TicTacToeBitBoard, RandomAgent("random 1", seed=1), RandomAgent("random 2", seed=2), 100,
+                        n_workers=2)
+    assert (result.wins, result.draws, result.losses) != tuple(2 * count for count in chunk_results[0])
+    assert result.games_per_second < result.games_per_worker_second * 2
+
+    # Agents with worker processes of their own are closed in the tournament's workers, and by the caller here
+    with TicTacToeMiniMaxAgent("parallel minimax", n_workers=2) as parallel_agent:
+        result = play_match(TicTacToeBitBoard, parallel_agent, RandomAgent("random", seed=0), n_games=10, n_workers=2)
+    print(result)
+    assert result.losses == 0
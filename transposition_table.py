@@ -0,0 +1,94 @@
+from enum import Enum
+
+
+class Bound(Enum):
+    """How a stored value relates to the true value of the position."""
+    EXACT = 0
+    LOWER = 1  # The search failed high: true value >= stored value
+    UPPER = 2  # The search failed low: true value <= stored value
+
+
+class ReplacementPolicy(Enum):
+    """Decides which entry keeps a slot when two positions map to it."""
+    ALWAYS = "always"  # The newest entry always replaces the old one
+    DEPTH_PREFERRED = "depth_preferred"  # The entry from the deeper search is kept
+
+
+class TranspositionTableEntry:
+    __slots__ = ("key", "value", "best_move", "depth", "bound")
+
+    def __init__(self, key, value, best_move, depth, bound: Bound):
+        """
+        :param key: The full position key, used to detect slot collisions.
+        :param value: The value found by the search.
+        :param best_move: The best move found by the search, or None.
+        :param depth: How many plies below this position the search looked.
+        :param bound: Whether the value is exact or a lower or upper bound.
+        """
+        self.key = key
+        self.value = value
+        self.best_move = best_move
+        self.depth = depth
+        self.bound = bound
+
+
+class TranspositionTable:
+    """
+    Fixed-size table of search results keyed by a position hash. Each key maps to one slot (key % size); when two
+    positions collide, the replacement policy decides which entry is kept, so memory never grows past the size cap.
+    The table is meant to be kept alive across searches and games.
+    """
+
+    def __init__(self, size=2 ** 16, replacement_policy=ReplacementPolicy.DEPTH_PREFERRED):
+        assert size > 0, "Transposition table needs at least one slot"
+        self.size = size
+        self.replacement_policy = replacement_policy
+        self.slots = [None] * size
+        self.n_entries = 0
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key):
+        """Return the entry stored for key, or None. Updates the hit and miss counters."""
+        entry = self.slots[key % self.size]
+        if entry is not None and entry.key == key:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def peek(self, key):
+        """Like lookup, but without counting a hit or miss."""
+        entry = self.slots[key % self.size]
+        return entry if entry is not None and entry.key == key else None
+
+    def store(self, key, value, best_move, depth, bound: Bound):
+        index = key % self.size
+        existing = self.slots[index]
+        if existing is None:
+            self.n_entries += 1
+        elif (existing.key != key and self.replacement_policy is ReplacementPolicy.DEPTH_PREFERRED
+              and existing.depth > depth):
+            return
+        self.slots[index] = TranspositionTableEntry(key, value, best_move, depth, bound)
+
+    def clear(self):
+        self.slots = [None] * self.size
+        self.n_entries = 0
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self):
+        return self.n_entries
+
+    def __str__(self):
+        return (f"TranspositionTable({self.n_entries}/{self.size} slots used, {self.hits} hits, {self.misses} misses, "
+                f"hit rate {self.hit_rate:.1%})")
@@ -1,3 +1,4 @@
+import random
 import time
 from abc import ABC, abstractmethod
 
@@ -8,12 +9,27 @@ class TwoPlayerGameMove(ABC):
     """
     Represents a move in a two player game. For example, would contain a row, column for tic-tac-toe.
     """
+    __slots__ = ()
 
     @abstractmethod
     def __init__(self):
         pass
 
 
+class TwoPlayerGameSnapshot(ABC):
+    """
+    Immutable, hashable position of a TwoPlayerGameBoard: the squares and the player to move, but not the move history.
+    Snapshots are equal when their positions are, so they can key caches, and they are small to store and to pickle,
+    so positions can be handed to other threads and processes without copying a board.
+    """
+    __slots__ = ()
+
+    @abstractmethod
+    def to_board(self):
+        """Return a new board in this position."""
+        pass
+
+
 class TwoPlayerGameBoard(ABC):
     name: str
     is_game_over: bool
@@ -39,6 +55,10 @@ class TwoPlayerGameBoard(ABC):
     def get_possible_moves(self):
         pass
 
+    def is_legal_move(self, move: TwoPlayerGameMove):
+        """Whether move can be played now. Boards should override this with something cheaper than a search."""
+        return move in self.get_possible_moves()
+
     @abstractmethod
     def load_state(self, *args, **kwargs):
         pass
@@ -50,6 +70,39 @@ class TwoPlayerGameBoard(ABC):
     def static_evaluation(self):
         raise NotImplementedError()
 
+    def snapshot(self):
+        """Return a TwoPlayerGameSnapshot of the current position."""
+        raise NotImplementedError()
+
+    def restore(self, snapshot):
+        """
+        Set up the position of a snapshot taken from a board of the same kind. As after load_state, the move history
+        starts empty, so moves played before the snapshot cannot be undone.
+        """
+        raise NotImplementedError()
+
+    def order_moves(self, moves):
+        """
+        Return moves (from get_possible_moves) in the order a search should try them, most promising first. Boards can
+        override this with cheap game knowledge; by default the order is unchanged.
+        """
+        return moves
+
+    def canonical_key(self):
+        """
+        Return a key shared by every position equivalent to this one (e.g. under rotation or reflection), along with
+        the transform that maps this board onto the canonical position. By default, positions have no symmetries.
+        """
+        return hash(self), None
+
+    def transform_move(self, move: TwoPlayerGameMove, transform):
+        """Map a move on this board to the canonical position produced by transform."""
+        return move
+
+    def untransform_move(self, move: TwoPlayerGameMove, transform):
+        """Map a move on the canonical position produced by transform back to this board."""
+        return move
+
 
 class TwoPlayerGameAgent(ABC):
     name: str
@@ -63,6 +116,32 @@ class TwoPlayerGameAgent(ABC):
         pass
 
 
+class RandomAgent(TwoPlayerGameAgent):
+    """
+    Plays a uniformly random legal move. Useful as a baseline opponent. Unseeded agents are reseeded when unpickled, so
+    copies sent to different worker processes do not repeat each other's games.
+    """
+
+    def __init__(self, name, seed=None):
+        self.name = name
+        self.seed = seed
+        self.rng = random.Random(seed)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.seed is None:
+            del state["rng"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if "rng" not in state:
+            self.rng = random.Random()
+
+    def get_move(self, board: TwoPlayerGameBoard):
+        return self.rng.choice(list(board.get_possible_moves()))
+
+
 class TwoPlayerGameGUI(ABC):
     """
     Abstract base class for a graphical user interface for two player games.
@@ -135,19 +214,22 @@ class TwoPlayerGame:
     def __init__(self,
                  board: TwoPlayerGameBoard,
                  player_1_agent: TwoPlayerGameAgent,
-                 player_2_agent: TwoPlayerGameAgent):
+                 player_2_agent: TwoPlayerGameAgent,
+                 game_log=None):
         """
         Initialize the game with two players.
         :param board: TwoPlayerGameBoard of the game to be played.
         :param player_1_agent: TwoPlayerGameAgent which will receive a TwoPlayerGameBoard as input and should return
                             TwoPlayerGameMove. The onus is on the agent to ensure that the move is valid.
         :param player_2_agent: Similar to player_1_agent.
+        :param game_log: If set, a GameLogWriter (see game_log) to which every finished game is appended.
         :param silent: If True, will not print anything as the game proceeds; else, will print moves and winning info.
                         After printing something, it will wait for user input (eg, enter) to move on.
         """
         self.board = board
         self.player_1 = player_1_agent
         self.player_2 = player_2_agent
+        self.game_log = game_log
 
     def swap_player_1_and_player_2(self):
         self.player_1, self.player_2 = self.player_2, self.player_1
@@ -161,15 +243,18 @@ class TwoPlayerGame:
 
         # Main game loop
         player, next_player = self.player_1, self.player_2
+        moves = []
         while not self.board.is_game_over:
             # Get and announce move
             self._maybe_print(self.board, silent=silent)
             move = player.get_move(self.board)
             self._maybe_print(f"Player {player.name} played {move}.", silent=silent)
             self.board.play_move(move)
+            moves.append(move)
 
             # Swap roles
             player, next_player = next_player, player
+        self._log_game(moves)
 
         self._maybe_print(self.board, silent=silent, clear=False)
         if self.board.winning_player != "":
@@ -177,7 +262,31 @@ class TwoPlayerGame:
         else:
             self._maybe_print("It's a tie!\n", silent=silent, clear=False)
 
-    def play_in_GUI(self, gui: TwoPlayerGameGUI):
+    def play_headless(self):
+        """
+        Play one game without printing anything or waiting for input.
+        :return: 1 if player 1 won, -1 if player 2 won and 0 for a tie. The player who made the last move is taken to
+                 be the winner, as in all the games here.
+        """
+        self.board.reset()
+        player, next_player = self.player_1, self.player_2
+        moves = []
+        while not self.board.is_game_over:
+            move = player.get_move(self.board)
+            self.board.play_move(move)
+            moves.append(move)
+            player, next_player = next_player, player
+        self._log_game(moves)
+
+        if self.board.winning_player == "":
+            return 0
+        return 1 if len(moves) % 2 == 1 else -1
+
+    def play_in_GUI(self, gui: TwoPlayerGameGUI, move_delay=1.0):
+        """
+        Play one game shown in gui, then wait for the user to close it.
+        :param move_delay: Seconds to wait before each move so that the game can be followed. 0 plays without pausing.
+        """
         self.board.reset()
         gui.clear()
         gui.display_message(
@@ -185,21 +294,29 @@ class TwoPlayerGame:
 
         # Main game loop
         player, next_player = self.player_1, self.player_2
+        moves = []
         while not self.board.is_game_over:
             # Get and announce move
-            time.sleep(1)
+            if move_delay:
+                time.sleep(move_delay)
             gui.update_display()
             move = player.get_move(self.board)
             gui.display_message(f"{player.name} played {move}.")
             self.board.play_move(move)
+            moves.append(move)
             gui.update_display()
 
             # Swap roles
             player, next_player = next_player, player
+        self._log_game(moves)
 
         gui.display_winner(self.board.winning_player)
         gui.await_exit()
 
+    def _log_game(self, moves):
+        if self.game_log is not None:
+            self.game_log.write_finished_game(moves, self.board)
+
     @staticmethod
     def _maybe_print(s, silent=False, clear=True):
         if not silent: